@@ -0,0 +1,53 @@
+"""
+Time the packing engines on one large container as the item count grows.
+
+Run from extracted_code:
+    python -m benchmarks.packing_benchmark [--counts 250 500 1000] [--backend python numpy]
+
+For every (backend, count) it packs the same seeded random items into a
+1000 x 1000 x 1000 container and prints the time, the items placed and the
+extreme points left, so the per-item cost can be compared across counts.
+"""
+import argparse
+import random
+import time
+
+from services.packing import create_index, ExtremePointPacker, PACKING_ENGINES
+
+
+def random_items(count: int, low: float = 40, high: float = 200, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(low, high), rng.uniform(low, high), rng.uniform(low, high), rng.randint(1, 100))
+        for _ in range(count)
+    ]
+
+
+def run(engine: str, backend: str, count: int, low: float = 40, high: float = 200, size: float = 1000.0):
+    packer = PACKING_ENGINES[engine](size, size, size, index=create_index(backend))
+    items = random_items(count, low, high)
+    started = time.perf_counter()
+    placed = sum(1 for w, d, h, priority in items if packer.place((w, d, h), priority) is not None)
+    elapsed = time.perf_counter() - started
+    points = len(packer._points) if isinstance(packer, ExtremePointPacker) else 0
+    return elapsed, placed, points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engine", default="extreme_point", choices=sorted(PACKING_ENGINES))
+    parser.add_argument("--backend", nargs="+", default=["python", "numpy"])
+    parser.add_argument("--counts", nargs="+", type=int, default=[250, 500, 1000, 1500])
+    parser.add_argument("--sizes", nargs=2, type=float, default=[40, 200], metavar=("MIN", "MAX"),
+                        help="range of random item dimensions")
+    args = parser.parse_args()
+
+    print(f"{'backend':8} {'items':>6} {'placed':>6} {'points':>6} {'seconds':>8} {'ms/item':>8}")
+    for backend in args.backend:
+        for count in args.counts:
+            elapsed, placed, points = run(args.engine, backend, count, *args.sizes)
+            print(f"{backend:8} {count:6} {placed:6} {points:6} {elapsed:8.2f} {1000 * elapsed / count:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
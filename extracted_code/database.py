@@ -1,5 +1,5 @@
 import motor.motor_asyncio
-from pymongo import ASCENDING
+from pymongo import ASCENDING, DESCENDING
 from bson import ObjectId
 import os
 
@@ -17,11 +17,17 @@ placements_collection = db.placements
 logs_collection = db.logs
 waste_collection = db.waste
 simulation_collection = db.simulation
+jobs_collection = db.jobs
+occupancy_collection = db.occupancy
 
 # Create indexes
 async def init_db():
     # Create an index on the itemId field for items collection
     await items_collection.create_index([("itemId", ASCENDING)], unique=True)
+    # Create an index on the normalized name for exact and prefix name search
+    await items_collection.create_index([("nameLower", ASCENDING)])
+    # Create an index for expiry range scans over items that aren't waste yet
+    await items_collection.create_index([("isWaste", ASCENDING), ("expiresAt", ASCENDING)])
     # Create an index on the containerId field for containers collection
     await containers_collection.create_index([("containerId", ASCENDING)], unique=True)
     # Create an index on itemId for placements collection
@@ -30,7 +36,15 @@ async def init_db():
     await placements_collection.create_index([("containerId", ASCENDING), ("itemId", ASCENDING)])
     # Create an index on timestamp for logs collection
     await logs_collection.create_index([("timestamp", ASCENDING)])
+    # Create a compound index matching the (timestamp, _id) keyset sort of the logs pages
+    await logs_collection.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)])
     # Create an index on itemId for waste collection
     await waste_collection.create_index([("itemId", ASCENDING)], unique=True)
     # Create an index on timestamp for simulation collection
     await simulation_collection.create_index([("timestamp", ASCENDING)])
+    # Create an index on jobId for jobs collection
+    await jobs_collection.create_index([("jobId", ASCENDING)], unique=True)
+    # Create an index on status for finding unfinished jobs after a restart
+    await jobs_collection.create_index([("status", ASCENDING)])
+    # Create an index on containerId for the occupancy snapshot mirror
+    await occupancy_collection.create_index([("containerId", ASCENDING)], unique=True)
\ No newline at end of file
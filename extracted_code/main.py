@@ -1,7 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from routes import placement, search, waste, simulation, import_export, logs, containers, items
+from routes import placement, search, waste, simulation, import_export, logs, containers, items, jobs
+from services.audit import stop_audit_log
+from services.pagination import NEXT_CURSOR_HEADER
+from services.executor import shutdown_placement_pool
+from services.jobs import start_job_workers, stop_job_workers
+from services.occupancy_cache import load_occupancy_cache
+from services.name_index import backfill_name_lower, load_name_index
+from services.expiry import backfill_expires_at, load_expiry_scheduler
+from database import init_db
 
 app = FastAPI(
     title="ISStow API",
@@ -16,6 +24,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include all the routes
@@ -27,6 +36,37 @@ app.include_router(import_export.router)
 app.include_router(logs.router)
 app.include_router(containers.router)  # Add containers route
 app.include_router(items.router)       # Add items route
+app.include_router(jobs.router)        # Add background jobs route
+
+@app.on_event("startup")
+async def startup():
+    try:
+        await init_db()
+    except Exception as e:
+        print(f"Error creating indexes: {str(e)}")
+    try:
+        await load_occupancy_cache()
+    except Exception as e:
+        print(f"Error loading occupancy cache: {str(e)}")
+    try:
+        await backfill_name_lower()
+        await load_name_index()
+    except Exception as e:
+        print(f"Error loading name index: {str(e)}")
+    try:
+        await backfill_expires_at()
+        await load_expiry_scheduler()
+    except Exception as e:
+        print(f"Error loading expiry dates: {str(e)}")
+    await start_job_workers()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_job_workers()
+    # Write the audit entries still buffered
+    await stop_audit_log()
+    # Stop the placement worker processes
+    shutdown_placement_pool()
 
 @app.get("/")
 async def root():
@@ -31,11 +31,26 @@ class ImportError(BaseModel):
 class ContainersImportResponse(BaseModel):
     success: bool
     containersImported: int
-    errors: List[ImportError] = []
+    errors: List[ImportError] = []  # The first row errors only
+    errorCount: int = 0  # Rows rejected in total
+
+class ContainerUtilization(BaseModel):
+    containerId: str
+    zone: Optional[str] = None
+    version: int  # Changes whenever the container's contents change
+    itemCount: int
+    volume: float
+    usedVolume: float
+    freeVolume: float
+    utilization: float
 
 class ContainerPlacement(BaseModel):
     containerId: str
     zone: str
     width: float
     depth: float
-    height: float
\ No newline at end of file
+    height: float
+
+class ContainerPage(BaseModel):
+    containers: List[ContainerPlacement] = []
+    nextCursor: Optional[str] = None  # Pass as cursor= to get the next page
\ No newline at end of file
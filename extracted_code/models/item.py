@@ -35,10 +35,15 @@ class ItemResponse(ItemBase):
     actualZone: Optional[str]
     containerName: Optional[str]  # Add containerName field
     position: Optional[Dict[str, Any]]  # Add position field
+    expiresAt: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class ItemPage(BaseModel):
+    items: List[ItemResponse] = []
+    nextCursor: Optional[str] = None  # Pass as cursor= to get the next page
+
 class Coordinates(BaseModel):
     width: float
     depth: float
@@ -56,4 +61,6 @@ class ImportError(BaseModel):
 class ItemsImportResponse(BaseModel):
     success: bool
     itemsImported: int
-    errors: List[ImportError] = []
\ No newline at end of file
+    errors: List[ImportError] = []  # The first row errors and unplaced items only
+    errorCount: int = 0  # Rows rejected in total
+    unplacedCount: int = 0  # Imported items that could not be placed in total
\ No newline at end of file
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class JobProgress(BaseModel):
+    itemsPlaced: int = 0
+    itemsRemaining: int = 0
+    itemsUnplaceable: int = 0
+
+class JobSubmitResponse(BaseModel):
+    success: bool
+    jobId: str
+    status: str  # "queued", "running", "completed", "failed"
+
+class JobStatusResponse(BaseModel):
+    success: bool
+    jobId: str
+    jobType: str  # "placement", "import_items"
+    status: str
+    progress: JobProgress = JobProgress()
+    error: Optional[str] = None
+    createdAt: datetime
+    updatedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+
+class JobResultResponse(BaseModel):
+    success: bool
+    jobId: str
+    status: str
+    result: Dict[str, Any]
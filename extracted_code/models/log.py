@@ -25,6 +25,7 @@ class LogEntry(LogBase):
 
 class LogResponse(BaseModel):
     logs: List[LogEntry] = []
+    nextCursor: Optional[str] = None  # Pass as cursor= to get the next page
     
     class Config:
         from_attributes = True
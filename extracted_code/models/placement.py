@@ -38,6 +38,7 @@ class ContainerPlacement(BaseModel):
 class PlacementRequest(BaseModel):
     items: List[ItemPlacement]
     containers: List[ContainerPlacement]
+    incremental: bool = False  # Only place items without a placement, around existing ones
 
 class PlacementResponse(BaseModel):
     success: bool
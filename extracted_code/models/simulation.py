@@ -10,6 +10,7 @@ class SimulationRequest(BaseModel):
     numOfDays: Optional[int] = None
     toTimestamp: Optional[str] = None  # ISO format
     itemsToBeUsedPerDay: List[UsedItem] = Field(default_factory=list)  # Empty list by default
+    summarizeUsageLogs: bool = False  # One usage log per item instead of one per use
 
 class UsedItemResponse(BaseModel):
     itemId: str
@@ -32,4 +33,22 @@ class SimulationChanges(BaseModel):
 class SimulationResponse(BaseModel):
     success: bool
     newDate: str  # ISO format
-    changes: SimulationChanges
\ No newline at end of file
+    changes: SimulationChanges
+
+class ForecastItem(BaseModel):
+    itemId: str
+    name: Optional[str] = None
+
+class ForecastDay(BaseModel):
+    day: int
+    date: str  # ISO format
+    itemsExpired: List[ForecastItem] = Field(default_factory=list)
+    itemsDepleted: List[ForecastItem] = Field(default_factory=list)
+
+class ForecastResponse(BaseModel):
+    success: bool
+    fromDate: str  # ISO format
+    toDate: str  # ISO format
+    totalExpired: int
+    totalDepleted: int
+    timeline: List[ForecastDay]
@@ -1,26 +1,79 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from database import containers_collection
-from models.container import ContainerPlacement
-from typing import List
+from models.container import ContainerPage, ContainerPlacement, ContainerUtilization
+from services.occupancy_cache import get_all_snapshots, get_container_snapshot
+from typing import List, Optional, Union
+from services.pagination import (
+    MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_limit, parse_fields, projection
+)
 
 router = APIRouter(
     prefix="/containers",
     tags=["Containers"]
 )
 
-@router.get("/", response_model=List[ContainerPlacement])
-async def get_containers():
+@router.get("/", response_model=Union[List[ContainerPlacement], ContainerPage])
+async def get_containers(
+    response: Response,
+    after: Optional[str] = Query(None, description="Return containers with a containerId after this one"),
+    cursor: Optional[str] = Query(None, description="Next-page cursor from a previous response"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return")
+):
     """
     Retrieve all containers.
+
+    With after, cursor or limit the containers are returned in containerId
+    order, one page at a time, as {"containers": [...], "nextCursor": ...};
+    the cursor of the next page is also sent in the X-Next-Cursor header.
     """
+    names = parse_fields(fields, ["containerId"])
+    paginated = bool(after or cursor or limit)
+    if cursor:
+        after = decode_cursor(cursor, ["containerId"])["containerId"]
+    limit = page_limit(limit, paginated)
+    
     try:
-        containers = await containers_collection.find().to_list(length=None)
-        if not containers:
+        query = {"containerId": {"$gt": after}} if after else {}
+        containers_cursor = containers_collection.find(query, projection(names))
+        if paginated:
+            containers_cursor = containers_cursor.sort("containerId", 1).limit(limit)
+        containers = await containers_cursor.to_list(length=limit)
+        if not containers and not paginated:
             raise HTTPException(status_code=404, detail="No containers found")
-        return containers
     except Exception as e:
         print(f"Error fetching containers: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching containers")
+    
+    next_cursor = (
+        encode_cursor({"containerId": containers[-1]["containerId"]}) if limit and len(containers) == limit else None
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    content = {"containers": containers, "nextCursor": next_cursor} if paginated else containers
+    if names is not None:
+        # A partial projection doesn't satisfy ContainerPlacement
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
+    response.headers.update(headers)
+    return content
+
+@router.get("/utilization", response_model=List[ContainerUtilization])
+async def get_containers_utilization():
+    """
+    Retrieve the utilization of every container from the occupancy cache.
+    """
+    return await get_all_snapshots()
+
+@router.get("/{container_id}/utilization", response_model=ContainerUtilization)
+async def get_container_utilization(container_id: str):
+    """
+    Retrieve a container's utilization and occupancy version.
+    """
+    snapshot = await get_container_snapshot(container_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Container not found")
+    return snapshot
 
 @router.get("/{container_id}", response_model=ContainerPlacement)
 async def get_container(container_id: str):
@@ -1,61 +1,91 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models.item import ItemResponse
-from database import items_collection, placements_collection, containers_collection
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from models.item import ItemPage, ItemResponse
+from database import items_collection
+from services.items import ITEMS_BATCH_SIZE, iter_items_with_placement
+from services.streaming import NDJSON_MEDIA_TYPE, STREAM_BATCH_SIZE, ndjson_lines
+from services.pagination import (
+    MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_limit, parse_fields, project_document
+)
 
 router = APIRouter(
     prefix="/api",
     tags=["Items"]
 )
 
-@router.get("/items", response_model=List[ItemResponse])
-async def get_items():
+@router.get("/items", response_model=Union[List[ItemResponse], ItemPage])
+async def get_items(
+    response: Response,
+    after: Optional[str] = Query(None, description="Return items with an itemId after this one"),
+    cursor: Optional[str] = Query(None, description="Next-page cursor from a previous response"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    format: str = Query("json", regex="^(json|ndjson)$")
+):
     """
     Retrieve all items with their current placement status
+
+    With after, cursor or limit the items are returned in itemId order, one
+    page at a time, as {"items": [...], "nextCursor": ...}; the cursor of
+    the next page is also sent in the X-Next-Cursor header. Without them
+    every item is returned as a list, as before. format=ndjson streams one
+    item per line as items are read.
     """
+    names = parse_fields(fields, ["itemId"])
+    paginated = bool(after or cursor or limit)
+    if cursor:
+        after = decode_cursor(cursor, ["itemId"])["itemId"]
+    limit = page_limit(limit, paginated)
+    items_iter = iter_items_with_placement(
+        {"itemId": {"$gt": after}} if after else None,
+        sort={"itemId": 1} if paginated else None,
+        limit=limit,
+        batch_size=STREAM_BATCH_SIZE if format == "ndjson" else ITEMS_BATCH_SIZE,
+        names=names
+    )
+    
+    if format == "ndjson":
+        convert = (lambda item: project_document(item, names)) if names is not None else ItemResponse.parse_obj
+        return StreamingResponse(ndjson_lines(items_iter, convert), media_type=NDJSON_MEDIA_TYPE)
+    
     try:
-        items = []
-        cursor = items_collection.find({})
-        
-        async for item in cursor:
-            # Get placement information for this item
-            placement_data = await placements_collection.find_one({
-                "itemId": item["itemId"]
-            })
-            
-            if placement_data:
-                # Get container information
-                container = await containers_collection.find_one({
-                    "containerId": placement_data["containerId"]
-                })
-                
-                item.update({
-                    "isPlaced": True,
-                    "containerId": placement_data["containerId"],
-                    "actualZone": container["zone"] if container else None,
-                    "containerName": container.get("name", container["containerId"]) if container else None,
-                    "position": {
-                        "startCoordinates": placement_data["position"]["startCoordinates"],
-                        "endCoordinates": placement_data["position"]["endCoordinates"]
-                    } if "position" in placement_data else None
-                })
-            else:
-                item.update({
-                    "isPlaced": False,
-                    "containerId": None,
-                    "actualZone": None,
-                    "containerName": None,
-                    "position": None
-                })
-            
-            print(f"Debug - Item {item['itemId']}: isPlaced={item['isPlaced']}, position={item.get('position')}")
-            items.append(item)
-        
-        return items
-        
+        items = [project_document(item, names) async for item in items_iter]
     except Exception as e:
         print(f"Error fetching items: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    next_cursor = encode_cursor({"itemId": items[-1]["itemId"]}) if limit and len(items) == limit else None
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    content = {"items": items, "nextCursor": next_cursor} if paginated else items
+    if names is not None:
+        # A partial projection doesn't satisfy ItemResponse
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
+    response.headers.update(headers)
+    return content
+
+@router.get("/items/expiring", response_model=List[ItemResponse])
+async def get_expiring_items(
+    days: float = Query(7, ge=0, description="Return items expiring within this many days"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Retrieve items that are not waste yet and expire within the next days,
+    soonest first, with their placement status
+    """
+    now = datetime.utcnow()
+    items_iter = iter_items_with_placement(
+        {"isWaste": False, "expiresAt": {"$gte": now, "$lte": now + timedelta(days=days)}},
+        sort={"expiresAt": 1},
+        limit=limit
+    )
+    try:
+        return [item async for item in items_iter]
+    except Exception as e:
+        print(f"Error fetching expiring items: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/items/{item_id}", response_model=ItemResponse)
 async def get_item(item_id: str):
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException
+from models.job import JobStatusResponse, JobResultResponse
+from services.jobs import get_job
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Jobs"]
+)
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """
+    Get the status and progress of a placement or import job
+    """
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JobStatusResponse(success=True, **job)
+
+@router.get("/jobs/{job_id}/result", response_model=JobResultResponse)
+async def get_job_result(job_id: str):
+    """
+    Get the final result of a completed job
+    
+    Returns: The PlacementResponse or ItemsImportResponse the job produced
+    """
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.get('error')}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is still {job['status']}")
+    
+    return JobResultResponse(
+        success=True,
+        jobId=job_id,
+        status=job["status"],
+        result=job["result"]
+    )
@@ -1,21 +1,75 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from bson import ObjectId
+from bson.errors import InvalidId
 from models.log import LogResponse, LogEntry
 from database import logs_collection
 from datetime import datetime, timedelta
 from typing import Optional
+from services.audit import flush_audit_log
+from services.streaming import NDJSON_MEDIA_TYPE, STREAM_BATCH_SIZE, ndjson_lines
+from services.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_limit, parse_fields, project_document, projection
 
 router = APIRouter(
     prefix="/api",
     tags=["Logs"]
 )
 
+def logs_before(timestamp, log_id=None):
+    """
+    Query matching logs that come after a position in newest-first order.
+
+    Simulation logs store their timestamp as an ISO string; strings sort
+    below dates, so a page that ended on a date continues into them.
+    """
+    if isinstance(timestamp, datetime):
+        clauses = [{"timestamp": {"$lt": timestamp}}, {"timestamp": {"$type": "string"}}]
+    else:
+        clauses = [{"timestamp": {"$lt": timestamp, "$type": "string"}}]
+    if log_id is not None:
+        clauses.append({"timestamp": timestamp, "_id": {"$lt": log_id}})
+    return {"$or": clauses}
+
+def to_log_entry(log):
+    """Convert a stored log document to a LogEntry"""
+    # Ensure the timestamp is a datetime object
+    if isinstance(log["timestamp"], str):
+        try:
+            timestamp = datetime.fromisoformat(log["timestamp"].replace('Z', '+00:00'))
+        except ValueError:
+            timestamp = datetime.utcnow()  # Fallback if parsing fails
+    else:
+        timestamp = log["timestamp"]
+    
+    return LogEntry(
+        timestamp=timestamp,
+        userId=log.get("userId"),
+        actionType=log["actionType"],
+        itemId=log["itemId"],
+        details=log.get("details", {})
+    )
+
+def log_cursor(log):
+    timestamp = log["timestamp"]
+    return encode_cursor({
+        "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        "date": isinstance(timestamp, datetime),
+        "_id": str(log["_id"])
+    })
+
 @router.get("/logs", response_model=LogResponse)
 async def get_logs(
     startDate: Optional[str] = Query(None),
     endDate: Optional[str] = Query(None),
     itemId: Optional[str] = Query(None),
     userId: Optional[str] = Query(None),
-    actionType: Optional[str] = Query(None)
+    actionType: Optional[str] = Query(None),
+    after: Optional[str] = Query(None, description="Return logs older than this timestamp (ISO format)"),
+    cursor: Optional[str] = Query(None, description="nextCursor from a previous response"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    format: str = Query("json", regex="^(json|ndjson)$")
 ):
     """
     Retrieve logs based on filter criteria
@@ -26,6 +80,9 @@ async def get_logs(
     - itemId: Filter by item ID
     - userId: Filter by user ID
     - actionType: Filter by action type
+    - after, cursor, limit: Page through logs newest first; nextCursor holds the next page's cursor
+    - fields: Comma separated fields to return
+    - format: ndjson streams one log entry per line instead of a single JSON document
     
     Returns: List of matching log entries
     """
@@ -69,31 +126,54 @@ async def get_logs(
                 )
             query["actionType"] = actionType
         
-        # Get logs from database
-        logs_cursor = logs_collection.find(query).sort("timestamp", -1)
-        logs = await logs_cursor.to_list(length=None)
+        # Keyset pagination on (timestamp, _id), newest first
+        names = parse_fields(fields, ["timestamp"])
+        paginated = bool(after or cursor or limit)
+        limit = page_limit(limit, paginated)
+        if cursor:
+            position = decode_cursor(cursor, ["timestamp", "date", "_id"])
+            try:
+                timestamp = datetime.fromisoformat(position["timestamp"]) if position["date"] else position["timestamp"]
+                page_query = logs_before(timestamp, ObjectId(position["_id"]))
+            except (ValueError, TypeError, InvalidId):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        elif after:
+            try:
+                page_query = logs_before(datetime.fromisoformat(after.replace('Z', '+00:00')))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid after format. Use ISO format (YYYY-MM-DDTHH:MM:SS).")
+        else:
+            page_query = None
+        if page_query:
+            query = {"$and": [query, page_query]} if query else page_query
+        
+        # Get logs from database, including entries still buffered
+        await flush_audit_log()
+        logs_cursor = logs_collection.find(query, projection(names, keep_id=True)).sort([("timestamp", -1), ("_id", -1)])
+        if limit:
+            logs_cursor = logs_cursor.limit(limit)
+        
+        if format == "ndjson":
+            # Stream entries as they arrive from the cursor, up to limit or
+            # the end of the result; no next cursor is sent
+            logs_cursor = logs_cursor.batch_size(STREAM_BATCH_SIZE)
+            convert = (lambda log: project_document(log, names)) if names is not None else to_log_entry
+            return StreamingResponse(ndjson_lines(logs_cursor, convert), media_type=NDJSON_MEDIA_TYPE)
+        
+        logs = await logs_cursor.to_list(length=limit)
+        next_cursor = log_cursor(logs[-1]) if limit and len(logs) == limit else None
+        
+        if names is not None:
+            # A partial projection doesn't satisfy LogEntry
+            return JSONResponse(content=jsonable_encoder({
+                "logs": [project_document(log, names) for log in logs],
+                "nextCursor": next_cursor
+            }))
         
         # Convert to response format
-        log_entries = []
-        for log in logs:
-            # Ensure the timestamp is a datetime object
-            if isinstance(log["timestamp"], str):
-                try:
-                    timestamp = datetime.fromisoformat(log["timestamp"].replace('Z', '+00:00'))
-                except ValueError:
-                    timestamp = datetime.utcnow()  # Fallback if parsing fails
-            else:
-                timestamp = log["timestamp"]
-                
-            log_entries.append(LogEntry(
-                timestamp=timestamp,
-                userId=log.get("userId"),
-                actionType=log["actionType"],
-                itemId=log["itemId"],
-                details=log.get("details", {})
-            ))
+        log_entries = [to_log_entry(log) for log in logs]
         
-        return LogResponse(logs=log_entries)
+        return LogResponse(logs=log_entries, nextCursor=next_cursor)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
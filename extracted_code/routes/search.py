@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from models.item import Position
-from services.search import find_item_by_id, find_item_by_name, identify_items_to_move, generate_retrieval_steps, mark_item_as_used, place_item
-from database import logs_collection
+from services.search import (
+    find_item_by_id, find_item_by_name, get_batch_retrieval_plan, get_retrieval_plan, mark_item_as_used, place_item,
+    resolve_item_names
+)
+from services.audit import log_event
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -40,6 +43,30 @@ class PlaceRequest(BaseModel):
     containerId: str
     position: Position
 
+class BatchSearchRequest(BaseModel):
+    itemIds: List[str] = []
+    names: List[str] = []
+    mode: str = "contains"  # Name search mode, as for /search
+    userId: Optional[str] = None
+
+class BatchSearchItem(BaseModel):
+    query: str
+    found: bool
+    itemId: Optional[str] = None
+    name: Optional[str] = None
+    containerId: Optional[str] = None
+    zone: Optional[str] = None
+    position: Optional[Position] = None
+    isPlaced: bool = False
+
+class BatchRetrievalStep(RetrievalStep):
+    containerId: str
+
+class BatchSearchResponse(BaseModel):
+    success: bool
+    items: List[BatchSearchItem] = []
+    retrievalSteps: List[BatchRetrievalStep] = []
+
 class SimpleResponse(BaseModel):
     success: bool
     message: Optional[str] = None
@@ -48,6 +75,7 @@ class SimpleResponse(BaseModel):
 async def search_item(
     id: Optional[str] = Query(None, alias="id"),
     name: Optional[str] = Query(None, alias="name"),
+    mode: str = Query("contains", regex="^(contains|prefix|exact|fuzzy)$"),
     userId: Optional[str] = None
 ):
     """
@@ -63,20 +91,21 @@ async def search_item(
     try:
         # Search by ID first if provided
         if id:
-            item_data = await find_item_by_id(id)
+            plan = await get_retrieval_plan(id)
         # Fall back to name search if no ID provided or no item found by ID
         elif name:
-            items_data = await find_item_by_name(name)
-            item_data = items_data[0] if items_data else None
+            items_data = await find_item_by_name(name, mode)
+            plan = await get_retrieval_plan(items_data[0]["item"]["itemId"]) if items_data else None
         else:
             return SearchResponse(success=True, found=False)
 
-        if not item_data:
+        if not plan:
             return SearchResponse(success=True, found=False)
+        item_data = plan["item_data"]
 
         # Log the search if userId provided
         if userId:
-            await logs_collection.insert_one({
+            await log_event({
                 "timestamp": datetime.utcnow(),
                 "userId": userId,
                 "actionType": "search",
@@ -100,14 +129,8 @@ async def search_item(
                 retrievalSteps=[]
             )
 
-        # Generate retrieval steps if item is placed
-        items_to_move = await identify_items_to_move(
-            item_data["item"]["itemId"],
-            Position(**item_data["placement"]["position"]),
-            item_data["placement"]["containerId"]
-        )
-        
-        retrieval_steps = await generate_retrieval_steps(item_data, items_to_move)
+        # Retrieval steps are cached until the item's container changes
+        retrieval_steps = plan["retrieval_steps"]
 
         return SearchResponse(
             success=True,
@@ -130,6 +153,68 @@ async def search_item(
             detail=f"Error during search: {str(e)}"
         )
 
+@router.post("/api/search/batch", response_model=BatchSearchResponse)
+async def search_items_batch(request: BatchSearchRequest):
+    """
+    Search for several items by ID or name and get one combined retrieval
+    sequence for all of them
+    """
+    if not request.itemIds and not request.names:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either itemIds or names must be provided"
+        )
+    if request.mode not in ("contains", "prefix", "exact", "fuzzy"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown name search mode: {request.mode}"
+        )
+    
+    try:
+        # Resolve names to the best matching item, exact names in one query
+        queries = [(item_id, item_id) for item_id in request.itemIds]
+        resolved = await resolve_item_names(request.names, request.mode)
+        queries += [(name, resolved[name]) for name in request.names]
+        
+        plan = await get_batch_retrieval_plan([item_id for _, item_id in queries if item_id])
+        
+        if request.userId:
+            await log_event({
+                "timestamp": datetime.utcnow(),
+                "userId": request.userId,
+                "actionType": "search",
+                "itemId": "batch_search",
+                "details": {"searchType": "batch", "itemIds": list(plan["items"])}
+            })
+        
+        results = []
+        for query, item_id in queries:
+            item_data = plan["items"].get(item_id)
+            if not item_data:
+                results.append(BatchSearchItem(query=query, found=False))
+                continue
+            placement = item_data["placement"]
+            container = item_data.get("container")
+            results.append(BatchSearchItem(
+                query=query,
+                found=True,
+                itemId=item_id,
+                name=item_data["item"]["name"],
+                containerId=placement["containerId"] if placement else None,
+                zone=container["zone"] if container else None,
+                position=Position(**placement["position"]) if placement else None,
+                isPlaced=placement is not None
+            ))
+        
+        return BatchSearchResponse(success=True, items=results, retrievalSteps=plan["retrieval_steps"])
+    
+    except Exception as e:
+        print(f"Batch search error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error during batch search: {str(e)}"
+        )
+
 @router.post("/retrieve", response_model=SimpleResponse)
 async def retrieve_item(request: RetrieveRequest):
     # Check if item exists
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Query
-from models.simulation import SimulationRequest, SimulationResponse
-from services.simulation import advance_simulation_time, reset_simulation, get_simulation_history, get_current_simulation_date
+from models.simulation import SimulationRequest, SimulationResponse, ForecastResponse
+from services.simulation import advance_simulation_time, forecast_simulation, reset_simulation, get_simulation_history, get_current_simulation_date
 from typing import Optional, List
 from datetime import datetime
 
@@ -33,7 +33,8 @@ async def simulate_day(request: SimulationRequest):
         result = await advance_simulation_time(
             days=request.numOfDays,
             to_timestamp=request.toTimestamp,
-            items_to_use=[item.dict() for item in request.itemsToBeUsedPerDay]
+            items_to_use=[item.dict() for item in request.itemsToBeUsedPerDay],
+            summarize_usage_logs=request.summarizeUsageLogs
         )
         return result
     except ValueError as e:
@@ -41,6 +42,33 @@ async def simulate_day(request: SimulationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during simulation: {str(e)}")
 
+@router.get("/forecast", response_model=ForecastResponse)
+async def forecast(
+    numOfDays: int = Query(..., ge=1, le=3650),
+    itemsToBeUsedPerDay: List[str] = Query([], description="itemId of an item used each day, repeat for more"),
+    namesToBeUsedPerDay: List[str] = Query([], description="Name of an item used each day, repeat for more")
+):
+    """
+    Forecast which items expire or run out of uses on each of the next days
+    without changing any data
+
+    Parameters:
+    - numOfDays: Number of days to forecast
+    - itemsToBeUsedPerDay: itemIds of the items used each day, e.g.
+      ?itemsToBeUsedPerDay=001&itemsToBeUsedPerDay=002; an id listed twice
+      is used twice a day
+    - namesToBeUsedPerDay: Names of items used each day, as for /day
+
+    Returns: ForecastResponse with a day-by-day timeline
+    """
+    try:
+        return await forecast_simulation(
+            numOfDays,
+            [{"itemId": item_id} for item_id in itemsToBeUsedPerDay] + [{"name": name} for name in namesToBeUsedPerDay]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during forecast: {str(e)}")
+
 @router.post("/reset")
 async def reset_simulation_time():
     """
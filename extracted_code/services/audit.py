@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from database import logs_collection
+
+logger = logging.getLogger(__name__)
+
+# Buffered log entries written per insert_many
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+# Seconds between background flushes of the log buffer
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+# Write every entry before returning instead of buffering it
+AUDIT_SYNC = os.getenv("AUDIT_SYNC", "false").lower() in ("1", "true", "yes")
+# Most entries kept buffered while writes fail; the oldest are dropped beyond it
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "100000"))
+
+_buffer: List[Dict[str, Any]] = []
+_flusher: Optional[asyncio.Task] = None
+# Held while a flush is writing, so a sync write waits for batches in flight
+_flush_lock: Optional[asyncio.Lock] = None
+# Entries dropped because the buffer was full, since the process started,
+# and how many of them aren't yet recorded in the audit log itself
+_dropped = 0
+_unreported = 0
+
+
+class AuditLogError(Exception):
+    """Raised when entries written synchronously could not be stored"""
+
+
+async def log_event(entry: Dict[str, Any], sync: bool = False):
+    """Add an entry to the audit log; see log_events"""
+    await log_events([entry], sync)
+
+
+async def log_events(entries: Iterable[Dict[str, Any]], sync: bool = False):
+    """
+    Add entries to the audit log.
+
+    Entries are buffered and written in batches, when the buffer is full or
+    on the next background flush. entries may be a generator: it is consumed
+    AUDIT_BATCH_SIZE entries at a time and full batches are written as it
+    goes, so a long stream of entries is never held in memory at once. With
+    sync (or AUDIT_SYNC) they are written, together with anything buffered
+    before them, before this returns, and AuditLogError is raised if that
+    fails; entries that failed to insert stay buffered for the next flush.
+    """
+    written = True
+    entries = iter(entries)
+    while True:
+        chunk = list(itertools.islice(entries, AUDIT_BATCH_SIZE))
+        if not chunk:
+            break
+        _buffer.extend(chunk)
+        _trim_buffer()
+        # After a failed write the rest is only buffered, not retried per batch
+        if written and len(_buffer) >= AUDIT_BATCH_SIZE:
+            written = await flush_audit_log()
+    if sync or AUDIT_SYNC:
+        if not await flush_audit_log() or not written:
+            raise AuditLogError("Audit log entries could not be written")
+    else:
+        start_audit_flusher()
+
+
+def _trim_buffer():
+    """Drop the oldest entries beyond AUDIT_MAX_BUFFER"""
+    global _buffer, _dropped, _unreported
+    excess = len(_buffer) - AUDIT_MAX_BUFFER
+    if excess > 0:
+        _buffer = _buffer[excess:]
+        _dropped += excess
+        _unreported += excess
+        logger.warning("Audit log buffer full: dropped %d oldest entries (%d in total)", excess, _dropped)
+
+
+def audit_dropped_count() -> int:
+    """Number of audit log entries dropped because the buffer was full"""
+    return _dropped
+
+
+async def flush_audit_log() -> bool:
+    """
+    Write all buffered entries. Returns False if some entries could not be
+    written. Flushes run one at a time, so when this returns every entry
+    buffered before the call has been written or has failed.
+
+    Once writes succeed again after entries were dropped, an auditDropped
+    entry records how many were lost.
+    """
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    async with _flush_lock:
+        return await _write_buffer()
+
+
+async def _write_buffer() -> bool:
+    global _buffer, _unreported
+    written = True
+    while _buffer:
+        batch, _buffer = _buffer[:AUDIT_BATCH_SIZE], _buffer[AUDIT_BATCH_SIZE:]
+        try:
+            await logs_collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # The rest of the batch was written, don't retry it
+            logger.error("Error writing audit log: %d entries failed", len(e.details.get("writeErrors", [])))
+            written = False
+        except asyncio.CancelledError:
+            # The background flusher is being stopped, keep the batch
+            _buffer = batch + _buffer
+            raise
+        except Exception:
+            # Keep the batch for the next flush
+            logger.exception("Error writing audit log")
+            _buffer = batch + _buffer
+            _trim_buffer()
+            return False
+    if _unreported:
+        dropped = _unreported
+        try:
+            await logs_collection.insert_one({
+                "timestamp": datetime.utcnow(),
+                "actionType": "auditDropped",
+                "itemId": "audit_log",
+                "details": {"droppedEntries": dropped}
+            })
+            _unreported -= dropped
+        except Exception:
+            logger.exception("Error writing audit log")
+    return written
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(AUDIT_FLUSH_INTERVAL)
+        await flush_audit_log()
+
+
+def start_audit_flusher():
+    """Start the background flush task if it isn't running"""
+    global _flusher
+    if _flusher is None or _flusher.done():
+        _flusher = asyncio.get_running_loop().create_task(_flush_periodically())
+
+
+async def stop_audit_log():
+    """Stop the background flush task and write what is left in the buffer"""
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+        _flusher = None
+    await flush_audit_log()
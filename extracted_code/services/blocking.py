@@ -0,0 +1,140 @@
+import heapq
+from typing import Dict, List, Optional, Set
+
+from services.numpy_kernel import blocking_matrix, box_array, numpy_available
+from services.occupancy import Box
+
+
+def blocks(a: Box, b: Box) -> bool:
+    """
+    Check if box a has to be taken out before box b can be pulled out of the
+    open face (depth 0): a overlaps b's width and height span and lies in
+    front of it. Boxes that only touch edges don't block each other.
+    """
+    return (
+        a[0] < b[3] and b[0] < a[3] and
+        a[2] < b[5] and b[2] < a[5] and
+        a[4] <= b[1]
+    )
+
+
+class BlockingGraph:
+    """
+    Blocking dependencies between the items of one container.
+
+    An edge A -> B means A must leave before B can come out along the open
+    face. Depth strictly increases along every edge, so the graph is a DAG.
+    It is built once from the container's boxes and then updated item by
+    item as items are placed or removed.
+    """
+
+    def __init__(self):
+        self.boxes: Dict[str, Box] = {}
+        self.blockers: Dict[str, Set[str]] = {}  # Items directly in front of an item
+        self.blocked: Dict[str, Set[str]] = {}   # Items directly behind an item
+
+    @classmethod
+    def build(cls, boxes: Dict[str, Box]) -> "BlockingGraph":
+        """Build the graph for a whole container at once"""
+        graph = cls()
+        item_ids = list(boxes)
+        for item_id in item_ids:
+            graph.boxes[item_id] = boxes[item_id]
+            graph.blockers[item_id] = set()
+            graph.blocked[item_id] = set()
+        if numpy_available() and item_ids:
+            matrix = blocking_matrix(box_array([boxes[item_id] for item_id in item_ids]))
+            for a, b in zip(*matrix.nonzero()):
+                graph.blockers[item_ids[b]].add(item_ids[a])
+                graph.blocked[item_ids[a]].add(item_ids[b])
+        else:
+            for a in item_ids:
+                for b in item_ids:
+                    if a != b and blocks(boxes[a], boxes[b]):
+                        graph.blockers[b].add(a)
+                        graph.blocked[a].add(b)
+        return graph
+
+    def add(self, item_id: str, box: Box):
+        """Add a placed item and its edges to every other item in the container"""
+        self.remove(item_id)
+        self.boxes[item_id] = box
+        self.blockers[item_id] = set()
+        self.blocked[item_id] = set()
+        for other_id, other in self.boxes.items():
+            if other_id == item_id:
+                continue
+            if blocks(other, box):
+                self.blockers[item_id].add(other_id)
+                self.blocked[other_id].add(item_id)
+            elif blocks(box, other):
+                self.blocked[item_id].add(other_id)
+                self.blockers[other_id].add(item_id)
+
+    def remove(self, item_id: str):
+        """Remove an item and its edges"""
+        if item_id not in self.boxes:
+            return
+        del self.boxes[item_id]
+        for other_id in self.blockers.pop(item_id):
+            self.blocked[other_id].discard(item_id)
+        for other_id in self.blocked.pop(item_id):
+            self.blockers[other_id].discard(item_id)
+
+    def retrieval_order(self, item_id: str, box: Optional[Box] = None) -> List[str]:
+        """
+        Items to take out before item_id can be retrieved, in removal order.
+
+        Includes transitive blockers (items in front of a blocker) and is a
+        topological order of the graph: every item comes after all items
+        blocking it, front-most first among those that are free. box is used
+        for an item that is not in the graph.
+        """
+        return [other_id for other_id in self.removal_order({item_id: box}) if other_id != item_id]
+
+    def removal_order(self, targets: Dict[str, Optional[Box]]) -> List[str]:
+        """
+        Items to take out to retrieve all targets, targets included, in
+        removal order.
+
+        targets maps itemId to its box, which is only used for items not in
+        the graph. A blocker shared by several targets appears once, and a
+        target in front of another one is taken out as part of the order.
+        """
+        stack = []
+        outside = []
+        for item_id, box in targets.items():
+            if item_id in self.blockers:
+                stack.append(item_id)
+            elif box is not None:
+                outside.append(item_id)
+                stack.extend(other_id for other_id, other in self.boxes.items() if blocks(other, box))
+
+        # Collect the targets and every item in front of them
+        nodes = set()
+        while stack:
+            other_id = stack.pop()
+            if other_id not in nodes:
+                nodes.add(other_id)
+                stack.extend(self.blockers[other_id])
+
+        # Kahn's algorithm on that subgraph
+        remaining = {a: len(self.blockers[a] & nodes) for a in nodes}
+        ready = [self._order_key(a) for a, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, current = heapq.heappop(ready)
+            order.append(current)
+            for other_id in self.blocked[current]:
+                if other_id in remaining:
+                    remaining[other_id] -= 1
+                    if remaining[other_id] == 0:
+                        heapq.heappush(ready, self._order_key(other_id))
+
+        # Targets missing from the graph block nothing in it, so they go last
+        outside.sort(key=lambda item_id: (targets[item_id][1], item_id))
+        return order + outside
+
+    def _order_key(self, item_id: str):
+        return self.boxes[item_id][1], item_id
@@ -0,0 +1,37 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Number of worker processes for CPU-bound placement work. Defaults to the
+# number of cores; 0 runs the work on a thread instead of a separate process.
+PLACEMENT_WORKERS = int(os.getenv("PLACEMENT_WORKERS", str(os.cpu_count() or 1)))
+
+_pool = None
+
+
+def get_placement_pool():
+    """Get the shared placement process pool, creating it on first use"""
+    global _pool
+    if _pool is None and PLACEMENT_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=PLACEMENT_WORKERS)
+    return _pool
+
+
+async def run_in_placement_pool(func, *args, **kwargs):
+    """
+    Run a CPU-bound function off the event loop and await its result.
+
+    Arguments and return values must be picklable (plain dicts, lists and
+    strings) since they cross a process boundary.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_placement_pool(), partial(func, *args, **kwargs))
+
+
+def shutdown_placement_pool():
+    """Stop the placement worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from database import items_collection
+
+# Formats accepted for expiry dates besides ISO 8601
+EXPIRY_FORMATS = ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%d")
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Convert an aware datetime to naive UTC, the form expiresAt is stored in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_expiry(value) -> Optional[datetime]:
+    """
+    Parse an expiryDate into a naive UTC datetime, stored as expiresAt.
+    Returns None for missing or unparseable dates, which never expire.
+    """
+    if isinstance(value, datetime):
+        expires_at = value
+    elif isinstance(value, str) and value:
+        try:
+            expires_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            for fmt in EXPIRY_FORMATS:
+                try:
+                    expires_at = datetime.strptime(value, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None
+    else:
+        return None
+    return to_utc_naive(expires_at)
+
+
+async def backfill_expires_at(batch_size: int = 1000):
+    """Set expiresAt on items stored before the field existed"""
+    updates = []
+    async for item in items_collection.find({"expiresAt": {"$exists": False}}, {"_id": 1, "expiryDate": 1}):
+        updates.append(UpdateOne({"_id": item["_id"]}, {"$set": {"expiresAt": parse_expiry(item.get("expiryDate"))}}))
+        if len(updates) >= batch_size:
+            await items_collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await items_collection.bulk_write(updates, ordered=False)
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of upcoming expiry instants of items that aren't waste.
+
+    Rescheduling or cancelling an item only updates its current expiry;
+    stale heap entries are skipped when they reach the top and the heap is
+    rebuilt when they make up most of it. Popping the k items expired by a
+    given instant costs O(k log n).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._expiry: Dict[str, datetime] = {}
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def schedule(self, item_id: str, expires_at: Optional[datetime]):
+        """Set an item's expiry; None means it never expires"""
+        if expires_at is None:
+            self.cancel(item_id)
+            return
+        if self._expiry.get(item_id) == expires_at:
+            return
+        self._expiry[item_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, item_id))
+        if len(self._heap) > 2 * len(self._expiry) + 64:
+            self._rebuild()
+
+    def cancel(self, item_id: str):
+        self._expiry.pop(item_id, None)
+
+    def peek_expired(self, until: datetime) -> List[str]:
+        """
+        Return the items expiring at or before until without removing them.
+        Only the part of the heap at or before until is visited.
+        """
+        expired = []
+        stack = [0] if self._heap else []
+        while stack:
+            i = stack.pop()
+            expires_at, item_id = self._heap[i]
+            if expires_at > until:
+                continue
+            if self._expiry.get(item_id) == expires_at:
+                expired.append(item_id)
+            stack.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(self._heap))
+        # An item rescheduled back to an earlier expiry can have two live entries
+        return list(dict.fromkeys(expired))
+
+    def discard_expired(self, item_ids: Iterable[str], until: datetime):
+        """
+        Remove items returned by peek_expired once they are handled; items
+        rescheduled past until in the meantime are kept
+        """
+        for item_id in item_ids:
+            expires_at = self._expiry.get(item_id)
+            if expires_at is not None and expires_at <= until:
+                del self._expiry[item_id]
+        # Drop the now stale entries from the top of the heap, so the next
+        # peek doesn't walk past everything that already expired
+        heap = self._heap
+        while heap and heap[0][0] <= until and self._expiry.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def pop_expired(self, until: datetime) -> List[str]:
+        """Remove and return the items expiring at or before until"""
+        expired = []
+        while self._heap and self._heap[0][0] <= until:
+            expires_at, item_id = heapq.heappop(self._heap)
+            if self._expiry.get(item_id) == expires_at:
+                del self._expiry[item_id]
+                expired.append(item_id)
+        return expired
+
+    def _rebuild(self):
+        self._heap = [(expires_at, item_id) for item_id, expires_at in self._expiry.items()]
+        heapq.heapify(self._heap)
+
+
+_scheduler = ExpiryScheduler()
+_loaded = False
+_load_lock: Optional[asyncio.Lock] = None
+
+
+async def load_expiry_scheduler():
+    """(Re)build the scheduler from the expiry index"""
+    global _scheduler, _loaded
+    scheduler = ExpiryScheduler()
+    query = {"isWaste": False, "expiresAt": {"$ne": None}}
+    async for item in items_collection.find(query, {"_id": 0, "itemId": 1, "expiresAt": 1}):
+        scheduler._expiry[item["itemId"]] = item["expiresAt"]
+    scheduler._rebuild()
+    _scheduler = scheduler
+    _loaded = True
+
+
+async def get_expiry_scheduler() -> ExpiryScheduler:
+    """The expiry scheduler, loaded on first use"""
+    global _load_lock
+    if not _loaded:
+        if _load_lock is None:
+            _load_lock = asyncio.Lock()
+        async with _load_lock:
+            if not _loaded:
+                await load_expiry_scheduler()
+    return _scheduler
+
+
+def record_expiries(items: Iterable[Tuple[str, Optional[datetime]]]):
+    """Record (itemId, expiresAt) pairs of inserted or updated items"""
+    if not _loaded:
+        return
+    for item_id, expires_at in items:
+        _scheduler.schedule(item_id, expires_at)
+
+
+def forget_expiries(item_ids: Iterable[str]):
+    """Drop removed items from the scheduler"""
+    if not _loaded:
+        return
+    for item_id in item_ids:
+        _scheduler.cancel(item_id)
@@ -0,0 +1,315 @@
+from models.item import ItemsImportResponse
+from models.container import ContainersImportResponse
+from models.placement import ContainerPlacement
+from database import items_collection, containers_collection
+import codecs
+import csv
+import os
+from datetime import datetime
+from services.placement import place_all_items, save_placements, load_occupancy
+from services.occupancy_cache import record_containers, record_packers
+from services.retrieval_cache import invalidate_items
+from services.expiry import parse_expiry, record_expiries
+from services.name_index import normalize_name, record_names
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Rows are written to MongoDB and placed in batches of this size
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Uploads are read in chunks of this many bytes
+IMPORT_CHUNK_SIZE = 64 * 1024
+# Row errors (and unplaced items) listed in an import response; the rest are
+# only counted, so the response and the job storing it stay small
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+class ImportErrors:
+    """Errors of one import: every error is counted, the first limit are kept"""
+
+    def __init__(self, limit=None):
+        self.limit = IMPORT_MAX_ERRORS if limit is None else limit
+        self.examples = []
+        self.count = 0
+
+    def append(self, error):
+        self.count += 1
+        if len(self.examples) < self.limit:
+            self.examples.append(error)
+
+async def iter_csv_rows(file, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Yield parsed CSV rows from an uploaded file without reading it whole.
+
+    The file is read in chunks and decoded incrementally; a record is parsed
+    once its line is complete and its quotes are balanced, so quoted fields
+    may span lines and chunk boundaries.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""  # Text after the last newline seen so far
+    record = ""   # Lines of a record whose quoted field is still open
+    while True:
+        chunk = await file.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if not chunk and pending:
+            lines.append(pending)
+            pending = ""
+        for line in lines:
+            record += line + "\n"
+            if record.count('"') % 2 == 0:
+                yield next(csv.reader([record]))
+                record = ""
+        if not chunk:
+            break
+    if record:
+        yield next(csv.reader([record]))
+
+async def bulk_upsert(collection, key, upserts, errors):
+    """
+    Upsert a batch of imported rows with a single unordered bulk_write.
+
+    upserts maps each key value to (row, set fields, insert-only fields).
+    Rows the server rejects are reported in errors by their CSV row number
+    and the set of failed key values is returned; the rest of the batch is
+    still written.
+    """
+    if not upserts:
+        return set()
+    keys = list(upserts)
+    operations = []
+    for value in keys:
+        row, fields, insert_fields = upserts[value]
+        update = {"$set": fields}
+        if insert_fields:
+            update["$setOnInsert"] = insert_fields
+        operations.append(UpdateOne({key: value}, update, upsert=True))
+    
+    failed = set()
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Map each write error back to the CSV row through its operation index
+        for error in e.details.get("writeErrors", []):
+            value = keys[error["index"]]
+            failed.add(value)
+            errors.append({"row": upserts[value][0], "message": error.get("errmsg", "Write failed")})
+    return failed
+
+async def write_and_place_batch(upserts, containers, occupancy, errors, unplaced, progress=None):
+    """
+    Flush one batch of imported items to MongoDB and place them.
+
+    occupancy carries the packers (or boxes) filled by earlier batches so
+    batches don't overlap and stored boxes are replayed at most once. Write errors go to errors and items that didn't fit to
+    unplaced. Returns the number of written, placed and unplaceable items.
+    """
+    failed = await bulk_upsert(items_collection, "itemId", upserts, errors)
+    invalidate_items(upserts)
+    record_names(
+        (item_id, fields["name"]) for item_id, (row, fields, insert_fields) in upserts.items()
+        if item_id not in failed
+    )
+    record_expiries(
+        (item_id, fields["expiresAt"]) for item_id, (row, fields, insert_fields) in upserts.items()
+        if item_id not in failed
+    )
+    batch_items = [
+        {**fields, **insert_fields}
+        for item_id, (row, fields, insert_fields) in upserts.items()
+        if item_id not in failed
+    ]
+    
+    if not batch_items or not containers:
+        return len(batch_items), 0, 0
+    
+    placements, unplaced_items = await place_all_items(batch_items, containers, progress, occupancy)
+    
+    # Save successful placements
+    if placements:
+        await save_placements(placements)
+    await record_packers(occupancy)
+    
+    for item in unplaced_items:
+        unplaced.append({
+            "row": "unplaced",
+            "message": f"Could not place item {item['itemId']} in any container"
+        })
+    
+    return len(batch_items), len(placements), len(unplaced_items)
+
+async def import_items_csv(file, progress=None):
+    """
+    Import items from an uploaded CSV file and place them in containers.
+
+    file only needs an async read(size) (an UploadFile). Rows are streamed,
+    validated and flushed in batches of IMPORT_BATCH_SIZE, so memory stays
+    flat regardless of file size; each batch is placed into the space left
+    by existing placements and the previous batches. progress receives
+    running totals across batches.
+    Returns an ItemsImportResponse.
+    """
+    # Get available containers once for all batches
+    containers = []
+    async for container in containers_collection.find({}):
+        containers.append(ContainerPlacement(
+            containerId=container["containerId"],
+            zone=container["zone"],
+            width=container["width"],
+            depth=container["depth"],
+            height=container["height"]
+        ))
+    
+    # Rows of the current batch by itemId; a repeated id keeps its last row
+    upserts = {}
+    errors = ImportErrors()
+    unplaced = ImportErrors()
+    # Start from what is already stored so new items go into the free space
+    # only; boxes of re-imported items stay taken until this import ends
+    occupancy = await load_occupancy([c.containerId for c in containers])
+    totals = {"written": 0, "placed": 0, "unplaceable": 0}
+    
+    async def batch_progress(placed, remaining, unplaceable):
+        if progress:
+            await progress(totals["placed"] + placed, remaining, totals["unplaceable"] + unplaceable)
+    
+    async def flush():
+        written, placed, unplaceable = await write_and_place_batch(
+            upserts, containers, occupancy, errors, unplaced, batch_progress
+        )
+        totals["written"] += written
+        totals["placed"] += placed
+        totals["unplaceable"] += unplaceable
+        upserts.clear()
+    
+    # Stream rows, skipping the header row
+    i = 0
+    async for row in iter_csv_rows(file):
+        i += 1
+        if i == 1:
+            continue
+        try:
+            if len(row) < 9:
+                errors.append({"row": i, "message": f"Not enough columns. Expected 9, got {len(row)}"})
+                continue
+            
+            item_id, name, width_str, depth_str, height_str, priority_str, expiry_date, usage_limit_str, preferred_zone = row
+            
+            # Validate numeric fields
+            try:
+                width = float(width_str)
+                depth = float(depth_str)
+                height = float(height_str)
+                priority = int(priority_str)
+                usage_limit = int(usage_limit_str)
+            except ValueError:
+                errors.append({"row": i, "message": "Invalid numeric value"})
+                continue
+            
+            # Validate date format
+            expires_at = parse_expiry(expiry_date)
+            if expires_at is None:
+                errors.append({"row": i, "message": "Invalid date format. Expected YYYY-MM-DD"})
+                continue
+            
+            # Prepare item data
+            item_data = {
+                "itemId": item_id,
+                "name": name,
+                "nameLower": normalize_name(name),
+                "width": width,
+                "depth": depth,
+                "height": height,
+                "priority": priority,
+                "expiryDate": expiry_date,
+                "expiresAt": expires_at,
+                "usageLimit": usage_limit,
+                "currentUses": 0,
+                "preferredZone": preferred_zone,
+                "allowNonPreferredZone": True,
+                "isWaste": False
+            }
+            
+            # Insert new items, overwrite existing ones but keep their createdAt
+            upserts.pop(item_id, None)
+            upserts[item_id] = (i, item_data, {"createdAt": datetime.now().isoformat()})
+        except Exception as e:
+            errors.append({"row": i, "message": str(e)})
+        
+        if len(upserts) >= IMPORT_BATCH_SIZE:
+            await flush()
+    
+    await flush()
+    
+    return ItemsImportResponse(
+        success=True,
+        itemsImported=totals["written"],
+        errors=errors.examples + unplaced.examples,
+        errorCount=errors.count,
+        unplacedCount=unplaced.count
+    )
+
+async def import_containers_csv(file):
+    """
+    Import containers from an uploaded CSV file.
+
+    Rows are streamed and upserted in batches of IMPORT_BATCH_SIZE with one
+    bulk_write per batch. Returns a ContainersImportResponse.
+    """
+    upserts = {}
+    containers_imported = 0
+    errors = ImportErrors()
+    
+    async def flush():
+        failed = await bulk_upsert(containers_collection, "containerId", upserts, errors)
+        await record_containers([
+            {"containerId": container_id, **fields}
+            for container_id, (row, fields, insert_fields) in upserts.items()
+            if container_id not in failed
+        ])
+        imported = len(upserts) - len(failed)
+        upserts.clear()
+        return imported
+    
+    # Stream rows, skipping the header row
+    i = 0
+    async for row in iter_csv_rows(file):
+        i += 1
+        if i == 1:
+            continue
+        try:
+            if len(row) < 5:
+                errors.append({"row": i, "message": f"Not enough columns. Expected 5, got {len(row)}"})
+                continue
+            
+            container_id, zone, width_str, depth_str, height_str = row
+            
+            # Validate numeric fields
+            try:
+                width = float(width_str)
+                depth = float(depth_str)
+                height = float(height_str)
+            except ValueError:
+                errors.append({"row": i, "message": "Invalid numeric value"})
+                continue
+            
+            now = datetime.now().isoformat()
+            upserts.pop(container_id, None)
+            upserts[container_id] = (
+                i,
+                {"zone": zone, "width": width, "depth": depth, "height": height, "updatedAt": now},
+                {"createdAt": now}
+            )
+        except Exception as e:
+            errors.append({"row": i, "message": str(e)})
+        
+        if len(upserts) >= IMPORT_BATCH_SIZE:
+            containers_imported += await flush()
+    
+    containers_imported += await flush()
+    
+    return ContainersImportResponse(
+        success=True,
+        containersImported=containers_imported,
+        errors=errors.examples,
+        errorCount=errors.count
+    )
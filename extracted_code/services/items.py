@@ -0,0 +1,80 @@
+from database import items_collection, placements_collection, containers_collection
+from services.pagination import projection
+
+# Documents fetched per round trip when iterating items with their placement
+ITEMS_BATCH_SIZE = 1000
+
+# Fields with_placement_status derives from the joined placement and container
+PLACEMENT_FIELDS = ("isPlaced", "containerId", "actualZone", "containerName", "position")
+
+def placement_lookup_stages():
+    """
+    Aggregation stages joining each item with its placement and container.
+
+    Placements are unique per itemId, so every item keeps exactly one row;
+    unplaced items get no placement or container field.
+    """
+    return [
+        {"$lookup": {
+            "from": placements_collection.name,
+            "localField": "itemId",
+            "foreignField": "itemId",
+            "as": "placement"
+        }},
+        {"$unwind": {"path": "$placement", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": containers_collection.name,
+            "localField": "placement.containerId",
+            "foreignField": "containerId",
+            "as": "container"
+        }},
+        {"$unwind": {"path": "$container", "preserveNullAndEmptyArrays": True}},
+        {"$project": {"placement._id": 0, "container._id": 0}}
+    ]
+
+def with_placement_status(item):
+    """Replace the joined placement and container with the placement status fields"""
+    placement = item.pop("placement", None)
+    container = item.pop("container", None)
+    if placement:
+        item.update({
+            "isPlaced": True,
+            "containerId": placement["containerId"],
+            "actualZone": container["zone"] if container else None,
+            "containerName": container.get("name", container["containerId"]) if container else None,
+            "position": {
+                "startCoordinates": placement["position"]["startCoordinates"],
+                "endCoordinates": placement["position"]["endCoordinates"]
+            } if "position" in placement else None
+        })
+    else:
+        item.update({
+            "isPlaced": False,
+            "containerId": None,
+            "actualZone": None,
+            "containerName": None,
+            "position": None
+        })
+    return item
+
+async def iter_items_with_placement(query=None, sort=None, limit=None, batch_size=ITEMS_BATCH_SIZE, names=None):
+    """
+    Yield items matching query with their placement status, using one
+    aggregation. sort and limit are applied before the joins.
+
+    names limits the returned top-level fields (it must include itemId).
+    The other item fields are projected away before the joins, and the
+    joins are skipped when no placement field is asked for.
+    """
+    pipeline = [{"$match": query}] if query else []
+    if sort:
+        pipeline.append({"$sort": sort})
+    if limit:
+        pipeline.append({"$limit": limit})
+    joined = names is None or any(name in PLACEMENT_FIELDS for name in names)
+    if names is not None:
+        pipeline.append({"$project": projection([name for name in names if name not in PLACEMENT_FIELDS])})
+    if joined:
+        pipeline += placement_lookup_stages()
+    async for item in items_collection.aggregate(pipeline, batchSize=batch_size):
+        yield with_placement_status(item) if joined else item
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import UploadFile
+
+from database import jobs_collection
+from models.placement import PlacementRequest
+from services.import_export import import_items_csv
+from services.placement import process_placement_request
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of jobs waiting to run; submissions beyond this are rejected
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Number of jobs processed concurrently
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+# Uploads are copied to disk in chunks of this size before the job runs
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_queue: Optional[asyncio.Queue] = None
+_workers = []
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the job queue is full"""
+
+
+def get_job_queue() -> asyncio.Queue:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    return _queue
+
+
+async def spool_upload(file) -> str:
+    """Copy an uploaded file to a temporary file, returns its path"""
+    fd, path = tempfile.mkstemp(prefix="isstow-upload-", suffix=".csv")
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+    return path
+
+
+async def submit_job(job_type: str, payload: Dict[str, Any]) -> str:
+    """Store a new job and queue it, returns the job id"""
+    queue = get_job_queue()
+    if queue.full():
+        raise JobQueueFullError(f"Job queue is full ({JOB_QUEUE_SIZE} jobs waiting)")
+
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    await jobs_collection.insert_one({
+        "jobId": job_id,
+        "jobType": job_type,
+        "status": "queued",
+        "payload": payload,
+        "progress": {"itemsPlaced": 0, "itemsRemaining": 0, "itemsUnplaceable": 0},
+        "result": None,
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now
+    })
+    try:
+        queue.put_nowait(job_id)
+    except asyncio.QueueFull:
+        # Another submission took the last slot while the job was stored;
+        # don't leave a queued job behind that no worker will ever run
+        await jobs_collection.delete_one({"jobId": job_id})
+        raise JobQueueFullError(f"Job queue is full ({JOB_QUEUE_SIZE} jobs waiting)")
+    return job_id
+
+
+async def get_job(job_id: str):
+    """Get a job document without its payload"""
+    return await jobs_collection.find_one({"jobId": job_id}, {"payload": 0})
+
+
+async def update_job(job_id: str, **fields):
+    await jobs_collection.update_one(
+        {"jobId": job_id},
+        {"$set": {**fields, "updatedAt": datetime.utcnow()}}
+    )
+
+
+def progress_reporter(job_id: str):
+    """Build a place_all_items progress callback that records counts on the job"""
+    async def report(placed: int, remaining: int, unplaceable: int):
+        await update_job(job_id, progress={
+            "itemsPlaced": placed,
+            "itemsRemaining": remaining,
+            "itemsUnplaceable": unplaceable
+        })
+    return report
+
+
+async def run_placement_job(job_id: str, payload: Dict[str, Any]):
+    request = PlacementRequest(**payload)
+    return await process_placement_request(request, progress_reporter(job_id))
+
+
+async def run_import_items_job(job_id: str, payload: Dict[str, Any]):
+    path = payload["path"]
+    try:
+        with open(path, "rb") as f:
+            upload = UploadFile(file=f, filename=payload.get("filename"))
+            return await import_items_csv(upload, progress_reporter(job_id))
+    finally:
+        os.remove(path)
+
+
+JOB_HANDLERS = {
+    "placement": run_placement_job,
+    "import_items": run_import_items_job,
+}
+
+
+async def run_job(job_id: str):
+    """Run a queued job and store its result or error"""
+    job = await jobs_collection.find_one({"jobId": job_id})
+    if not job or job["status"] != "queued":
+        return
+
+    await update_job(job_id, status="running")
+    try:
+        result = await JOB_HANDLERS[job["jobType"]](job_id, job["payload"])
+        await update_job(
+            job_id,
+            status="completed",
+            result=result.dict(),
+            finishedAt=datetime.utcnow()
+        )
+    except Exception as e:
+        logger.exception("Error running job %s", job_id)
+        await update_job(job_id, status="failed", error=str(e), finishedAt=datetime.utcnow())
+
+
+async def job_worker():
+    queue = get_job_queue()
+    while True:
+        job_id = await queue.get()
+        try:
+            await run_job(job_id)
+        finally:
+            queue.task_done()
+
+
+async def start_job_workers():
+    """Fail jobs interrupted by a restart and start the job workers"""
+    # Remove uploads that interrupted import jobs will never process
+    async for job in jobs_collection.find({"status": {"$in": ["queued", "running"]}, "jobType": "import_items"}):
+        path = job.get("payload", {}).get("path")
+        if path and os.path.exists(path):
+            os.remove(path)
+    await jobs_collection.update_many(
+        {"status": {"$in": ["queued", "running"]}},
+        {"$set": {
+            "status": "failed",
+            "error": "Interrupted by server restart",
+            "updatedAt": datetime.utcnow()
+        }}
+    )
+    for _ in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(job_worker()))
+
+
+async def stop_job_workers():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
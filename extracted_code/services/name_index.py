@@ -0,0 +1,143 @@
+import asyncio
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from database import items_collection
+
+# Minimum trigram similarity (0-1) for a fuzzy name match
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.3"))
+
+GRAM_SIZE = 3
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Normalized form of an item name, stored as nameLower"""
+    return (name or "").lower()
+
+
+def name_grams(name: str, padded: bool = False) -> Set[str]:
+    """Trigrams of a normalized name; padding adds grams for the word edges"""
+    if padded:
+        name = f"  {name} "
+    return {name[i:i + GRAM_SIZE] for i in range(len(name) - GRAM_SIZE + 1)}
+
+
+class NameIndex:
+    """
+    In-process trigram index over item names.
+
+    Substring search intersects the posting sets of the query's trigrams and
+    checks the few remaining names; fuzzy search ranks names by how many
+    (padded) trigrams they share with the query, which tolerates typos.
+    """
+
+    def __init__(self):
+        self._names: Dict[str, str] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, item_id: str, name: Optional[str]):
+        self.remove(item_id)
+        name = normalize_name(name)
+        self._names[item_id] = name
+        for gram in name_grams(name, padded=True):
+            self._grams.setdefault(gram, set()).add(item_id)
+
+    def remove(self, item_id: str):
+        name = self._names.pop(item_id, None)
+        if name is None:
+            return
+        for gram in name_grams(name, padded=True):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.discard(item_id)
+                if not postings:
+                    del self._grams[gram]
+
+    def contains(self, query: str) -> List[str]:
+        """itemIds whose name contains the query"""
+        query = normalize_name(query)
+        grams = name_grams(query)
+        if not grams:
+            # Too short for a trigram, check every name
+            return [item_id for item_id, name in self._names.items() if query in name]
+        postings = sorted((self._grams.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return [item_id for item_id in candidates if query in self._names[item_id]]
+
+    def fuzzy(self, query: str, threshold: float = FUZZY_THRESHOLD) -> List[Tuple[str, float]]:
+        """(itemId, similarity) of names similar to the query, most similar first"""
+        grams = name_grams(normalize_name(query), padded=True)
+        if not grams:
+            return []
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        matches = []
+        for item_id, count in shared.items():
+            total = len(grams) + len(name_grams(self._names[item_id], padded=True)) - count
+            similarity = count / total
+            if similarity >= threshold:
+                matches.append((item_id, similarity))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+
+_index = NameIndex()
+_loaded = False
+_load_lock: Optional[asyncio.Lock] = None
+
+
+async def load_name_index():
+    """(Re)build the index from the items collection"""
+    global _index, _loaded
+    index = NameIndex()
+    async for item in items_collection.find({}, {"_id": 0, "itemId": 1, "name": 1}):
+        index.add(item["itemId"], item.get("name"))
+    _index = index
+    _loaded = True
+
+
+async def get_name_index() -> NameIndex:
+    """The name index, loaded on first use"""
+    global _load_lock
+    if not _loaded:
+        if _load_lock is None:
+            _load_lock = asyncio.Lock()
+        async with _load_lock:
+            if not _loaded:
+                await load_name_index()
+    return _index
+
+
+async def backfill_name_lower(batch_size: int = 1000):
+    """Set nameLower on items stored before the field existed"""
+    updates = []
+    async for item in items_collection.find({"nameLower": {"$exists": False}}, {"_id": 1, "name": 1}):
+        updates.append(UpdateOne({"_id": item["_id"]}, {"$set": {"nameLower": normalize_name(item.get("name"))}}))
+        if len(updates) >= batch_size:
+            await items_collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await items_collection.bulk_write(updates, ordered=False)
+
+
+def record_names(items: Iterable[Tuple[str, Optional[str]]]):
+    """Record (itemId, name) pairs of inserted or renamed items"""
+    if not _loaded:
+        return
+    for item_id, name in items:
+        _index.add(item_id, name)
+
+
+def forget_names(item_ids: Iterable[str]):
+    """Drop deleted items from the index"""
+    if not _loaded:
+        return
+    for item_id in item_ids:
+        _index.remove(item_id)
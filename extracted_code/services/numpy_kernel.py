@@ -0,0 +1,238 @@
+from typing import List, Optional
+
+from services.occupancy import Box
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, placement falls back to the python backend
+    np = None
+
+# Candidate boxes are tested in blocks so a hit early in the list stops the
+# scan and the (candidates x placed boxes) overlap matrix stays small
+CANDIDATE_BLOCK = 256
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+class NumpyBoxIndex:
+    """
+    Occupancy index for a single container backed by a NumPy array.
+
+    Placed boxes live in an (n, 6) float array, one row per box, so a whole
+    block of candidate positions is tested against every placed box in a
+    single vectorized overlap computation. Answers are identical to BoxIndex.
+    """
+
+    vectorized = True
+
+    def __init__(self, boxes: Optional[List[Box]] = None):
+        self._array = np.empty((16, 6), dtype=np.float64)
+        self._boxes: List[Box] = []
+        for box in boxes or []:
+            self.add(box)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    @property
+    def _placed(self):
+        return self._array[:len(self._boxes)]
+
+    def add(self, box: Box):
+        """Add a placed box to the index"""
+        n = len(self._boxes)
+        if n == len(self._array):
+            grown = np.empty((n * 2, 6), dtype=np.float64)
+            grown[:n] = self._array
+            self._array = grown
+        self._array[n] = box
+        self._boxes.append(box)
+
+    def remove(self, box: Box) -> bool:
+        """Remove a previously added box, returns False if it is not indexed"""
+        try:
+            i = self._boxes.index(box)
+        except ValueError:
+            return False
+        last = len(self._boxes) - 1
+        # Move the last row into the hole to keep the array dense
+        self._array[i] = self._array[last]
+        self._boxes[i] = self._boxes[last]
+        self._boxes.pop()
+        return True
+
+    def _blocked(self, candidates):
+        """Boolean mask of candidate rows that overlap at least one placed box"""
+        placed = self._placed
+        c = candidates[:, None, :]
+        p = placed[None, :, :]
+        overlap = (
+            (c[..., 0] < p[..., 3]) & (p[..., 0] < c[..., 3]) &
+            (c[..., 1] < p[..., 4]) & (p[..., 1] < c[..., 4]) &
+            (c[..., 2] < p[..., 5]) & (p[..., 2] < c[..., 5])
+        )
+        return overlap.any(axis=1)
+
+    def _candidate_boxes(self, points, rotations, limits, reach=None):
+        """In-bounds candidate boxes and their flat (point, rotation) indices"""
+        keys = np.asarray(points, dtype=np.float64)
+        starts = keys[:, [2, 0, 1]]
+        dims = np.asarray(rotations, dtype=np.float64)
+        # (points, rotations, 3) end coordinates, flattened point-major so the
+        # candidate order matches the python backend
+        ends = starts[:, None, :] + dims[None, :, :]
+        in_bounds = (ends <= np.asarray(limits, dtype=np.float64)).all(axis=2)
+        if reach is not None:
+            in_bounds &= (dims[None, :, :] <= np.asarray(reach, dtype=np.float64)[:, None, :]).all(axis=2)
+        in_bounds = in_bounds.ravel()
+        order = np.flatnonzero(in_bounds)
+        boxes = np.concatenate(
+            [np.repeat(starts, len(rotations), axis=0), ends.reshape(-1, 3)], axis=1
+        )[order]
+        return boxes, order
+
+    def free_fits(self, points, rotations, limits, max_count: int, reach=None):
+        """Like first_fit, but return up to max_count free pairs in the same order"""
+        if not points:
+            return []
+        boxes, order = self._candidate_boxes(points, rotations, limits, reach)
+        found = []
+        for start in range(0, len(boxes), CANDIDATE_BLOCK):
+            block = boxes[start:start + CANDIDATE_BLOCK]
+            free = np.flatnonzero(~self._blocked(block)) if self._boxes else np.arange(len(block))
+            for hit in order[start + free[:max_count - len(found)]]:
+                found.append((int(hit) // len(rotations), int(hit) % len(rotations)))
+            if len(found) >= max_count:
+                break
+        return found
+
+    def first_fit(self, points, rotations, limits, reach=None):
+        """
+        Find the first free (point, rotation) pair.
+
+        Same contract as BoxIndex.first_fit: points are (depth, height, width)
+        tuples tried in order, each with every rotation in order. All in-bounds
+        candidates are built as one array and tested block by block against
+        every placed box at once.
+        """
+        if not points:
+            return None
+        boxes, order = self._candidate_boxes(points, rotations, limits, reach)
+        if not len(order):
+            return None
+        if not self._boxes:
+            hit = int(order[0])
+            return hit // len(rotations), hit % len(rotations)
+        for start in range(0, len(boxes), CANDIDATE_BLOCK):
+            free = np.flatnonzero(~self._blocked(boxes[start:start + CANDIDATE_BLOCK]))
+            if len(free):
+                hit = int(order[start + free[0]])
+                return hit // len(rotations), hit % len(rotations)
+        return None
+
+    def is_free(self, box: Box) -> bool:
+        """Check if the query box does not overlap any placed box"""
+        if not self._boxes:
+            return True
+        return not self._blocked(np.asarray([box], dtype=np.float64))[0]
+
+    def overlapping(self, box: Box) -> List[Box]:
+        """Return all placed boxes that overlap the query box"""
+        placed = self._placed
+        q = np.asarray(box, dtype=np.float64)
+        mask = (
+            (q[0] < placed[:, 3]) & (placed[:, 0] < q[3]) &
+            (q[1] < placed[:, 4]) & (placed[:, 1] < q[4]) &
+            (q[2] < placed[:, 5]) & (placed[:, 2] < q[5])
+        )
+        return [self._boxes[i] for i in np.flatnonzero(mask)]
+
+    def project(self, point, axis: int, epsilon: float = 0.0) -> float:
+        """Slide a point towards the origin along one axis until it hits a box or wall"""
+        placed = self._placed
+        mask = placed[:, axis + 3] <= point[axis] + epsilon
+        for a in range(3):
+            if a != axis:
+                mask &= (placed[:, a] <= point[a]) & (point[a] < placed[:, a + 3])
+        if not mask.any():
+            return 0.0
+        return float(placed[mask, axis + 3].max())
+
+    def reach(self, point, axis: int, limit: float) -> float:
+        """
+        Free distance from a point along one axis, up to limit. It is 0 if
+        the point lies inside a box.
+        """
+        placed = self._placed
+        mask = placed[:, axis + 3] > point[axis]
+        for a in range(3):
+            if a != axis:
+                mask &= (placed[:, a] <= point[a]) & (point[a] < placed[:, a + 3])
+        if not mask.any():
+            return limit
+        return min(limit, max(float(placed[mask, axis].min()) - point[axis], 0.0))
+
+
+def box_array(boxes: List[Box]):
+    """Stack boxes into an (n, 6) float array"""
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 6)
+
+
+def blocking_matrix(front, back=None):
+    """
+    Boolean matrix for (n, 6) and (m, 6) box arrays where [a, b] is True if
+    front box a overlaps back box b's width and height span and lies in
+    front of it. back defaults to front.
+    """
+    if back is None:
+        back = front
+    a = front[:, None, :]
+    b = back[None, :, :]
+    return (
+        (a[..., 0] < b[..., 3]) & (b[..., 0] < a[..., 3]) &
+        (a[..., 2] < b[..., 5]) & (b[..., 2] < a[..., 5]) &
+        (a[..., 4] <= b[..., 1])
+    )
+
+
+def waste_days(current_uses, usage_limits, uses_per_day, expiry_seconds):
+    """
+    Forecast the day each item becomes waste, vectorized over all items.
+
+    Takes arrays of current uses, usage limits (0 = unlimited; a negative
+    limit is already used up), uses per day and seconds from the start
+    until expiry (NaN = never). Returns a
+    float array of days (inf = never) and a boolean array that is True
+    where the item runs out of uses rather than expires. Matches
+    depletion_day in services/simulation.py.
+    """
+    current = np.asarray(current_uses, dtype=np.float64)
+    limits = np.asarray(usage_limits, dtype=np.float64)
+    per_day = np.asarray(uses_per_day, dtype=np.float64)
+    expiry_seconds = np.asarray(expiry_seconds, dtype=np.float64)
+    
+    # Same guard as depletion_day: only a missing or zero limit is unlimited
+    used = (limits != 0) & (per_day > 0)
+    depletion = np.full(current.shape, np.inf)
+    depletion[used] = np.ceil(np.maximum(limits[used] - current[used], 1) / per_day[used])
+    with np.errstate(invalid="ignore"):
+        expiry = np.where(np.isnan(expiry_seconds), np.inf, np.maximum(np.ceil(expiry_seconds / 86400), 1))
+    # Usage is processed before the expiry check, so a tie counts as depleted
+    return np.minimum(depletion, expiry), depletion <= expiry
+
+
+def containers_fit_mask(container_dimensions, dimensions):
+    """
+    Check which containers could hold an item in some orientation.
+
+    Takes an (m, 3) array of container (width, depth, height) and returns a
+    boolean array of length m, computed with one array comparison.
+    """
+    sorted_containers = np.sort(np.asarray(container_dimensions, dtype=np.float64), axis=1)
+    sorted_item = np.sort(np.asarray(dimensions, dtype=np.float64))
+    return (sorted_item[None, :] <= sorted_containers).all(axis=1)
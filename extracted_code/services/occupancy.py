@@ -0,0 +1,180 @@
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+# A box is stored as (x0, y0, z0, x1, y1, z1) in container coordinates
+# (width, depth, height). Start coordinates are inclusive, end coordinates
+# exclusive, so two boxes that only touch faces do not overlap.
+Box = Tuple[float, float, float, float, float, float]
+
+
+def make_box(pos, dimensions) -> Box:
+    """Build a box tuple from a start position and (width, depth, height)"""
+    return (
+        float(pos[0]), float(pos[1]), float(pos[2]),
+        float(pos[0] + dimensions[0]),
+        float(pos[1] + dimensions[1]),
+        float(pos[2] + dimensions[2]),
+    )
+
+
+def position_box(position) -> Box:
+    """Build a box tuple from a stored placement position dict"""
+    start = position["startCoordinates"]
+    end = position["endCoordinates"]
+    return (
+        float(start["width"]), float(start["depth"]), float(start["height"]),
+        float(end["width"]), float(end["depth"]), float(end["height"]),
+    )
+
+
+def boxes_overlap(a: Box, b: Box) -> bool:
+    """Check if two boxes share any volume"""
+    return (
+        a[0] < b[3] and b[0] < a[3] and
+        a[1] < b[4] and b[1] < a[4] and
+        a[2] < b[5] and b[2] < a[5]
+    )
+
+
+class BoxIndex:
+    """
+    Occupancy index for a single container.
+
+    Placed boxes are kept sorted by their start width (sweep-and-prune on the
+    width axis). An overlap query only looks at boxes whose width interval can
+    intersect the query, so its cost depends on the number of placed items and
+    not on their volume.
+    """
+
+    def __init__(self, boxes: Optional[List[Box]] = None):
+        self._starts: List[float] = []
+        self._boxes: List[Box] = []
+        self._max_width = 0.0
+        for box in boxes or []:
+            self.add(box)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    def add(self, box: Box):
+        """Add a placed box to the index"""
+        i = bisect_right(self._starts, box[0])
+        self._starts.insert(i, box[0])
+        self._boxes.insert(i, box)
+        self._max_width = max(self._max_width, box[3] - box[0])
+
+    def remove(self, box: Box) -> bool:
+        """Remove a previously added box, returns False if it is not indexed"""
+        lo = bisect_left(self._starts, box[0])
+        hi = bisect_right(self._starts, box[0])
+        for i in range(lo, hi):
+            if self._boxes[i] == box:
+                del self._starts[i]
+                del self._boxes[i]
+                return True
+        return False
+
+    def candidates(self, box: Box) -> List[Box]:
+        """Return placed boxes whose width interval intersects the query box"""
+        # No box wider than _max_width can reach the query from further left
+        lo = bisect_right(self._starts, box[0] - self._max_width)
+        hi = bisect_left(self._starts, box[3])
+        return [b for b in self._boxes[lo:hi] if b[3] > box[0]]
+
+    def overlapping(self, box: Box) -> List[Box]:
+        """Return all placed boxes that overlap the query box"""
+        return [b for b in self.candidates(box) if boxes_overlap(b, box)]
+
+    def first_fit(self, points, rotations, limits, reach=None) -> Optional[Tuple[int, int]]:
+        """
+        Find the first free (point, rotation) pair.
+
+        Points are (depth, height, width) tuples and are tried in the given
+        order, each with every rotation in order. A box must stay within the
+        (width, depth, height) limits, and within reach[i] (the free width,
+        depth and height in front of point i) when given. Returns (point
+        index, rotation index) or None if nothing fits.
+        """
+        for i, (y, z, x) in enumerate(points):
+            rw, rd, rh = reach[i] if reach is not None else (limits[0] - x, limits[1] - y, limits[2] - z)
+            for j, (w, d, h) in enumerate(rotations):
+                if x + w > limits[0] or y + d > limits[1] or z + h > limits[2]:
+                    continue
+                if w > rw or d > rd or h > rh:
+                    continue
+                if self.is_free(make_box((x, y, z), (w, d, h))):
+                    return i, j
+        return None
+
+    def free_fits(self, points, rotations, limits, max_count: int, reach=None) -> List[Tuple[int, int]]:
+        """Like first_fit, but return up to max_count free pairs in the same order"""
+        found = []
+        for i, (y, z, x) in enumerate(points):
+            rw, rd, rh = reach[i] if reach is not None else (limits[0] - x, limits[1] - y, limits[2] - z)
+            for j, (w, d, h) in enumerate(rotations):
+                if x + w > limits[0] or y + d > limits[1] or z + h > limits[2]:
+                    continue
+                if w > rw or d > rd or h > rh:
+                    continue
+                if self.is_free(make_box((x, y, z), (w, d, h))):
+                    found.append((i, j))
+                    if len(found) >= max_count:
+                        return found
+        return found
+
+    def _spanning(self, x: float) -> List[Box]:
+        """Placed boxes whose width interval contains x"""
+        lo = bisect_right(self._starts, x - self._max_width)
+        hi = bisect_right(self._starts, x)
+        return [b for b in self._boxes[lo:hi] if b[3] > x]
+
+    def project(self, point, axis: int, epsilon: float = 0.0) -> float:
+        """Slide a point towards the origin along one axis until it hits a box or wall"""
+        others = [a for a in range(3) if a != axis]
+        if axis == 0:
+            # Only boxes starting left of the point can stop it
+            boxes = self._boxes[:bisect_right(self._starts, point[0] + epsilon)]
+        else:
+            boxes = self._spanning(point[0])
+        limit = 0.0
+        for box in boxes:
+            if box[axis + 3] > point[axis] + epsilon:
+                continue
+            if all(box[a] <= point[a] < box[a + 3] for a in others):
+                limit = max(limit, box[axis + 3])
+        return limit
+
+    def reach(self, point, axis: int, limit: float) -> float:
+        """
+        Free distance from a point along one axis, up to limit. It is 0 if
+        the point lies inside a box.
+        """
+        others = [a for a in range(3) if a != axis]
+        reach = limit
+        boxes = self._spanning(point[0])
+        if axis == 0:
+            # Boxes are sorted by start width, so the first hit to the right
+            # of the point is the nearest one
+            for box in self._boxes[bisect_left(self._starts, point[0]):]:
+                if box[0] - point[0] >= reach:
+                    break
+                if all(box[a] <= point[a] < box[a + 3] for a in others):
+                    reach = box[0] - point[0]
+                    break
+        for box in boxes:
+            if box[axis + 3] > point[axis] and all(box[a] <= point[a] < box[a + 3] for a in others):
+                reach = min(reach, max(box[axis] - point[axis], 0.0))
+        return reach
+
+    def is_free(self, box: Box) -> bool:
+        """Check if the query box does not overlap any placed box"""
+        lo = bisect_right(self._starts, box[0] - self._max_width)
+        hi = bisect_left(self._starts, box[3])
+        for i in range(lo, hi):
+            b = self._boxes[i]
+            if b[3] > box[0] and boxes_overlap(b, box):
+                return False
+        return True
@@ -0,0 +1,305 @@
+import asyncio
+import itertools
+import os
+import pickle
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from database import containers_collection, placements_collection, occupancy_collection
+from services.blocking import BlockingGraph
+from services.occupancy import Box, position_box
+from services.retrieval_cache import clear_plans, invalidate_containers
+
+# Also write each container snapshot to the occupancy collection so other
+# processes and tools can read it without scanning placements
+OCCUPANCY_MIRROR = os.getenv("OCCUPANCY_MIRROR", "false").lower() in ("1", "true", "yes")
+
+
+class ContainerOccupancy:
+    """
+    Occupancy snapshot of one container.
+
+    version gets a new, never reused number on every change, so a reader
+    holding an older version knows its view of the container is stale.
+
+    A packer holding the boxes can be kept as well, so placing into the
+    container doesn't replay every box. Packers can't give space back, so
+    it is dropped when an item leaves or the container is resized.
+    """
+
+    def __init__(self, container_id: str):
+        self.container_id = container_id
+        self.zone = None
+        self.dimensions = None
+        self.volume = 0.0
+        self.boxes: Dict[str, Box] = {}
+        self.used_volume = 0.0
+        self.version = next(_versions)
+        self._graph: Optional[BlockingGraph] = None
+        self._packer = None
+        # Boxes added since the packer was kept, occupied when it's next used
+        self._pending: List[Box] = []
+
+    def set_dimensions(self, zone, width: float, depth: float, height: float):
+        self.zone = zone
+        if self.dimensions != (width, depth, height):
+            self._drop_packer()
+        self.dimensions = (width, depth, height)
+        self.volume = width * depth * height
+
+    def add(self, item_id: str, box: Box):
+        self.discard(item_id)
+        self.boxes[item_id] = box
+        self.used_volume += (box[3] - box[0]) * (box[4] - box[1]) * (box[5] - box[2])
+        if self._graph is not None:
+            self._graph.add(item_id, box)
+        if self._packer is not None:
+            self._pending.append(box)
+
+    def discard(self, item_id: str):
+        box = self.boxes.pop(item_id, None)
+        if box is not None:
+            self.used_volume -= (box[3] - box[0]) * (box[4] - box[1]) * (box[5] - box[2])
+            if self._graph is not None:
+                self._graph.remove(item_id)
+            self._drop_packer()
+
+    def _drop_packer(self):
+        self._packer = None
+        self._pending = []
+
+    def packer(self):
+        """The kept packer brought up to date, None if there is none"""
+        if self._packer is not None:
+            for box in self._pending:
+                self._packer.occupy(box)
+            self._pending = []
+        return self._packer
+
+    def keep_packer(self, packer) -> bool:
+        """Keep a copy of packer if it holds exactly the container's boxes"""
+        if self._packer is not None and not self._pending:
+            return False
+        if (packer.width, packer.depth, packer.height) != self.dimensions:
+            return False
+        if sorted(packer.index) != sorted(self.boxes.values()):
+            return False
+        self._packer = _copy_packer(packer)
+        self._pending = []
+        return True
+
+    def blocking_graph(self) -> BlockingGraph:
+        """Blocking graph of the container, built on first use and kept up to date after"""
+        if self._graph is None:
+            self._graph = BlockingGraph.build(self.boxes)
+        return self._graph
+
+    def snapshot(self) -> dict:
+        return {
+            "containerId": self.container_id,
+            "zone": self.zone,
+            "version": self.version,
+            "itemCount": len(self.boxes),
+            "volume": self.volume,
+            "usedVolume": self.used_volume,
+            "freeVolume": max(self.volume - self.used_volume, 0.0),
+            "utilization": self.used_volume / self.volume if self.volume else 0.0,
+        }
+
+
+_containers: Dict[str, ContainerOccupancy] = {}
+_item_container: Dict[str, str] = {}
+_loaded = False
+_load_lock: Optional[asyncio.Lock] = None
+_versions = itertools.count(1)
+
+
+def _copy_packer(packer):
+    # Pickling is how packers reach the worker processes anyway, and is far
+    # cheaper than replaying the boxes into a new one
+    return pickle.loads(pickle.dumps(packer))
+
+
+def _get_or_create(container_id: str) -> ContainerOccupancy:
+    if container_id not in _containers:
+        _containers[container_id] = ContainerOccupancy(container_id)
+    return _containers[container_id]
+
+
+async def load_occupancy_cache():
+    """(Re)build the cache from the containers and placements collections"""
+    global _loaded
+    _containers.clear()
+    _item_container.clear()
+    async for container in containers_collection.find({}):
+        _get_or_create(container["containerId"]).set_dimensions(
+            container.get("zone"), container["width"], container["depth"], container["height"]
+        )
+    async for placement in placements_collection.find({}, {"_id": 0, "itemId": 1, "containerId": 1, "position": 1}):
+        if not placement.get("position"):
+            continue
+        _get_or_create(placement["containerId"]).add(placement["itemId"], position_box(placement["position"]))
+        _item_container[placement["itemId"]] = placement["containerId"]
+    _loaded = True
+    clear_plans()
+    await _mirror(_containers.keys())
+
+
+async def ensure_occupancy_cache():
+    """Load the cache on first use"""
+    global _load_lock
+    if _loaded:
+        return
+    if _load_lock is None:
+        _load_lock = asyncio.Lock()
+    async with _load_lock:
+        if not _loaded:
+            await load_occupancy_cache()
+
+
+async def _mirror(container_ids: Iterable[str]):
+    if not OCCUPANCY_MIRROR:
+        return
+    for container_id in list(container_ids):
+        occupancy = _containers[container_id]
+        await occupancy_collection.update_one(
+            {"containerId": container_id},
+            {"$set": {
+                **occupancy.snapshot(),
+                "boxes": [[item_id, *box] for item_id, box in occupancy.boxes.items()],
+                "updatedAt": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+
+async def record_containers(containers):
+    """Record new or resized containers (dicts or models with containerId, zone, width, depth, height)"""
+    await ensure_occupancy_cache()
+    changed = set()
+    for container in containers:
+        data = container if isinstance(container, dict) else container.dict()
+        occupancy = _get_or_create(data["containerId"])
+        occupancy.set_dimensions(data.get("zone"), data["width"], data["depth"], data["height"])
+        occupancy.version = next(_versions)
+        changed.add(data["containerId"])
+    invalidate_containers(changed)
+    await _mirror(changed)
+
+
+async def record_placements(placements):
+    """Record stored placements (dicts or models with itemId, containerId, position)"""
+    await ensure_occupancy_cache()
+    changed = set()
+    for placement in placements:
+        data = placement if isinstance(placement, dict) else placement.dict()
+        item_id = data["itemId"]
+        previous = _item_container.get(item_id)
+        if previous is not None:
+            _containers[previous].discard(item_id)
+            changed.add(previous)
+        _get_or_create(data["containerId"]).add(item_id, position_box(data["position"]))
+        _item_container[item_id] = data["containerId"]
+        changed.add(data["containerId"])
+    for container_id in changed:
+        _containers[container_id].version = next(_versions)
+    invalidate_containers(changed)
+    await _mirror(changed)
+
+
+async def record_removals(item_ids: Iterable[str]):
+    """Record items taken out of their containers"""
+    await ensure_occupancy_cache()
+    changed = set()
+    for item_id in item_ids:
+        container_id = _item_container.pop(item_id, None)
+        if container_id is not None:
+            _containers[container_id].discard(item_id)
+            changed.add(container_id)
+    for container_id in changed:
+        _containers[container_id].version = next(_versions)
+    invalidate_containers(changed)
+    await _mirror(changed)
+
+
+async def get_packers(container_ids: Iterable[str]) -> Dict[str, object]:
+    """
+    Copies of the packers kept for the given containers, by containerId.
+
+    Containers without a kept packer are left out. The copies can be packed
+    into freely; the kept packers only follow what is recorded.
+    """
+    await ensure_occupancy_cache()
+    packers = {}
+    for container_id in container_ids:
+        occupancy = _containers.get(container_id)
+        packer = occupancy.packer() if occupancy else None
+        if packer is not None:
+            packers[container_id] = _copy_packer(packer)
+    return packers
+
+
+async def record_packers(packers: Dict[str, object]):
+    """
+    Keep packers (by containerId, as left in the occupancy argument of
+    place_all_items) for the next placement. Only packers holding exactly
+    the container's recorded boxes are kept; box lists and packers with
+    unsaved or since removed boxes are ignored.
+    """
+    await ensure_occupancy_cache()
+    for container_id, packer in packers.items():
+        occupancy = _containers.get(container_id)
+        if occupancy is not None and not isinstance(packer, list):
+            occupancy.keep_packer(packer)
+
+
+async def get_container_snapshot(container_id: str) -> Optional[dict]:
+    """Utilization and version of a container, None if it is unknown"""
+    await ensure_occupancy_cache()
+    occupancy = _containers.get(container_id)
+    return occupancy.snapshot() if occupancy else None
+
+
+async def get_all_snapshots() -> List[dict]:
+    await ensure_occupancy_cache()
+    return [occupancy.snapshot() for occupancy in _containers.values()]
+
+
+async def get_container_boxes(container_id: str, exclude_item_ids=None) -> List[Box]:
+    """Occupied boxes of a container, optionally leaving out some items"""
+    await ensure_occupancy_cache()
+    occupancy = _containers.get(container_id)
+    if not occupancy:
+        return []
+    exclude = set(exclude_item_ids or ())
+    return [box for item_id, box in occupancy.boxes.items() if item_id not in exclude]
+
+
+async def get_occupancy(container_ids=None, exclude_item_ids=None) -> Dict[str, List[Box]]:
+    """Occupied boxes per containerId, for all containers or the given ones"""
+    await ensure_occupancy_cache()
+    if container_ids is None:
+        container_ids = list(_containers)
+    return {
+        container_id: await get_container_boxes(container_id, exclude_item_ids)
+        for container_id in container_ids
+    }
+
+
+async def get_blocking_graph(container_id: str) -> BlockingGraph:
+    """Blocking graph of a container, empty if the container is unknown"""
+    await ensure_occupancy_cache()
+    occupancy = _containers.get(container_id)
+    return occupancy.blocking_graph() if occupancy else BlockingGraph()
+
+
+async def get_container_version(container_id: str) -> int:
+    await ensure_occupancy_cache()
+    occupancy = _containers.get(container_id)
+    return occupancy.version if occupancy else 0
+
+
+async def get_item_container(item_id: str) -> Optional[str]:
+    """containerId an item is stored in, None if it is not placed"""
+    await ensure_occupancy_cache()
+    return _item_container.get(item_id)
@@ -0,0 +1,387 @@
+import os
+from bisect import insort
+from itertools import permutations
+from typing import Dict, List, Optional, Tuple
+
+from services.blocking import blocks
+from services.numpy_kernel import NumpyBoxIndex, blocking_matrix, box_array, containers_fit_mask, np, numpy_available
+from services.occupancy import Box, BoxIndex, make_box
+
+# Which packing engine place_items_with_priority uses by default
+PLACEMENT_ENGINE = os.getenv("PLACEMENT_ENGINE", "extreme_point")
+# Which occupancy index backs the packers: "python" or "numpy"
+PLACEMENT_BACKEND = os.getenv("PLACEMENT_BACKEND", "python")
+
+# Tolerance for comparing float coordinates against container walls
+EPSILON = 1e-9
+
+# How many failed item sizes to remember per candidate point
+MAX_FAILURES = 4
+
+# Retrieval-cost engine: free positions scored per item, and the weights of
+# the terms of its cost function
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "32"))
+DEPTH_WEIGHT = 1.0
+BLOCKER_WEIGHT = 1.0
+BLOCKED_WEIGHT = 1.0
+COMPACTNESS_WEIGHT = 0.1
+# Priority assumed for boxes seeded from existing placements
+DEFAULT_PRIORITY = 50
+
+Placement = Tuple[Tuple[float, float, float], Tuple[float, float, float]]
+
+
+def orientations(dimensions) -> List[Tuple[float, float, float]]:
+    """Return the distinct axis-aligned rotations of (width, depth, height)"""
+    seen = []
+    for rotation in permutations(dimensions):
+        if rotation not in seen:
+            seen.append(rotation)
+    return seen
+
+
+class SkylinePacker:
+    """
+    Original placement strategy: scan width offsets left to right, keep a
+    depth skyline per offset and place everything on the floor without
+    rotating items.
+    """
+
+    def __init__(self, width: float, depth: float, height: float, index=None):
+        self.width = width
+        self.depth = depth
+        self.height = height
+        self.index = index if index is not None else BoxIndex()
+        self.max_depth_at_x: Dict[int, float] = {}
+
+    def can_fit(self, dimensions) -> bool:
+        """Check if an item can physically fit in an empty container"""
+        return all(d <= c for d, c in zip(dimensions, (self.width, self.depth, self.height)))
+
+    def occupy(self, box: Box):
+        """Mark an already placed box as occupied"""
+        self.index.add(box)
+        for x in range(int(box[0]), int(box[3])):
+            self.max_depth_at_x[x] = max(self.max_depth_at_x.get(x, 0), box[4])
+
+    def place(self, dimensions, priority=None) -> Optional[Placement]:
+        """Find a position for an item and mark it occupied, None if it does not fit"""
+        if not self.can_fit(dimensions):
+            return None
+        for x_start in range(0, int(self.width - dimensions[0]) + 1):
+            current_depth = max(
+                (self.max_depth_at_x.get(x, 0) for x in range(x_start, x_start + int(dimensions[0]))),
+                default=0
+            )
+            pos = (x_start, current_depth, 0)
+            box = make_box(pos, dimensions)
+            if box[4] <= self.depth + EPSILON and self.index.is_free(box):
+                self.occupy(box)
+                return pos, tuple(dimensions)
+        return None
+
+
+class ExtremePointPacker:
+    """
+    Extreme-point 3D bin packing.
+
+    Candidate positions are the extreme points created by the corners of
+    already placed boxes, projected back towards the container walls. Items
+    may be rotated into any of the six axis-aligned orientations and stacked
+    along the height axis. Points are tried front to back, bottom to top and
+    left to right, so earlier (higher priority) items end up near the open
+    face. A placement costs O(candidates), independent of item volume.
+    """
+
+    def __init__(self, width: float, depth: float, height: float, index=None):
+        self.width = width
+        self.depth = depth
+        self.height = height
+        self.index = index if index is not None else BoxIndex()
+        # Candidate points stored as (depth, height, width) so the sorted
+        # order is front-first, then bottom-first, then left-first
+        self._points: List[Tuple[float, float, float]] = [(0.0, 0.0, 0.0)]
+        # Free distance from each point along width, depth and height. An
+        # item only fits at a point if some rotation fits these, so points
+        # that can't take the item are skipped without an overlap test, and
+        # points with no room left along some axis are dropped
+        self._extents: Dict[Tuple[float, float, float], Tuple[float, float, float]] = {
+            (0.0, 0.0, 0.0): (width, depth, height)
+        }
+        # The same extents sorted: some rotation of an item fits them exactly
+        # when its sorted size fits
+        self._room: Dict[Tuple[float, float, float], Tuple[float, float, float]] = {
+            (0.0, 0.0, 0.0): tuple(sorted((width, depth, height)))
+        }
+        # Free space only shrinks, so once a size fails to fit at a point,
+        # any item at least as large in every sorted dimension fails there
+        # too. _failed holds sizes that failed at every current point; new
+        # points may still take them, so it is cleared when points are added
+        self._failed: List[Tuple[float, float, float]] = []
+        self._failed_at: Dict[Tuple[float, float, float], List[Tuple[float, float, float]]] = {}
+        self._free_volume = width * depth * height
+
+    def can_fit(self, dimensions) -> bool:
+        """Check if an item fits an empty container in any orientation"""
+        return all(
+            d <= c for d, c in zip(sorted(dimensions), sorted((self.width, self.depth, self.height)))
+        )
+
+    def _add_point(self, x: float, y: float, z: float):
+        if x >= self.width - EPSILON or y >= self.depth - EPSILON or z >= self.height - EPSILON:
+            return
+        key = (y, z, x)
+        if key in self._extents:
+            return
+        point = (x, y, z)
+        extents = (
+            self.index.reach(point, 0, self.width - x),
+            self.index.reach(point, 1, self.depth - y),
+            self.index.reach(point, 2, self.height - z),
+        )
+        if min(extents) <= EPSILON:
+            return
+        self._extents[key] = extents
+        self._room[key] = tuple(sorted(extents))
+        insort(self._points, key)
+
+    def _add_extreme_points(self, box: Box):
+        corners = [
+            (box[3], box[1], box[2]),
+            (box[0], box[4], box[2]),
+            (box[0], box[1], box[5]),
+        ]
+        for axis, corner in enumerate(corners):
+            self._add_point(*corner)
+            # Project each new corner along the two axes it was not pushed on
+            for other in range(3):
+                if other == axis:
+                    continue
+                projected = list(corner)
+                projected[other] = self.index.project(corner, other, EPSILON)
+                self._add_point(*projected)
+
+    def _shrink_points(self, box: Box):
+        """
+        Cut the free extents of the points a newly placed box stands in
+        front of, and drop the points it covers or leaves without room
+        """
+        dead = []
+        for key, extents in self._extents.items():
+            y, z, x = key
+            in_x = box[0] <= x < box[3]
+            in_y = box[1] <= y < box[4]
+            in_z = box[2] <= z < box[5]
+            if in_x + in_y + in_z < 2:
+                continue
+            reach = list(extents)
+            if in_y and in_z and box[3] > x:
+                reach[0] = min(reach[0], max(box[0] - x, 0.0))
+            if in_x and in_z and box[4] > y:
+                reach[1] = min(reach[1], max(box[1] - y, 0.0))
+            if in_x and in_y and box[5] > z:
+                reach[2] = min(reach[2], max(box[2] - z, 0.0))
+            if min(reach) <= EPSILON:
+                dead.append(key)
+            elif reach != list(extents):
+                self._extents[key] = tuple(reach)
+                self._room[key] = tuple(sorted(reach))
+        if dead:
+            for key in dead:
+                del self._extents[key]
+                del self._room[key]
+                self._failed_at.pop(key, None)
+            self._points = [key for key in self._points if key in self._extents]
+
+    def _open_points(self, size):
+        """Points where the sorted size fits the free extents and hasn't failed before"""
+        s0, s1, s2 = size[0] - EPSILON, size[1] - EPSILON, size[2] - EPSILON
+        room = self._room
+        failed_at = self._failed_at
+        return [
+            key for key in self._points
+            if room[key][0] >= s0 and room[key][1] >= s1 and room[key][2] >= s2
+            and not (key in failed_at and _dominates_any(size, failed_at[key]))
+        ]
+
+    def _reach(self, key):
+        """Free extents of a point, with the tolerance used for the walls"""
+        ex, ey, ez = self._extents[key]
+        return ex + EPSILON, ey + EPSILON, ez + EPSILON
+
+    def occupy(self, box: Box):
+        """Mark an already placed box as occupied and derive new extreme points"""
+        self.index.add(box)
+        self._free_volume -= (box[3] - box[0]) * (box[4] - box[1]) * (box[5] - box[2])
+        self._shrink_points(box)
+        points = len(self._points)
+        self._add_extreme_points(box)
+        if len(self._points) > points:
+            self._failed = []
+
+    def _rule_out(self, dimensions) -> bool:
+        """
+        Cheap checks showing place() would return None: the item doesn't fit
+        the empty container or the free volume, or a size no larger than it
+        already failed at every current candidate point
+        """
+        if not self.can_fit(dimensions):
+            return True
+        size = tuple(sorted(dimensions))
+        if size[0] * size[1] * size[2] > self._free_volume + EPSILON:
+            return True
+        return _dominates_any(size, self._failed)
+
+    def place(self, dimensions, priority=None) -> Optional[Placement]:
+        """
+        Find a position for an item and mark it occupied, None if it does not
+        fit. priority is not used by this engine.
+        """
+        if self._rule_out(dimensions):
+            return None
+        size = tuple(sorted(dimensions))
+        # Prefer the orientation that uses the least depth, then the least height
+        rotations = sorted(orientations(tuple(dimensions)), key=lambda r: (r[1], r[2], r[0]))
+        # Points without room for the item, or where a smaller item already
+        # failed, are dropped before the index builds any candidate box
+        points = self._open_points(size)
+        limits = (self.width + EPSILON, self.depth + EPSILON, self.height + EPSILON)
+        reach = [self._reach(key) for key in points]
+        hit = self.index.first_fit(points, rotations, limits, reach)
+        failed_points = points if hit is None else points[:hit[0]]
+        for key in failed_points:
+            self._failed_at[key] = _record_failure(self._failed_at.get(key, []), size)
+        if hit is None:
+            self._failed = _record_failure(self._failed, size)
+            return None
+        
+        y, z, x = points[hit[0]]
+        rotation = rotations[hit[1]]
+        self.occupy(make_box((x, y, z), rotation))
+        return (x, y, z), rotation
+
+class RetrievalCostPacker(ExtremePointPacker):
+    """
+    Extreme-point packing that also weighs how hard items will be to reach.
+
+    Instead of taking the first free position, the first RETRIEVAL_CANDIDATES
+    free (point, rotation) pairs are scored and the cheapest one wins. The
+    cost adds up, scaled by priority as a proxy for how often an item is
+    fetched:
+    - how deep the item sits, weighted by its own priority
+    - how many placed items block it, weighted by its own priority
+    - the priority of placed items it would block
+    - a small compactness term (depth, height, width offset) that keeps the
+      packing tight and breaks ties like the extreme-point engine
+    Blocking uses the same geometry as retrieval planning.
+    """
+
+    def __init__(self, width: float, depth: float, height: float, index=None):
+        super().__init__(width, depth, height, index=index)
+        self._placed: List[Tuple[Box, float]] = []
+
+    def occupy(self, box: Box, priority=None):
+        """Mark an already placed box as occupied"""
+        super().occupy(box)
+        self._placed.append((box, DEFAULT_PRIORITY if priority is None else priority))
+
+    def costs(self, boxes, priority: float) -> List[float]:
+        """Expected retrieval cost of putting an item of this priority at each box"""
+        weight = priority / 100
+        if getattr(self.index, "vectorized", False) and self._placed:
+            candidates = box_array(boxes)
+            placed = box_array([box for box, _ in self._placed])
+            priorities = np.asarray([p for _, p in self._placed], dtype=np.float64) / 100
+            blockers = blocking_matrix(placed, candidates).sum(axis=0)
+            blocked_mass = blocking_matrix(candidates, placed) @ priorities
+        else:
+            blockers = [sum(1 for other, _ in self._placed if blocks(other, box)) for box in boxes]
+            blocked_mass = [sum(p / 100 for other, p in self._placed if blocks(box, other)) for box in boxes]
+        return [
+            DEPTH_WEIGHT * weight * box[1] / self.depth +
+            BLOCKER_WEIGHT * weight * float(blockers[i]) +
+            BLOCKED_WEIGHT * float(blocked_mass[i]) +
+            COMPACTNESS_WEIGHT * (box[1] / self.depth + box[2] / self.height + box[0] / self.width)
+            for i, box in enumerate(boxes)
+        ]
+
+    def place(self, dimensions, priority=None) -> Optional[Placement]:
+        """Find the cheapest free position for an item and mark it occupied, None if it does not fit"""
+        if self._rule_out(dimensions):
+            return None
+        priority = DEFAULT_PRIORITY if priority is None else priority
+        rotations = sorted(orientations(tuple(dimensions)), key=lambda r: (r[1], r[2], r[0]))
+        limits = (self.width + EPSILON, self.depth + EPSILON, self.height + EPSILON)
+        size = tuple(sorted(dimensions))
+        points = self._open_points(size)
+        reach = [self._reach(key) for key in points]
+        hits = self.index.free_fits(points, rotations, limits, RETRIEVAL_CANDIDATES, reach)
+        if not hits:
+            self._failed = _record_failure(self._failed, size)
+            return None
+        
+        boxes = []
+        for point, rotation in hits:
+            y, z, x = points[point]
+            boxes.append(make_box((x, y, z), rotations[rotation]))
+        costs = self.costs(boxes, priority)
+        best = min(range(len(hits)), key=lambda i: costs[i])
+        self.occupy(boxes[best], priority)
+        return boxes[best][:3], rotations[hits[best][1]]
+
+
+def _dominates_any(size, failed_sizes) -> bool:
+    """Check if a sorted size is at least as large as any recorded failure"""
+    return any(all(s >= f for s, f in zip(size, failed)) for failed in failed_sizes)
+
+
+def _record_failure(failed_sizes, size):
+    """Add a failed size, keeping a few of the smallest non-dominated failures"""
+    kept = [f for f in failed_sizes if not all(a >= b for a, b in zip(f, size))]
+    kept.append(size)
+    return kept[-MAX_FAILURES:]
+
+
+PACKING_ENGINES = {
+    "skyline": SkylinePacker,
+    "extreme_point": ExtremePointPacker,
+    "retrieval_cost": RetrievalCostPacker,
+}
+
+
+def create_index(backend: Optional[str] = None):
+    """Create an empty occupancy index for the configured backend"""
+    backend = backend or PLACEMENT_BACKEND
+    if backend == "numpy" and numpy_available():
+        return NumpyBoxIndex()
+    if backend not in ("python", "numpy"):
+        raise ValueError(f"Unknown placement backend: {backend}")
+    return BoxIndex()
+
+
+def create_packer(container, engine: Optional[str] = None, backend: Optional[str] = None):
+    """Create a packer for a container using the configured packing engine"""
+    engine = engine or PLACEMENT_ENGINE
+    if engine not in PACKING_ENGINES:
+        raise ValueError(f"Unknown placement engine: {engine}")
+    return PACKING_ENGINES[engine](
+        container.width, container.depth, container.height, index=create_index(backend)
+    )
+
+
+def fits_any_container(container_dimensions, dimensions) -> bool:
+    """
+    Check if an item fits at least one empty container in some orientation.
+
+    container_dimensions is a list of (width, depth, height) tuples. The numpy
+    backend compares the item against every container in one array operation.
+    """
+    if not container_dimensions:
+        return False
+    if PLACEMENT_BACKEND == "numpy" and numpy_available():
+        return bool(containers_fit_mask(container_dimensions, dimensions).any())
+    size = sorted(dimensions)
+    return any(
+        all(d <= c for d, c in zip(size, sorted(container)))
+        for container in container_dimensions
+    )
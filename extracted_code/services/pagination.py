@@ -0,0 +1,67 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+# Page size used when a cursor is given without a limit
+DEFAULT_PAGE_SIZE = 100
+# Largest page a client may request
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor of the next page for list endpoints
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Encode the sort key of the last returned document as an opaque token"""
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, keys: List[str]) -> Dict[str, Any]:
+    """Decode a token built by encode_cursor, raises a 400 if it is malformed"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, dict) or any(key not in values for key in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], required: List[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated fields= parameter.
+
+    The required fields (the sort key) are always included so the next
+    cursor can be built. Returns None when no projection was asked for.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if any(name.startswith("$") for name in names):
+        raise HTTPException(status_code=400, detail="Invalid field name")
+    return required + [name for name in names if name not in required and name != "_id"]
+
+
+def projection(names: Optional[List[str]], keep_id: bool = False) -> Optional[Dict[str, int]]:
+    """Build a MongoDB projection for a parsed field list"""
+    if names is None:
+        return None
+    return {"_id": 1 if keep_id else 0, **{name: 1 for name in names}}
+
+
+def project_document(document: Dict[str, Any], names: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the requested top-level fields of an already fetched document"""
+    if names is None:
+        return document
+    return {name: document[name] for name in names if name in document}
+
+
+def page_limit(limit: Optional[int], paginated: bool) -> Optional[int]:
+    """Number of documents to return, None for the whole collection"""
+    if limit is not None:
+        return limit
+    return DEFAULT_PAGE_SIZE if paginated else None
@@ -1,423 +1,140 @@
-from models.placement import PlacementBase, RearrangementStep, Position
-from models.item import Coordinates
+from models.placement import PlacementBase, RearrangementStep, PlacementResponse
+from models.container import ContainerCreate
+from models.item import ItemCreate
 from database import items_collection, containers_collection, placements_collection
+from services.zone_packing import get_attr, sort_by_priority, fitting_containers, pack_zone, pack_overflow, compute_rearrangement_plan
+from services.executor import run_in_placement_pool
+from services.audit import log_events
+from services.retrieval_cache import invalidate_items
+from services.expiry import parse_expiry, record_expiries
+from services.name_index import normalize_name, record_names
+from services.occupancy_cache import get_occupancy, get_packers, get_item_container, record_containers, record_packers, record_placements
 from datetime import datetime
-import copy
+import asyncio
+import logging
 
-# Add this helper function to the top of the file
-def get_attr(obj, attr):
-    """Safely get attribute from either a dict or an object"""
-    if hasattr(obj, attr):
-        return getattr(obj, attr)
-    elif isinstance(obj, dict) and attr in obj:
-        return obj[attr]
-    return None
+logger = logging.getLogger(__name__)
 
-async def check_item_fits_container(container, dimensions):
-    """Check if an item can physically fit in a container regardless of current position"""
-    return all(dimensions[i] <= container[i] for i in range(3))
-
-async def is_space_free(occupied_spaces, pos, dimensions):
-    """Check if a space is free (has no overlaps with existing items)"""
-    for x in range(int(pos[0]), int(pos[0] + dimensions[0])):
-        for y in range(int(pos[1]), int(pos[1] + dimensions[1])):
-            for z in range(int(pos[2]), int(pos[2] + dimensions[2])):
-                if (x, y, z) in occupied_spaces:
-                    return False
-    return True
+async def load_occupancy(container_ids=None, exclude_item_ids=None):
+    """
+    Get the boxes already occupied in each container from the occupancy
+    cache, without scanning the placements collection.
 
-async def mark_space_occupied(occupied_spaces, pos, dimensions):
-    """Mark a space as occupied by an item"""
-    for x in range(int(pos[0]), int(pos[0] + dimensions[0])):
-        for y in range(int(pos[1]), int(pos[1] + dimensions[1])):
-            for z in range(int(pos[2]), int(pos[2] + dimensions[2])):
-                occupied_spaces.add((x, y, z))
+    container_ids limits the containers loaded; placements of
+    exclude_item_ids are left out. Returns a dict of containerId to a copy
+    of the packer kept for the container, or to its boxes when none is
+    kept, suitable as the occupancy argument of place_all_items.
+    """
+    occupancy = await get_occupancy(container_ids, exclude_item_ids)
+    if not exclude_item_ids:
+        # Kept packers already hold the boxes, so the workers don't replay them
+        occupancy.update(await get_packers(occupancy))
+    return occupancy
 
-async def get_corners(pos, dimensions):
-    x, y, z = pos
-    w, d, h = dimensions
-    return [
-        [x, y, z],           # bottom-left-front
-        [x+w, y, z],         # bottom-right-front
-        [x, y+d, z],         # bottom-left-back
-        [x+w, y+d, z],       # bottom-right-back
-        [x, y, z+h],         # top-left-front
-        [x+w, y, z+h],       # top-right-front
-        [x, y+d, z+h],       # top-left-back
-        [x+w, y+d, z+h]      # top-right-back
-    ]
+def to_plain_dict(obj):
+    """Convert a Pydantic model to a dict, leave dicts untouched"""
+    return obj if isinstance(obj, dict) else obj.dict()
 
-async def place_items_with_priority(container, items_to_place):
+async def place_all_items(items, containers, progress=None, occupancy=None):
     """
-    Optimized placement logic for handling large datasets.
-    """
-    # Sort items by priority (highest first)
-    items_list = sorted(
-        items_to_place,
-        key=lambda x: x.get("priority", 0) if isinstance(x, dict) else x.priority,
-        reverse=True
-    )
-    placed_items = []
-    unplaceable_items = []
-    
-    # Track occupied spaces
-    occupied_spaces = set()
-    max_depth_at_x = {}
-    
-    for item in items_list:
-        dimensions = (
-            [item.get("width"), item.get("depth"), item.get("height")]
-            if isinstance(item, dict)
-            else [item.width, item.depth, item.height]
-        )
-        container_dims = [container.width, container.depth, container.height]
-        
-        if not await check_item_fits_container(container_dims, dimensions):
-            unplaceable_items.append(item)
-            continue
-        
-        # Try to find a suitable position
-        item_placed = False
-        for x_start in range(0, int(container.width - dimensions[0]) + 1):
-            current_depth = max(max_depth_at_x.get(x, 0) for x in range(x_start, x_start + int(dimensions[0])))
-            pos = [x_start, current_depth, 0]
-            
-            if pos[1] + dimensions[1] <= container.depth and await is_space_free(occupied_spaces, pos, dimensions):
-                await mark_space_occupied(occupied_spaces, pos, dimensions)
-                for x in range(x_start, x_start + int(dimensions[0])):
-                    max_depth_at_x[x] = max(max_depth_at_x.get(x, 0), pos[1] + dimensions[1])
-                
-                placed_items.append(PlacementBase(
-                    itemId=item.get("itemId") if isinstance(item, dict) else item.itemId,
-                    containerId=container.containerId,
-                    position=Position(
-                        startCoordinates=Coordinates(width=pos[0], depth=pos[1], height=pos[2]),
-                        endCoordinates=Coordinates(width=pos[0] + dimensions[0], depth=pos[1] + dimensions[1], height=pos[2] + dimensions[2])
-                    )
-                ))
-                item_placed = True
-                break
-        
-        if not item_placed:
-            unplaceable_items.append(item)
-    
-    return placed_items, unplaceable_items
+    Place all items in available containers with optimal arrangement.
 
-# Fix for the generate_rearrangement_plan function
-
-async def generate_rearrangement_plan(current_placements, items_to_rearrange, containers):
-    """Generate a plan for rearranging items to optimize placement"""
-    rearrangements = []
-    step_counter = 1
-    
-    # Helper function to safely get attributes from either dict or object
-    def get_attr(obj, attr):
-        if hasattr(obj, attr):
-            return getattr(obj, attr)
-        elif isinstance(obj, dict) and attr in obj:
-            return obj[attr]
-        return None
-    
-    # First, gather all current placements for reference
-    current_placement_map = {}
-    for placement in current_placements:
-        item_id = get_attr(placement, 'itemId')
-        if item_id:
-            current_placement_map[item_id] = placement
-    
-    # Generate new optimal placements
-    new_placements = []
-    unplaceable_items = []
-    
-    # Try to place items in each container
-    for container in containers:
-        # Get items that prefer this container's zone
-        container_zone = get_attr(container, 'zone')
-        preferred_items = []
-        
-        for item in items_to_rearrange:
-            item_id = get_attr(item, 'itemId')
-            item_zone = get_attr(item, 'preferredZone')
-            
-            # Check if item is already in a new placement
-            already_placed = any(get_attr(p, 'itemId') == item_id for p in new_placements)
-            already_unplaceable = any(get_attr(u, 'itemId') == item_id for u in unplaceable_items)
-            
-            if item_zone == container_zone and not already_placed and not already_unplaceable:
-                preferred_items.append(item)
-        
-        # Place items with priority
-        if preferred_items:
-            placed, unplaced = await place_items_with_priority(container, preferred_items)
-            new_placements.extend(placed)
-            unplaceable_items.extend(unplaced)
-    
-    # Try to place remaining items in any container
-    remaining_items = []
-    for item in items_to_rearrange:
-        item_id = get_attr(item, 'itemId')
-        already_placed = any(get_attr(p, 'itemId') == item_id for p in new_placements)
-        already_unplaceable = any(get_attr(u, 'itemId') == item_id for u in unplaceable_items)
-        
-        if not already_placed and not already_unplaceable:
-            remaining_items.append(item)
-    
-    for container in containers:
-        if not remaining_items:
-            break
-            
-        placed, unplaced = await place_items_with_priority(container, remaining_items)
-        new_placements.extend(placed)
-        
-        # Update remaining items
-        new_remaining = []
-        for item in remaining_items:
-            item_id = get_attr(item, 'itemId')
-            if not any(get_attr(p, 'itemId') == item_id for p in placed):
-                new_remaining.append(item)
-        remaining_items = new_remaining
-    
-    # Any items left are unplaceable
-    unplaceable_items.extend(remaining_items)
-    
-    # Generate rearrangement steps by comparing current to new positions
-    for item in items_to_rearrange:
-        item_id = get_attr(item, 'itemId')
-        current_placement = current_placement_map.get(item_id)
-        
-        # Find matching new placement
-        new_placement = None
-        for p in new_placements:
-            if get_attr(p, 'itemId') == item_id:
-                new_placement = p
-                break
-        
-        # Skip if item can't be placed in new arrangement
-        if not new_placement:
-            continue
-            
-        # If item was already placed somewhere
-        if current_placement:
-            current_container = get_attr(current_placement, 'containerId')
-            new_container = get_attr(new_placement, 'containerId')
-            
-            # Get position data
-            if hasattr(current_placement, 'position'):
-                current_pos = current_placement.position
-                current_start = current_pos.startCoordinates
-                current_start_width = current_start.width
-                current_start_depth = current_start.depth
-                current_start_height = current_start.height
-            elif isinstance(current_placement, dict) and 'position' in current_placement:
-                current_pos = current_placement['position']
-                current_start = current_pos.get('startCoordinates', {})
-                current_start_width = current_start.get('width', 0)
-                current_start_depth = current_start.get('depth', 0)
-                current_start_height = current_start.get('height', 0)
-            else:
-                # Can't determine current position
-                current_start_width = None
-                current_start_depth = None
-                current_start_height = None
-            
-            if hasattr(new_placement, 'position'):
-                new_pos = new_placement.position
-                new_start = new_pos.startCoordinates
-                new_start_width = new_start.width
-                new_start_depth = new_start.depth
-                new_start_height = new_start.height
-            elif isinstance(new_placement, dict) and 'position' in new_placement:
-                new_pos = new_placement['position']
-                new_start = new_pos.get('startCoordinates', {})
-                new_start_width = new_start.get('width', 0)
-                new_start_depth = new_start.get('depth', 0)
-                new_start_height = new_start.get('height', 0)
-            else:
-                # Can't determine new position
-                new_start_width = None
-                new_start_depth = None
-                new_start_height = None
-            
-            # Check if position changed
-            position_changed = (
-                current_container != new_container or
-                current_start_width != new_start_width or
-                current_start_depth != new_start_depth or
-                current_start_height != new_start_height
-            )
-            
-            if position_changed:
-                # Add removal step
-                rearrangements.append(RearrangementStep(
-                    step=step_counter,
-                    action="remove",
-                    itemId=item_id,
-                    fromContainer=current_container,
-                    fromPosition=get_attr(current_placement, 'position')
-                ))
-                step_counter += 1
-                
-                # Add placement step
-                rearrangements.append(RearrangementStep(
-                    step=step_counter,
-                    action="place",
-                    itemId=item_id,
-                    toContainer=new_container,
-                    toPosition=get_attr(new_placement, 'position')
-                ))
-                step_counter += 1
-        else:
-            # Item not previously placed, just add a placement step
-            rearrangements.append(RearrangementStep(
-                step=step_counter,
-                action="place",
-                itemId=item_id,
-                toContainer=get_attr(new_placement, 'containerId'),
-                toPosition=get_attr(new_placement, 'position')
-            ))
-            step_counter += 1
-    
-    return new_placements, rearrangements
+    The preferred-zone passes run concurrently, one worker per zone, in the
+    placement process pool; the cross-zone overflow pass runs afterwards on
+    the merged occupancy. Returns PlacementBase models and the original item
+    objects that could not be placed.
 
-async def place_all_items(items, containers):
-    """Place all items in available containers with optimal arrangement"""
+    progress is an optional async callback receiving (placed, remaining,
+    unplaceable) counts as zones finish. occupancy optionally maps
+    containerId to boxes that are already taken, or to a packer holding
+    them; it is updated in place with packers holding the new placements,
+    so it can be passed to the next call and to record_packers.
+    """
     try:
-        # Convert items to sorted list by priority (highest first)
-        sorted_items = sorted(
-            items, 
-            key=lambda x: x.get("priority", 0) if isinstance(x, dict) else x.priority, 
-            reverse=True
-        )
-        
-        placements = []
-        unplaceable_items = []
-        attempted_items = set()  # Track items we've already tried to place
+        item_dicts = sort_by_priority([to_plain_dict(item) for item in items])
+        container_dicts = [to_plain_dict(container) for container in containers]
         
-        # Group containers by zone for better organization
+        # Shard items and containers by zone; an item is only a candidate
+        # for its own preferred zone in the first two passes
         containers_by_zone = {}
-        for container in containers:
-            if container.zone not in containers_by_zone:
-                containers_by_zone[container.zone] = []
-            containers_by_zone[container.zone].append(container)
+        for container in container_dicts:
+            containers_by_zone.setdefault(container.get("zone"), []).append(container)
+        items_by_zone = {}
+        for item in item_dicts:
+            if item.get("preferredZone") in containers_by_zone:
+                items_by_zone.setdefault(item.get("preferredZone"), []).append(item)
         
-        # First pass: place high-priority items in their preferred zones
-        for zone, zone_containers in containers_by_zone.items():
-            preferred_high_priority = [
-                item for item in sorted_items 
-                if item.get("priority", 0) >= 90 
-                and item.get("preferredZone") == zone
-                and item.get("itemId") not in attempted_items
-            ]
-            
-            if preferred_high_priority:
-                for container in zone_containers:
-                    placed, unplaced = await place_items_with_priority(container, preferred_high_priority)
-                    placements.extend(placed)
-                    
-                    # Mark these items as attempted
-                    for item in preferred_high_priority:
-                        if any(p.itemId == item.get("itemId") for p in placed):
-                            attempted_items.add(item.get("itemId"))
-                    
-                    # Update the list of items to exclude placed ones
-                    preferred_high_priority = [
-                        item for item in preferred_high_priority 
-                        if item.get("itemId") not in attempted_items
-                    ]
-                    
-                    if not preferred_high_priority:
-                        break
-        
-        # Second pass: place standard-priority items in their preferred zones
-        for zone, zone_containers in containers_by_zone.items():
-            preferred_items = [
-                item for item in sorted_items 
-                if item.get("preferredZone") == zone
-                and item.get("itemId") not in attempted_items
-            ]
-            
-            if preferred_items:
-                for container in zone_containers:
-                    placed, unplaced = await place_items_with_priority(container, preferred_items)
-                    placements.extend(placed)
-                    
-                    # Mark these items as attempted
-                    for item in preferred_items:
-                        if any(p.itemId == item.get("itemId") for p in placed):
-                            attempted_items.add(item.get("itemId"))
-                    
-                    # Update the list of items to exclude placed ones
-                    preferred_items = [
-                        item for item in preferred_items 
-                        if item.get("itemId") not in attempted_items
-                    ]
-                    
-                    if not preferred_items:
-                        break
-        
-        # Third pass: place remaining items in any zone (make multiple passes to ensure fair distribution)
-        remaining_items = [
-            item for item in sorted_items 
-            if item.get("itemId") not in attempted_items
+        if occupancy is None:
+            occupancy = {}
+        zone_tasks = [
+            asyncio.ensure_future(run_in_placement_pool(
+                pack_zone,
+                zone_items,
+                containers_by_zone[zone],
+                {c["containerId"]: occupancy.get(c["containerId"], []) for c in containers_by_zone[zone]}
+            ))
+            for zone, zone_items in items_by_zone.items()
         ]
+        if progress:
+            placed_count = 0
+            for finished in asyncio.as_completed(zone_tasks):
+                placed_count += len((await finished)[0])
+                await progress(placed_count, len(item_dicts) - placed_count, 0)
         
+        # Merge in zone order so the result doesn't depend on which worker finished first
+        placement_dicts = []
+        for zone_placements, zone_occupancy in await asyncio.gather(*zone_tasks):
+            placement_dicts.extend(zone_placements)
+            occupancy.update(zone_occupancy)
+        
+        # Third pass: place remaining items in any zone
+        placed_ids = {p["itemId"] for p in placement_dicts}
+        remaining_items = [item for item in item_dicts if item.get("itemId") not in placed_ids]
         if remaining_items:
-            print(f"Trying to place {len(remaining_items)} items in any available container")
-            
-            # Multiple distribution passes to ensure all zones get items
-            round_robin_zones = list(containers_by_zone.keys())
-            
-            # Keep attempting until we can't place any more items
-            previous_remaining_count = len(remaining_items) + 1  # Initialize to ensure loop entry
-            
-            while remaining_items and len(remaining_items) < previous_remaining_count:
-                previous_remaining_count = len(remaining_items)
-                
-                # Try each zone in round-robin fashion
-                for zone in round_robin_zones:
-                    if not remaining_items:
-                        break
-                        
-                    zone_containers = containers_by_zone[zone]
-                    
-                    # Try each container in this zone
-                    for container in zone_containers:
-                        if not remaining_items:
-                            break
-                            
-                        # Try to place a batch of items (limit to 10 at a time to ensure fair distribution)
-                        current_batch = remaining_items[:10]
-                        placed, unplaced = await place_items_with_priority(container, current_batch)
-                        
-                        if placed:
-                            placements.extend(placed)
-                            
-                            # Remove placed items from remaining_items
-                            placed_item_ids = {p.itemId for p in placed}
-                            remaining_items = [
-                                item for item in remaining_items 
-                                if item.get("itemId") not in placed_item_ids
-                            ]
-                            
-                            # Mark as attempted
-                            for item_id in placed_item_ids:
-                                attempted_items.add(item_id)
+            # Containers none of the items fits when empty don't need seeding
+            overflow_containers = fitting_containers(container_dicts, remaining_items)
+            overflow_placements, overflow_occupancy = await run_in_placement_pool(
+                pack_overflow,
+                remaining_items,
+                overflow_containers,
+                {c["containerId"]: occupancy.get(c["containerId"], []) for c in overflow_containers}
+            )
+            occupancy.update(overflow_occupancy)
+            placement_dicts.extend(overflow_placements)
+            placed_ids.update(p["itemId"] for p in overflow_placements)
         
         # Any items still remaining are truly unplaceable
+        items_by_id = {get_attr(item, "itemId"): item for item in items}
         unplaceable_items = [
-            item for item in sorted_items 
-            if item.get("itemId") not in {p.itemId for p in placements}
+            items_by_id[item.get("itemId")] for item in item_dicts 
+            if item.get("itemId") not in placed_ids
         ]
         
-        print(f"Placed {len(placements)} items, {len(unplaceable_items)} items could not be placed")
-        return placements, unplaceable_items
-    except Exception as e:
-        print(f"Error in place_all_items: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.info("Placed %d items, %d items could not be placed", len(placement_dicts), len(unplaceable_items))
+        if progress:
+            await progress(len(placement_dicts), 0, len(unplaceable_items))
+        return [PlacementBase(**p) for p in placement_dicts], unplaceable_items
+    except Exception:
+        logger.exception("Error in place_all_items")
         # Return empty lists to avoid further errors
         return [], items  # Return the original items list as unplaceable
 
+async def generate_rearrangement_plan(current_placements, items_to_rearrange, containers):
+    """Generate a plan for rearranging items to optimize placement, off the event loop"""
+    placement_dicts, rearrangement_dicts = await run_in_placement_pool(
+        compute_rearrangement_plan,
+        [
+            {key: get_attr(p, key) for key in ("itemId", "containerId", "position")}
+            for p in current_placements
+        ],
+        [to_plain_dict(item) for item in items_to_rearrange],
+        [to_plain_dict(container) for container in containers]
+    )
+    return (
+        [PlacementBase(**p) for p in placement_dicts],
+        [RearrangementStep(**r) for r in rearrangement_dicts]
+    )
+
 async def save_placements(placements):
     """Save the item placements to the database"""
     try:
@@ -455,10 +172,117 @@ async def save_placements(placements):
             
             if placement_dicts:
                 await placements_collection.insert_many(placement_dicts)
+                await record_placements(placement_dicts)
         
         return True
-    except Exception as e:
-        print(f"Error in save_placements: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return False
\ No newline at end of file
+    except Exception:
+        logger.exception("Error in save_placements")
+        return False
+
+async def process_placement_request(request, progress=None):
+    """
+    Store the request's containers and items, compute their placements and
+    save them. Returns a PlacementResponse.
+    """
+    # First, save or update the containers
+    for container in request.containers:
+        # Check if container already exists
+        existing_container = await containers_collection.find_one({"containerId": container.containerId})
+        if existing_container:
+            # Update existing container
+            await containers_collection.update_one(
+                {"containerId": container.containerId},
+                {"$set": container.dict()}
+            )
+        else:
+            # Insert new container
+            container_data = ContainerCreate(**container.dict())
+            await containers_collection.insert_one(container_data.dict())
+    
+    await record_containers(request.containers)
+    
+    # Then, save or update the items
+    for item in request.items:
+        # Check if item already exists
+        existing_item = await items_collection.find_one({"itemId": item.itemId})
+        if existing_item:
+            # Update existing item
+            await items_collection.update_one(
+                {"itemId": item.itemId},
+                {"$set": {
+                    **item.dict(),
+                    "nameLower": normalize_name(item.name),
+                    "expiresAt": parse_expiry(item.expiryDate)
+                }}
+            )
+        else:
+            # Insert new item with default values
+            item_data = ItemCreate(**item.dict())
+            await items_collection.insert_one({
+                **item_data.dict(),
+                "nameLower": normalize_name(item.name),
+                "expiresAt": parse_expiry(item.expiryDate),
+                "currentUses": 0,
+                "isWaste": False,
+                "wasteReason": None
+            })
+    
+    invalidate_items([item.itemId for item in request.items])
+    record_names((item.itemId, item.name) for item in request.items)
+    record_expiries((item.itemId, parse_expiry(item.expiryDate)) for item in request.items)
+    
+    current_placements = []
+    if request.incremental:
+        # Keep placed items where they are and pack only the others into
+        # the space that is still free
+        occupancy = await load_occupancy([c.containerId for c in request.containers])
+        items_to_place = [item for item in request.items if await get_item_container(item.itemId) is None]
+        placements, unplaceable_items = await place_all_items(items_to_place, request.containers, progress, occupancy)
+    else:
+        # Get current placements to determine rearrangements
+        cursor = placements_collection.find({})
+        async for doc in cursor:
+            current_placements.append(doc)
+        
+        # Calculate optimal placements
+        placements, unplaceable_items = await place_all_items(request.items, request.containers, progress)
+    
+    # Generate rearrangement plan if needed
+    if current_placements and placements:
+        _, rearrangements = await generate_rearrangement_plan(
+            current_placements, 
+            [item for item in request.items if item.itemId not in [u.itemId for u in unplaceable_items]], 
+            request.containers
+        )
+    else:
+        rearrangements = []
+    
+    # Save the new placements
+    if placements:
+        # Remove previous placements
+        item_ids = [p.itemId for p in placements]
+        await placements_collection.delete_many({"itemId": {"$in": item_ids}})
+        
+        # Insert new placements
+        await placements_collection.insert_many([p.dict() for p in placements])
+        await record_placements(placements)
+        
+        # Log the placement operations
+        await log_events({
+            "timestamp": datetime.utcnow(),
+            "actionType": "placement",
+            "itemId": item_id,
+            "details": {
+                "operation": "new_placement"
+            }
+        } for item_id in item_ids)
+    
+    if request.incremental:
+        await record_packers(occupancy)
+    
+    return PlacementResponse(
+        success=True,
+        placements=placements,
+        rearrangements=rearrangements,
+        unplaced_items=[{**item.dict(), "isPlaced": False} for item in unplaceable_items]  # Mark unplaced items
+    )
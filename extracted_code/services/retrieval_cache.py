@@ -0,0 +1,56 @@
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# Number of retrieval plans kept in memory, least recently used are evicted
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+
+# (itemId, container version) -> (containerId, itemIds the plan lists, plan)
+_plans: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def get_cached_plan(item_id: str, version: int) -> Optional[dict]:
+    """Return the plan computed for an item at this container version, if cached"""
+    entry = _plans.get((item_id, version))
+    if entry is None:
+        return None
+    _plans.move_to_end((item_id, version))
+    return entry[2]
+
+
+def cache_plan(item_id: str, container_id: str, version: int, plan: dict, listed_item_ids: Iterable[str] = ()):
+    """
+    Cache an item's plan. listed_item_ids are the other items the plan
+    shows (the blockers), so changing one of them drops the plan as well.
+    """
+    if RETRIEVAL_CACHE_SIZE <= 0:
+        return
+    _plans[(item_id, version)] = (container_id, frozenset(listed_item_ids), plan)
+    _plans.move_to_end((item_id, version))
+    while len(_plans) > RETRIEVAL_CACHE_SIZE:
+        _plans.popitem(last=False)
+
+
+def clear_plans():
+    _plans.clear()
+
+
+def invalidate_containers(container_ids: Iterable[str]):
+    """Drop plans of items stored in these containers"""
+    container_ids = set(container_ids)
+    if not container_ids:
+        return
+    for key in [key for key, (container_id, _, _) in _plans.items() if container_id in container_ids]:
+        del _plans[key]
+
+
+def invalidate_items(item_ids: Iterable[str]):
+    """Drop plans of these items and the plans listing them"""
+    item_ids = set(item_ids)
+    if not item_ids:
+        return
+    for key in [
+        key for key, (_, listed, _) in _plans.items()
+        if key[0] in item_ids or not listed.isdisjoint(item_ids)
+    ]:
+        del _plans[key]
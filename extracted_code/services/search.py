@@ -1,7 +1,13 @@
 from models.item import Position, Coordinates
-from database import items_collection, containers_collection, placements_collection, logs_collection
+from database import items_collection, containers_collection, placements_collection
 from datetime import datetime
+import re
 from typing import List, Dict, Any, Optional
+from services.occupancy import position_box
+from services.occupancy_cache import get_blocking_graph, get_container_version, get_item_container, record_placements
+from services.audit import log_event
+from services.name_index import get_name_index, normalize_name
+from services.retrieval_cache import cache_plan, get_cached_plan, invalidate_items
 
 def get_position_depth(position_obj):
     """Helper function to safely get the depth value from a position object"""
@@ -38,137 +44,124 @@ async def find_item_by_id(item_id: str):
     
     return {"item": item, "placement": placement, "container": container}
 
-async def find_item_by_name(item_name: str):
-    """Find items by name (partial match)"""
-    # Search for items matching the name
-    cursor = items_collection.find({"name": {"$regex": item_name, "$options": "i"}})
-    items = []
-    async for item in cursor:
-        items.append(item)
+async def find_item_by_name(item_name: str, mode: str = "contains"):
+    """
+    Find items by name, case-insensitively.
+
+    mode is "contains" (partial match, the default), "prefix", "exact" or
+    "fuzzy" (typo tolerant). Exact and prefix searches use the nameLower
+    index; contains and fuzzy use the in-process trigram index. Results are
+    ranked by fuzzy similarity, then available (placed, not waste) items
+    first, then by priority.
+    """
+    normalized = normalize_name(item_name)
+    similarity = {}
+    if mode == "exact":
+        query = {"nameLower": normalized}
+    elif mode == "prefix":
+        query = {"nameLower": {"$regex": "^" + re.escape(normalized)}}
+    elif mode == "fuzzy":
+        similarity = dict((await get_name_index()).fuzzy(item_name))
+        query = {"itemId": {"$in": list(similarity)}}
+    else:
+        query = {"itemId": {"$in": (await get_name_index()).contains(item_name)}}
     
+    items = await items_collection.find(query).to_list(length=None)
     if not items:
         return []
     
-    # Get placement and container info for each item
+    # Get placement and container info for all matches at once
+    placements = {}
+    async for placement in placements_collection.find({"itemId": {"$in": [item["itemId"] for item in items]}}):
+        placements[placement["itemId"]] = placement
+    containers = {}
+    container_ids = list({placement["containerId"] for placement in placements.values()})
+    async for container in containers_collection.find({"containerId": {"$in": container_ids}}):
+        containers[container["containerId"]] = container
+    
     result = []
     for item in items:
-        placement = await placements_collection.find_one({"itemId": item["itemId"]})
-        if placement:
-            container = await containers_collection.find_one({"containerId": placement["containerId"]})
-            result.append({"item": item, "placement": placement, "container": container})
-        else:
-            result.append({"item": item, "placement": None, "container": None})
+        placement = placements.get(item["itemId"])
+        container = containers.get(placement["containerId"]) if placement else None
+        result.append({"item": item, "placement": placement, "container": container})
     
+    result.sort(key=lambda r: (
+        -similarity.get(r["item"]["itemId"], 1.0),
+        r["placement"] is None or bool(r["item"].get("isWaste")),
+        -(r["item"].get("priority") or 0)
+    ))
     return result
 
+async def resolve_item_names(names: List[str], mode: str = "contains") -> Dict[str, Optional[str]]:
+    """
+    Resolve several names to the itemId of their best match, as
+    {name: itemId or None}.
+
+    Names matching an item exactly (case-insensitively) are resolved with
+    one nameLower query, preferring available items, then priority. Only
+    the names left over go through find_item_by_name one at a time.
+    """
+    normalized = {name: normalize_name(name) for name in names}
+    candidates: Dict[str, List[Dict[str, Any]]] = {}
+    async for item in items_collection.find(
+        {"nameLower": {"$in": list(set(normalized.values()))}},
+        {"_id": 0, "itemId": 1, "nameLower": 1, "isWaste": 1, "priority": 1}
+    ):
+        candidates.setdefault(item["nameLower"], []).append(item)
+    placed = set()
+    item_ids = [item["itemId"] for items in candidates.values() for item in items]
+    async for placement in placements_collection.find({"itemId": {"$in": item_ids}}, {"_id": 0, "itemId": 1}):
+        placed.add(placement["itemId"])
+    
+    resolved = {}
+    for name, key in normalized.items():
+        if key in candidates:
+            best = min(candidates[key], key=lambda item: (
+                item["itemId"] not in placed or bool(item.get("isWaste")),
+                -(item.get("priority") or 0)
+            ))
+            resolved[name] = best["itemId"]
+        elif mode == "exact":
+            resolved[name] = None
+        else:
+            matches = await find_item_by_name(name, mode)
+            resolved[name] = matches[0]["item"]["itemId"] if matches else None
+    return resolved
+
+def box_position(box):
+    """Build a stored position dict from a box tuple"""
+    return {
+        "startCoordinates": {"width": box[0], "depth": box[1], "height": box[2]},
+        "endCoordinates": {"width": box[3], "depth": box[4], "height": box[5]}
+    }
+
 async def identify_items_to_move(item_id: str, position: Position, container_id: str):
     """
     Identify which items need to be moved to access the target item
     Returns items in the order they should be moved
     """
-    # Get all items in the same container
-    cursor = placements_collection.find({"containerId": container_id})
-    items_in_container = []
-    async for doc in cursor:
-        items_in_container.append(doc)
-    
-    # Get actual item details for each placement
-    for i, placement in enumerate(items_in_container):
-        item = await items_collection.find_one({"itemId": placement["itemId"]})
-        if item:
-            items_in_container[i]["name"] = item["name"]
-    
-    # Target item's position
-    target_start = position.startCoordinates
-    target_end = position.endCoordinates
-    
-    # Items that need to be moved are those that are in front of or stacked on top of the target
-    items_to_move = []
-    
-    for placement in items_in_container:
-        if placement["itemId"] == item_id:
-            continue  # Skip the target item itself
-        
-        # Safely handle different position data formats
-        item_position = placement["position"]
-        
-        # Handle if position is dictionary or Pydantic model
-        if isinstance(item_position, dict):
-            item_start_coords = item_position.get("startCoordinates", {})
-            item_end_coords = item_position.get("endCoordinates", {})
-            
-            # Handle if coordinates are dictionaries or Pydantic models
-            if isinstance(item_start_coords, dict):
-                item_start_width = item_start_coords.get("width", 0)
-                item_start_depth = item_start_coords.get("depth", 0)
-                item_start_height = item_start_coords.get("height", 0)
-            else:
-                item_start_width = getattr(item_start_coords, "width", 0)
-                item_start_depth = getattr(item_start_coords, "depth", 0)
-                item_start_height = getattr(item_start_coords, "height", 0)
-                
-            if isinstance(item_end_coords, dict):
-                item_end_width = item_end_coords.get("width", 0)
-                item_end_depth = item_end_coords.get("depth", 0)
-                item_end_height = item_end_coords.get("height", 0)
-            else:
-                item_end_width = getattr(item_end_coords, "width", 0)
-                item_end_depth = getattr(item_end_coords, "depth", 0)
-                item_end_height = getattr(item_end_coords, "height", 0)
-        else:
-            # Position is a Pydantic model
-            item_start_coords = getattr(item_position, "startCoordinates", None)
-            item_end_coords = getattr(item_position, "endCoordinates", None)
-            
-            item_start_width = getattr(item_start_coords, "width", 0) if item_start_coords else 0
-            item_start_depth = getattr(item_start_coords, "depth", 0) if item_start_coords else 0
-            item_start_height = getattr(item_start_coords, "height", 0) if item_start_coords else 0
-            
-            item_end_width = getattr(item_end_coords, "width", 0) if item_end_coords else 0
-            item_end_depth = getattr(item_end_coords, "depth", 0) if item_end_coords else 0
-            item_end_height = getattr(item_end_coords, "height", 0) if item_end_coords else 0
-        
-        # Handle target coordinates in the same way
-        if isinstance(target_start, dict):
-            target_start_width = target_start.get("width", 0)
-            target_start_depth = target_start.get("depth", 0)
-            target_start_height = target_start.get("height", 0)
-        else:
-            target_start_width = getattr(target_start, "width", 0)
-            target_start_depth = getattr(target_start, "depth", 0)
-            target_start_height = getattr(target_start, "height", 0)
-            
-        if isinstance(target_end, dict):
-            target_end_width = target_end.get("width", 0)
-            target_end_depth = target_end.get("depth", 0)
-            target_end_height = target_end.get("height", 0)
-        else:
-            target_end_width = getattr(target_end, "width", 0)
-            target_end_depth = getattr(target_end, "depth", 0)
-            target_end_height = getattr(target_end, "height", 0)
-        
-        # Check x-coordinate overlap
-        x_overlap = (
-            (item_start_width <= target_end_width and item_end_width >= target_start_width) or
-            (target_start_width <= item_end_width and target_end_width >= item_start_width)
-        )
-        
-        # Check if item is in front of target
-        in_front = item_end_depth <= target_start_depth
-        
-        if x_overlap and in_front:
-            items_to_move.append({
-                "itemId": placement["itemId"],
-                "name": placement.get("name", "Unknown Item"),
-                "position": placement["position"],
-                "distance": target_start_depth - item_end_depth  # How far in front
-            })
-    
-    # Sort items by position - we want to move items from front to back
-    # Fixed sorting function that doesn't use the incorrect getattr call
-    items_to_move.sort(key=lambda x: get_position_depth(x["position"]))
-    
-    return items_to_move
+    # Items blocking the target, directly or through other blockers, in an
+    # order where every item is free when its turn comes
+    graph = await get_blocking_graph(container_id)
+    target = position_box(position.dict())
+    order = graph.retrieval_order(item_id, target)
+    if not order:
+        return []
+    
+    # Get item names in one query
+    names = {}
+    async for item in items_collection.find({"itemId": {"$in": order}}, {"_id": 0, "itemId": 1, "name": 1}):
+        names[item["itemId"]] = item["name"]
+    
+    return [
+        {
+            "itemId": other_id,
+            "name": names.get(other_id, "Unknown Item"),
+            "position": box_position(graph.boxes[other_id]),
+            "distance": target[1] - graph.boxes[other_id][4]  # How far in front
+        }
+        for other_id in order
+    ]
 
 async def generate_retrieval_steps(item_data, items_to_move):
     """Generate step-by-step instructions for retrieving an item"""
@@ -224,6 +217,122 @@ async def generate_retrieval_steps(item_data, items_to_move):
     
     return steps
 
+async def get_retrieval_plan(item_id: str):
+    """
+    Find an item and the steps to retrieve it.
+
+    Returns {"item_data": find_item_by_id result, "retrieval_steps": [...]},
+    or None if the item doesn't exist. Plans of placed items are cached per
+    container version, so repeated lookups are served from memory until
+    the container changes.
+    """
+    container_id = await get_item_container(item_id)
+    version = None
+    if container_id is not None:
+        # Read the version first so a change while computing makes the entry stale
+        version = await get_container_version(container_id)
+        plan = get_cached_plan(item_id, version)
+        if plan is not None:
+            return plan
+    
+    item_data = await find_item_by_id(item_id)
+    if not item_data:
+        return None
+    if not item_data.get("placement"):
+        return {"item_data": item_data, "retrieval_steps": []}
+    
+    items_to_move = await identify_items_to_move(
+        item_id,
+        Position(**item_data["placement"]["position"]),
+        item_data["placement"]["containerId"]
+    )
+    plan = {
+        "item_data": item_data,
+        "retrieval_steps": await generate_retrieval_steps(item_data, items_to_move)
+    }
+    if version is not None and item_data["placement"]["containerId"] == container_id:
+        cache_plan(item_id, container_id, version, plan, [other["itemId"] for other in items_to_move])
+    return plan
+
+async def find_items_by_ids(item_ids: List[str]):
+    """Find several items at once, as {itemId: find_item_by_id result}"""
+    items = await items_collection.find({"itemId": {"$in": item_ids}}).to_list(length=None)
+    placements = {}
+    async for placement in placements_collection.find({"itemId": {"$in": item_ids}}):
+        placements[placement["itemId"]] = placement
+    containers = {}
+    container_ids = list({placement["containerId"] for placement in placements.values()})
+    async for container in containers_collection.find({"containerId": {"$in": container_ids}}):
+        containers[container["containerId"]] = container
+    
+    found = {}
+    for item in items:
+        placement = placements.get(item["itemId"])
+        if placement:
+            found[item["itemId"]] = {
+                "item": item,
+                "placement": placement,
+                "container": containers.get(placement["containerId"])
+            }
+        else:
+            found[item["itemId"]] = {"item": item, "placement": None}
+    return found
+
+async def get_batch_retrieval_plan(item_ids: List[str]):
+    """
+    Find several items and one combined sequence of steps to retrieve them.
+
+    Returns {"items": {itemId: find_item_by_id result}, "retrieval_steps":
+    [...]}. Each container's blocking graph is walked once for all targets
+    in it, so a blocker shared by several targets is moved only once, and a
+    target in front of another one is simply retrieved first. Moved items
+    are put back after the container's targets are out.
+    """
+    item_ids = list(dict.fromkeys(item_ids))
+    found = await find_items_by_ids(item_ids)
+    
+    # Placed targets per container, containers in the order first requested
+    targets: Dict[str, Dict[str, Any]] = {}
+    for item_id in item_ids:
+        item_data = found.get(item_id)
+        if item_data and item_data["placement"]:
+            placement = item_data["placement"]
+            targets.setdefault(placement["containerId"], {})[item_id] = position_box(placement["position"])
+    
+    orders = {}
+    for container_id, boxes in targets.items():
+        orders[container_id] = (await get_blocking_graph(container_id)).removal_order(boxes)
+    
+    # Names of the blockers in one query
+    names = {item_id: item_data["item"]["name"] for item_id, item_data in found.items()}
+    missing = [item_id for order in orders.values() for item_id in order if item_id not in names]
+    async for item in items_collection.find({"itemId": {"$in": missing}}, {"_id": 0, "itemId": 1, "name": 1}):
+        names[item["itemId"]] = item["name"]
+    
+    steps = []
+    def add_step(action, item_id, container_id):
+        steps.append({
+            "step": len(steps) + 1,
+            "action": action,
+            "itemId": item_id,
+            "itemName": names.get(item_id, "Unknown Item"),
+            "containerId": container_id
+        })
+    
+    for container_id, order in orders.items():
+        moved = []
+        for item_id in order:
+            if item_id in targets[container_id]:
+                add_step("retrieve", item_id, container_id)
+            else:
+                add_step("remove", item_id, container_id)
+                add_step("setAside", item_id, container_id)
+                moved.append(item_id)
+        for item_id in reversed(moved):
+            add_step("placeBack", item_id, container_id)
+    
+    return {"items": found, "retrieval_steps": steps}
+
 async def mark_item_as_used(item_id: str, user_id: Optional[str] = None):
     """Mark an item as used (increment usage counter)"""
     # Get the current item
@@ -241,6 +350,8 @@ async def mark_item_as_used(item_id: str, user_id: Optional[str] = None):
         {"$set": {"currentUses": current_uses}}
     )
     
+    invalidate_items([item_id])
+    
     # If item has reached usage limit, mark as waste
     if usage_limit > 0 and current_uses >= usage_limit:
         await items_collection.update_one(
@@ -249,7 +360,7 @@ async def mark_item_as_used(item_id: str, user_id: Optional[str] = None):
         )
     
     # Log the retrieval
-    await logs_collection.insert_one({
+    await log_event({
         "timestamp": datetime.utcnow(),
         "userId": user_id,
         "actionType": "retrieval",
@@ -290,9 +401,10 @@ async def place_item(item_id: str, container_id: str, position: Position, user_i
             "containerId": container_id,
             "position": position.dict()
         })
+    await record_placements([{"itemId": item_id, "containerId": container_id, "position": position.dict()}])
     
     # Log the placement
-    await logs_collection.insert_one({
+    await log_event({
         "timestamp": datetime.utcnow(),
         "userId": user_id,
         "actionType": "placement",
@@ -1,13 +1,29 @@
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
-from models.simulation import SimulationRequest, SimulationResponse, SimulationChanges
-from database import items_collection, simulation_collection, logs_collection
+from models.simulation import SimulationRequest, SimulationResponse, SimulationChanges, ForecastDay, ForecastItem, ForecastResponse
+from database import items_collection, simulation_collection
 import copy
+import logging
+import math
+from services.name_index import normalize_name
+from pymongo import UpdateOne
+from services.audit import log_events
+from services.expiry import get_expiry_scheduler, to_utc_naive
+from services.numpy_kernel import numpy_available, waste_days
+from services.retrieval_cache import invalidate_items
 
-async def get_current_simulation_date():
-    """Get the current simulation date from the database or use current time"""
+logger = logging.getLogger(__name__)
+
+async def get_current_simulation_date(initialize: bool = True):
+    """
+    Get the current simulation date from the database or use current time.
+    The simulation state is created on first use unless initialize is False.
+    """
     sim_state = await simulation_collection.find_one({"type": "current_state"})
     
+    if not sim_state and not initialize:
+        return datetime.utcnow()
     if not sim_state:
         # Initialize simulation state if not exists
         current_date = datetime.utcnow()
@@ -26,7 +42,7 @@ async def get_current_simulation_date():
                 return datetime.fromisoformat(sim_state["currentDate"].replace("Z", "+00:00"))
             except ValueError:
                 # If parsing fails, return current time
-                print(f"Failed to parse date {sim_state['currentDate']}, using current time instead")
+                logger.warning("Failed to parse simulation date %s, using current time instead", sim_state["currentDate"])
                 return datetime.utcnow()
         else:
             # It's already a datetime object
@@ -43,9 +59,73 @@ async def update_simulation_date(new_date: datetime):
         upsert=True
     )
 
+async def resolve_items_to_use(items_to_use: Optional[List[Dict[str, str]]]) -> List[str]:
+    """itemIds of the items to use each day, given by itemId or name"""
+    items_to_use_ids = []
+    if not items_to_use:
+        return items_to_use_ids
+    names = [normalize_name(item_usage["name"]) for item_usage in items_to_use
+             if not item_usage.get("itemId") and item_usage.get("name")]
+    # Find items by name in one query (case-insensitive, uses the nameLower index)
+    ids_by_name = {}
+    if names:
+        async for item in items_collection.find({"nameLower": {"$in": names}}, {"_id": 0, "itemId": 1, "nameLower": 1}):
+            ids_by_name.setdefault(item["nameLower"], item["itemId"])
+    for item_usage in items_to_use:
+        if item_usage.get("itemId"):
+            items_to_use_ids.append(item_usage["itemId"])
+        elif item_usage.get("name") and normalize_name(item_usage["name"]) in ids_by_name:
+            items_to_use_ids.append(ids_by_name[normalize_name(item_usage["name"])])
+    return items_to_use_ids
+
+def depletion_day(current_uses, usage_limit, uses_per_day):
+    """
+    Day (1 = the first simulated day) on which an item used uses_per_day
+    times a day runs out of uses, None if it never does. An item at or over
+    its limit runs out with its next use.
+    """
+    if not usage_limit or uses_per_day <= 0:
+        return None
+    remaining = max(usage_limit - current_uses, 1)
+    return -(-remaining // uses_per_day)
+
+def usage_log_entries(current_date: datetime, days_diff: int, usage, summarize: bool):
+    """
+    Yield the item_usage audit log entries of an advance: one per use, as if
+    the days were simulated one by one, or with summarize one per item.
+    usage holds a tuple per used item, as built by advance_simulation_time.
+    """
+    for item_id, start_uses, usage_limit, per_day, uses, is_depleted, last_day in usage:
+        if summarize:
+            current_uses = start_uses + uses
+            yield {
+                "timestamp": (current_date + timedelta(days=last_day if is_depleted else days_diff)).isoformat(),
+                "actionType": "item_usage",
+                "itemId": item_id,
+                "details": {
+                    "uses": uses,
+                    "currentUses": current_uses,
+                    "isWaste": is_depleted,
+                    "remainingUses": (usage_limit - current_uses) if usage_limit else None
+                }
+            }
+            continue
+        for use in range(1, uses + 1):
+            yield {
+                "timestamp": (current_date + timedelta(days=-(-use // per_day))).isoformat(),
+                "actionType": "item_usage",
+                "itemId": item_id,
+                "details": {
+                    "currentUses": start_uses + use,
+                    "isWaste": is_depleted and use == uses,
+                    "remainingUses": (usage_limit - start_uses - use) if usage_limit else None
+                }
+            }
+
 async def advance_simulation_time(days: Optional[int] = None, 
                                  to_timestamp: Optional[str] = None,
-                                 items_to_use: Optional[List[Dict[str, str]]] = None) -> SimulationResponse:
+                                 items_to_use: Optional[List[Dict[str, str]]] = None,
+                                 summarize_usage_logs: bool = False) -> SimulationResponse:
     """
     Advance simulation time by a number of days or to a specific date.
     
@@ -53,19 +133,20 @@ async def advance_simulation_time(days: Optional[int] = None,
         days: Number of days to advance
         to_timestamp: Specific date to advance to (ISO format)
         items_to_use: List of items to be used each day
+        summarize_usage_logs: Log one usage entry per item instead of one per use
         
     Returns:
         SimulationResponse with changes that occurred
     """
-    # Get current simulation date
-    current_date = await get_current_simulation_date()
+    # Get current simulation date, as naive UTC like the stored expiry dates
+    current_date = to_utc_naive(await get_current_simulation_date())
     
     # Determine target date
     if days is not None and days > 0:
         target_date = current_date + timedelta(days=days)
     elif to_timestamp:
         try:
-            target_date = datetime.fromisoformat(to_timestamp.replace("Z", "+00:00"))
+            target_date = to_utc_naive(datetime.fromisoformat(to_timestamp.replace("Z", "+00:00")))
             if target_date <= current_date:
                 raise ValueError("Target date must be in the future")
         except ValueError as e:
@@ -87,132 +168,97 @@ async def advance_simulation_time(days: Optional[int] = None,
     }
     
     # Create a list of item IDs to use daily (handle None case)
-    items_to_use_ids = []
-    if items_to_use:
-        for item_usage in items_to_use:
-            if item_usage.get("itemId"):
-                items_to_use_ids.append(item_usage["itemId"])
-            elif item_usage.get("name"):
-                # Find item by name (case-insensitive)
-                item = await items_collection.find_one(
-                    {"name": {"$regex": f"^{item_usage['name']}$", "$options": "i"}}
-                )
-                if item:
-                    items_to_use_ids.append(item["itemId"])
+    items_to_use_ids = await resolve_items_to_use(items_to_use)
     
-    # Simulate the passage of time day by day
-    for day in range(days_diff):
-        # Current day's date
-        day_date = current_date + timedelta(days=day + 1)
+    # 1. Process item usage. Usage is the same every day, so each item's
+    # uses and depletion day over the whole period are computed at once; an
+    # item listed twice is used twice a day
+    uses_per_day = Counter(items_to_use_ids)
+    items = {}
+    async for item in items_collection.find({"itemId": {"$in": list(uses_per_day)}, "isWaste": {"$ne": True}}):
+        items[item["itemId"]] = item
+    
+    updates = []
+    # (itemId, uses at the start, usage limit, uses per day, uses, depleted, depletion day) per used item
+    usage = []
+    for item_id, per_day in uses_per_day.items():
+        item = items.get(item_id)
+        if not item:
+            continue  # Skip if item doesn't exist or is already waste
         
-        # 1. Process item usage
-        for item_id in items_to_use_ids:
-            # Get the item
-            item = await items_collection.find_one({"itemId": item_id})
-            if not item or item.get("isWaste"):
-                continue  # Skip if item doesn't exist or is already waste
-            
-            # Update usage count
-            current_uses = item.get("currentUses", 0) + 1
-            usage_limit = item.get("usageLimit")
-            
-            # Check if item is now depleted
-            is_depleted = False
-            if usage_limit and current_uses >= usage_limit:
-                # Mark as waste
-                await items_collection.update_one(
-                    {"itemId": item_id},
-                    {"$set": {
-                        "isWaste": True, 
-                        "wasteReason": "Out of Uses", 
-                        "currentUses": current_uses
-                    }}
-                )
-                is_depleted = True
-                
-                # Add to depleted items list
-                changes["itemsDepletedToday"].append({
-                    "itemId": item_id,
-                    "name": item["name"]
-                })
-            else:
-                # Just update usage count
-                await items_collection.update_one(
-                    {"itemId": item_id},
-                    {"$set": {"currentUses": current_uses}}
-                )
-            
-            # Add to used items list
-            changes["itemsUsed"].append({
+        start_uses = item.get("currentUses", 0)
+        usage_limit = item.get("usageLimit")
+        last_day = depletion_day(start_uses, usage_limit, per_day)
+        is_depleted = last_day is not None and last_day <= days_diff
+        uses = usage_limit - start_uses if is_depleted else per_day * days_diff
+        uses = max(uses, 1)
+        current_uses = start_uses + uses
+        
+        if is_depleted:
+            # Mark as waste
+            updates.append(UpdateOne({"itemId": item_id}, {"$set": {
+                "isWaste": True,
+                "wasteReason": "Out of Uses",
+                "currentUses": current_uses
+            }}))
+            changes["itemsDepletedToday"].append({
                 "itemId": item_id,
-                "name": item["name"],
-                "remainingUses": (usage_limit - current_uses) if usage_limit else None
+                "name": item["name"]
             })
+        else:
+            # Just update usage count
+            updates.append(UpdateOne({"itemId": item_id}, {"$set": {"currentUses": current_uses}}))
+        
+        # One entry per used item, with the uses left at the end
+        changes["itemsUsed"].append({
+            "itemId": item_id,
+            "name": item["name"],
+            "remainingUses": (usage_limit - current_uses) if usage_limit else None
+        })
+        
+        usage.append((item_id, start_uses, usage_limit, per_day, uses, is_depleted, last_day))
+    
+    if updates:
+        await items_collection.bulk_write(updates, ordered=False)
+        invalidate_items(uses_per_day)
+    # Generated lazily: one entry per use over a long advance is a lot of entries
+    await log_events(usage_log_entries(current_date, days_diff, usage, summarize_usage_logs))
+    
+    # 2. Check for expired items at the target date: the scheduler hands
+    # out only the items whose expiry has been passed since the last advance.
+    # They are removed from it only once they are marked as waste, so a
+    # failed write leaves them for the next advance
+    scheduler = await get_expiry_scheduler()
+    expired_ids = scheduler.peek_expired(target_date)
+    if expired_ids:
+        # Items that became waste some other way are already accounted for
+        cursor = items_collection.find(
+            {"itemId": {"$in": expired_ids}, "isWaste": {"$ne": True}},
+            {"_id": 0, "itemId": 1, "name": 1, "expiryDate": 1}
+        )
+        expired_items = await cursor.to_list(length=None)
+        if expired_items:
+            # Mark as waste
+            await items_collection.update_many(
+                {"itemId": {"$in": [item["itemId"] for item in expired_items]}},
+                {"$set": {"isWaste": True, "wasteReason": "Expired"}}
+            )
+            invalidate_items([item["itemId"] for item in expired_items])
             
-            # Log usage
-            await logs_collection.insert_one({
-                "timestamp": day_date.isoformat(),
-                "actionType": "item_usage",
-                "itemId": item_id,
+            # Add to expired items list
+            changes["itemsExpired"] = [{"itemId": item["itemId"], "name": item["name"]} for item in expired_items]
+            
+            # Log expirations
+            await log_events({
+                "timestamp": target_date.isoformat(),
+                "actionType": "item_expiration",
+                "itemId": item["itemId"],
                 "details": {
-                    "currentUses": current_uses,
-                    "isWaste": is_depleted,
-                    "remainingUses": (usage_limit - current_uses) if usage_limit else None
+                    "expiryDate": item["expiryDate"],
+                    "simulationDate": target_date.isoformat()
                 }
-            })
-    
-    # 2. Check for expired items at the target date
-    cursor = items_collection.find({"expiryDate": {"$ne": None}, "isWaste": {"$ne": True}})
-    async for item in cursor:
-        try:
-            # Handle multiple possible date formats
-            expiry_date_str = item["expiryDate"]
-            if isinstance(expiry_date_str, str):
-                # Try ISO format first
-                try:
-                    expiry_date = datetime.fromisoformat(expiry_date_str.replace("Z", "+00:00"))
-                except ValueError:
-                    # Try other formats if ISO fails
-                    try:
-                        # Try RFC 3339 format
-                        expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-                    except ValueError:
-                        # Try simple date format
-                        expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%d")
-            
-                # Debug log
-                print(f"Simulation checking dates: expiry_date={expiry_date}, target_date={target_date}")
-                
-                # Check if the item is expired at the target date
-                if expiry_date <= target_date:
-                    # Mark as waste
-                    await items_collection.update_one(
-                        {"itemId": item["itemId"]},
-                        {"$set": {"isWaste": True, "wasteReason": "Expired"}}
-                    )
-                    
-                    # Add to expired items list
-                    changes["itemsExpired"].append({
-                        "itemId": item["itemId"],
-                        "name": item["name"]
-                    })
-                    
-                    # Log expiration
-                    await logs_collection.insert_one({
-                        "timestamp": target_date.isoformat(),
-                        "actionType": "item_expiration",
-                        "itemId": item["itemId"],
-                        "details": {
-                            "expiryDate": item["expiryDate"],
-                            "simulationDate": target_date.isoformat()
-                        }
-                    })
-                    
-                    print(f"Item {item['itemId']} marked as expired in simulation")
-        except Exception as e:
-            # Log the error but continue processing other items
-            print(f"Error checking expiry for item {item.get('itemId')}: {str(e)}")
-            continue
+            } for item in expired_items)
+        scheduler.discard_expired(expired_ids, target_date)
     
     # Update simulation current date
     await update_simulation_date(target_date)
@@ -239,6 +285,78 @@ async def advance_simulation_time(days: Optional[int] = None,
         )
     )
 
+def waste_day(current_uses, usage_limit, uses_per_day, expiry_seconds):
+    """
+    Day on which an item becomes waste and whether it runs out of uses
+    (rather than expires) then; day is None if it stays usable.
+    expiry_seconds is the time from the start until expiry, None if never.
+    """
+    depleted = depletion_day(current_uses, usage_limit, uses_per_day)
+    expired = None if expiry_seconds is None else max(math.ceil(expiry_seconds / 86400), 1)
+    if depleted is None and expired is None:
+        return None, False
+    if expired is None or (depleted is not None and depleted <= expired):
+        return depleted, True
+    return expired, False
+
+async def forecast_simulation(days: int, items_to_use: Optional[List[Dict[str, str]]] = None) -> ForecastResponse:
+    """
+    Project which items expire or run out of uses on each of the next days,
+    as if the simulation were advanced one day at a time with the same
+    daily usage. Reads a snapshot of the items once and writes nothing.
+    """
+    start = to_utc_naive(await get_current_simulation_date(initialize=False))
+    uses_per_day = Counter(await resolve_items_to_use(items_to_use))
+    
+    items = await items_collection.find(
+        {"isWaste": {"$ne": True}},
+        {"_id": 0, "itemId": 1, "name": 1, "currentUses": 1, "usageLimit": 1, "expiresAt": 1}
+    ).to_list(length=None)
+    expiry_seconds = [
+        (item["expiresAt"] - start).total_seconds() if item.get("expiresAt") else None
+        for item in items
+    ]
+    
+    # Day each item becomes waste, over all items at once when NumPy is there
+    if numpy_available() and items:
+        day_array, depleted_array = waste_days(
+            [item.get("currentUses") or 0 for item in items],
+            [item.get("usageLimit") or 0 for item in items],
+            [uses_per_day.get(item["itemId"], 0) for item in items],
+            [float("nan") if seconds is None else seconds for seconds in expiry_seconds]
+        )
+        projected = [
+            (int(day) if day <= days else None, bool(depleted))
+            for day, depleted in zip(day_array.tolist(), depleted_array.tolist())
+        ]
+    else:
+        projected = [
+            waste_day(item.get("currentUses") or 0, item.get("usageLimit"), uses_per_day.get(item["itemId"], 0), seconds)
+            for item, seconds in zip(items, expiry_seconds)
+        ]
+    
+    timeline = [
+        ForecastDay(day=day, date=(start + timedelta(days=day)).isoformat())
+        for day in range(1, days + 1)
+    ]
+    for item, (day, depleted) in zip(items, projected):
+        if day is None or day > days:
+            continue
+        entry = ForecastItem(itemId=item["itemId"], name=item.get("name"))
+        if depleted:
+            timeline[day - 1].itemsDepleted.append(entry)
+        else:
+            timeline[day - 1].itemsExpired.append(entry)
+    
+    return ForecastResponse(
+        success=True,
+        fromDate=start.isoformat(),
+        toDate=(start + timedelta(days=days)).isoformat(),
+        totalExpired=sum(len(day.itemsExpired) for day in timeline),
+        totalDepleted=sum(len(day.itemsDepleted) for day in timeline),
+        timeline=timeline
+    )
+
 async def reset_simulation():
     """Reset the simulation date to the current date"""
     current_date = datetime.utcnow()
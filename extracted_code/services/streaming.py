@@ -0,0 +1,36 @@
+import csv
+import io
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Documents fetched per round trip while streaming a response
+STREAM_BATCH_SIZE = 500
+# CSV rows buffered before a chunk is written to the response
+CSV_CHUNK_ROWS = 500
+
+
+async def ndjson_lines(documents, convert=None):
+    """Encode documents from an async iterator as one JSON object per line"""
+    async for document in documents:
+        if convert:
+            document = convert(document)
+        yield json.dumps(jsonable_encoder(document)) + "\n"
+
+
+async def csv_chunks(header, rows, chunk_rows=CSV_CHUNK_ROWS):
+    """Encode rows from an async iterator as CSV text, a few hundred rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
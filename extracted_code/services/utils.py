@@ -5,7 +5,7 @@ from models.waste import (
     RetrievalStep, ReturnManifest
 )
 from services.waste import identify_waste_items, prepare_return_plan, complete_undocking
-from database import logs_collection
+from services.audit import log_event
 from datetime import datetime
 
 router = APIRouter()
@@ -16,7 +16,7 @@ async def identify_waste():
     waste_items = await identify_waste_items()
     
     # Log the waste identification
-    await logs_collection.insert_one({
+    await log_event({
         "timestamp": datetime.utcnow(),
         "actionType": "waste_identification",
         "details": {
@@ -46,7 +46,7 @@ async def create_return_plan(request: ReturnPlanRequest):
         )
     
     # Log the return plan creation
-    await logs_collection.insert_one({
+    await log_event({
         "timestamp": datetime.utcnow(),
         "actionType": "return_plan_creation",
         "details": {
@@ -106,7 +106,7 @@ async def mark_undocking_complete(request: UndockingRequest):
         )
     
     # Log the undocking completion
-    await logs_collection.insert_one({
+    await log_event({
         "timestamp": datetime.utcnow(),
         "actionType": "undocking_completion",
         "details": {
@@ -1,121 +1,109 @@
 from datetime import datetime
 from models.waste import WasteItem
-from database import items_collection, containers_collection, placements_collection, waste_collection, logs_collection
+from database import items_collection, containers_collection, placements_collection, waste_collection
 from typing import List, Optional, Dict, Any, Tuple
+from pymongo import UpdateMany
+from services.items import placement_lookup_stages
+from services.retrieval_cache import invalidate_items
+from services.occupancy_cache import record_removals
+from services.name_index import forget_names
+from services.expiry import forget_expiries
+from services.audit import log_events
+
+def waste_pipeline(now: datetime) -> List[Dict[str, Any]]:
+    """
+    Aggregation matching items that are waste at now: already flagged,
+    expired, or used up. Each result carries its placement, container zone,
+    computed weight and whether it is expired.
+    """
+    return [
+        {"$match": {"$or": [
+            {"isWaste": True},
+            {"expiresAt": {"$lte": now}},
+            {"$expr": {"$and": [
+                {"$gt": ["$usageLimit", 0]},
+                {"$gte": [{"$ifNull": ["$currentUses", 0]}, "$usageLimit"]}
+            ]}}
+        ]}},
+        {"$addFields": {
+            "expired": {"$and": [{"$ne": [{"$ifNull": ["$expiresAt", None]}, None]}, {"$lte": ["$expiresAt", now]}]}
+        }},
+        *placement_lookup_stages(),
+        {"$project": {
+            "_id": 0,
+            "itemId": 1,
+            "name": 1,
+            "isWaste": 1,
+            "wasteReason": 1,
+            "expired": 1,
+            "disposalDate": 1,
+            "containerId": "$placement.containerId",
+            "position": "$placement.position",
+            "zone": "$container.zone",
+            "weight": weight_expression()
+        }}
+    ]
 
 async def identify_waste_items():
-    """Identify items that are considered waste (expired or used up)"""
+    """
+    Identify items that are considered waste (expired or used up).
+
+    Uses one aggregation for the items and their placements, then flags the
+    newly found waste items with one bulk write.
+    """
     waste_items = []
-    current_date = datetime.utcnow()
+    newly_waste = {"Expired": [], "Out of Uses": []}
     
-    # Check all items
-    cursor = items_collection.find({})
-    async for item in cursor:
-        is_waste = False
-        reason = None
-        
-        # Check if already marked as waste
+    async for item in items_collection.aggregate(waste_pipeline(datetime.utcnow())):
         if item.get("isWaste"):
-            is_waste = True
             reason = item.get("wasteReason", "Unknown")
+        else:
+            reason = "Expired" if item.get("expired") else "Out of Uses"
+            newly_waste[reason].append(item["itemId"])
         
-        # Check if expired
-        if not is_waste and "expiryDate" in item and item["expiryDate"]:
-            try:
-                # Handle multiple possible date formats
-                expiry_date_str = item["expiryDate"]
-                if isinstance(expiry_date_str, str):
-                    # Try ISO format first
-                    try:
-                        expiry_date = datetime.fromisoformat(expiry_date_str.replace("Z", "+00:00"))
-                    except ValueError:
-                        # Try other formats if ISO fails
-                        try:
-                            # Try RFC 3339 format
-                            expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-                        except ValueError:
-                            # Try simple date format
-                            expiry_date = datetime.strptime(expiry_date_str, "%Y-%m-%d")
-                
-                    # Debug log
-                    print(f"Comparing dates: expiry_date={expiry_date}, current_date={current_date}")
-                    
-                    # Check if expired
-                    if expiry_date <= current_date:
-                        is_waste = True
-                        reason = "Expired"
-                        
-                        # Mark as waste in database
-                        await items_collection.update_one(
-                            {"itemId": item["itemId"]},
-                            {"$set": {"isWaste": True, "wasteReason": "Expired"}}
-                        )
-                        print(f"Item {item['itemId']} marked as waste (Expired)")
-            except Exception as e:
-                print(f"Error parsing expiry date for item {item.get('itemId')}: {str(e)}")
-                # Don't mark as waste if date parsing fails
-                pass
+        # Create location object only if we have data
+        location = None
+        if item.get("zone"):
+            location = {"module": item["zone"], "position": "Unknown"}
         
-        # Check if used up
-        if not is_waste and item.get("usageLimit", 0) > 0:
-            if item.get("currentUses", 0) >= item.get("usageLimit", 0):
-                is_waste = True
-                reason = "Out of Uses"
-                
-                # Mark as waste in database if not already
-                if not item.get("isWaste"):
-                    await items_collection.update_one(
-                        {"itemId": item["itemId"]},
-                        {"$set": {"isWaste": True, "wasteReason": "Out of Uses"}}
-                    )
-                    print(f"Item {item['itemId']} marked as waste (Out of Uses)")
-        
-        # If waste, add to the list
-        if is_waste:
-            # Get placement info
-            placement = await placements_collection.find_one({"itemId": item["itemId"]})
-            container_id = None
-            position = None
-            module = None
-            location_position = None
-            
-            if placement:
-                container_id = placement.get("containerId")
-                position = placement.get("position")
-                
-                # Try to get container info for location
-                if container_id:
-                    container = await containers_collection.find_one({"containerId": container_id})
-                    if container:
-                        module = container.get("zone")
-            
-            # Create location object only if we have data
-            location = None
-            if module or location_position:
-                location = {
-                    "module": module or "Unknown",
-                    "position": location_position or "Unknown"
-                }
-            
-            # Calculate weight or use default
-            weight = await calculate_item_weight(item["itemId"])
-            
-            # Get disposal date if available
-            disposal_date = item.get("disposalDate")
-            
-            waste_items.append(WasteItem(
-                itemId=item["itemId"],
-                name=item.get("name", "Unknown Item"),
-                reason=reason,
-                containerId=container_id,
-                position=position if position else None,
-                location=location,
-                weight=weight,
-                disposalDate=disposal_date
-            ))
+        waste_items.append(WasteItem(
+            itemId=item["itemId"],
+            name=item.get("name", "Unknown Item"),
+            reason=reason,
+            containerId=item.get("containerId"),
+            position=item.get("position"),
+            location=location,
+            weight=float(item["weight"]),
+            disposalDate=item.get("disposalDate")
+        ))
+    
+    # Mark the new waste items in database
+    updates = [
+        UpdateMany({"itemId": {"$in": item_ids}}, {"$set": {"isWaste": True, "wasteReason": reason}})
+        for reason, item_ids in newly_waste.items() if item_ids
+    ]
+    if updates:
+        await items_collection.bulk_write(updates, ordered=False)
+        invalidate_items(item_id for item_ids in newly_waste.values() for item_id in item_ids)
     
     return waste_items
 
+# Weight estimate for items without a weight
+DENSITY_FACTOR = 0.0001  # kg per cubic cm
+DEFAULT_WEIGHT = 0.5  # kg, when dimensions are missing too
+
+def weight_expression():
+    """Aggregation expression computing an item's weight like calculate_item_weight"""
+    return {"$cond": [
+        "$weight",
+        "$weight",
+        {"$cond": [
+            {"$and": ["$width", "$depth", "$height"]},
+            {"$multiply": ["$width", "$depth", "$height", DENSITY_FACTOR]},
+            DEFAULT_WEIGHT
+        ]}
+    ]}
+
 async def calculate_item_weight(item_id: str) -> float:
     """Calculate weight of an item based on dimensions"""
     item = await items_collection.find_one({"itemId": item_id})
@@ -129,12 +117,10 @@ async def calculate_item_weight(item_id: str) -> float:
     # Calculate from dimensions if available
     if all(dim in item and item[dim] for dim in ["width", "depth", "height"]):
         volume = item.get("width", 0) * item.get("depth", 0) * item.get("height", 0)
-        # Assuming a density factor
-        density_factor = 0.0001  # kg per cubic cm
-        return volume * density_factor
+        return volume * DENSITY_FACTOR
     
     # Default weight if nothing else is available
-    return 0.5  # Default to 0.5kg
+    return DEFAULT_WEIGHT
 
 async def undock_items_with_weight_limit(max_weight: float) -> Tuple[int, float]:
     """
@@ -172,31 +158,35 @@ async def undock_items_with_weight_limit(max_weight: float) -> Tuple[int, float]
     removed_items = []
     total_weight = 0
     
+    weights = {}
     for item_data in items_with_weight:
         if total_weight + item_data["weight"] <= max_weight:
             # Add item to removal list
             removed_items.append(item_data["item"].itemId)
             total_weight += item_data["weight"]
+            weights[item_data["item"].itemId] = item_data["weight"]
     
     # Process item removal
     if removed_items:
         # Remove from placements
         await placements_collection.delete_many({"itemId": {"$in": removed_items}})
+        await record_removals(removed_items)
         
         # Remove from items collection
         await items_collection.delete_many({"itemId": {"$in": removed_items}})
+        forget_names(removed_items)
+        forget_expiries(removed_items)
         
-        # Log the undocking
-        for item_id in removed_items:
-            await logs_collection.insert_one({
-                "timestamp": datetime.utcnow(),
-                "actionType": "disposal",
-                "itemId": item_id,
-                "details": {
-                    "reason": "undocked",
-                    "weight": await calculate_item_weight(item_id)
-                }
-            })
+        # Log the undocking, with the weights read before the items were deleted
+        await log_events({
+            "timestamp": datetime.utcnow(),
+            "actionType": "disposal",
+            "itemId": item_id,
+            "details": {
+                "reason": "undocked",
+                "weight": weights[item_id]
+            }
+        } for item_id in removed_items)
     
     return len(removed_items), total_weight
 
@@ -218,27 +208,31 @@ async def complete_undocking_expired_items() -> Tuple[int, float]:
     
     # Calculate total weight
     total_weight = 0
+    weights = {}
     for item_id in expired_items:
-        total_weight += await calculate_item_weight(item_id)
+        weights[item_id] = await calculate_item_weight(item_id)
+        total_weight += weights[item_id]
     
     # Process item removal
     if expired_items:
         # Remove from placements
         await placements_collection.delete_many({"itemId": {"$in": expired_items}})
+        await record_removals(expired_items)
         
         # Remove from items collection
         await items_collection.delete_many({"itemId": {"$in": expired_items}})
+        forget_names(expired_items)
+        forget_expiries(expired_items)
         
-        # Log the undocking
-        for item_id in expired_items:
-            await logs_collection.insert_one({
-                "timestamp": datetime.utcnow(),
-                "actionType": "disposal",
-                "itemId": item_id,
-                "details": {
-                    "reason": "expired",
-                    "weight": await calculate_item_weight(item_id)
-                }
-            })
+        # Log the undocking, with the weights read before the items were deleted
+        await log_events({
+            "timestamp": datetime.utcnow(),
+            "actionType": "disposal",
+            "itemId": item_id,
+            "details": {
+                "reason": "expired",
+                "weight": weights[item_id]
+            }
+        } for item_id in expired_items)
     
     return len(expired_items), total_weight
\ No newline at end of file
@@ -0,0 +1,400 @@
+"""
+Pure packing passes run in the placement process pool.
+
+Everything here takes and returns plain dicts, models and packers and
+doesn't touch the database or the in-process caches, so worker processes
+only import the packers.
+"""
+import logging
+
+from models.placement import PlacementBase, RearrangementStep, Position, ContainerPlacement
+from models.item import Coordinates
+from services.packing import create_packer, fits_any_container
+
+logger = logging.getLogger(__name__)
+
+def get_attr(obj, attr):
+    """Safely get attribute from either a dict or an object"""
+    if hasattr(obj, attr):
+        return getattr(obj, attr)
+    elif isinstance(obj, dict) and attr in obj:
+        return obj[attr]
+    return None
+
+def get_packer(packers, container):
+    """Get the packer tracking a container's occupancy, creating it on first use"""
+    container_id = get_attr(container, "containerId")
+    if container_id not in packers:
+        packers[container_id] = create_packer(container)
+    return packers[container_id]
+
+def place_items_with_priority(container, items_to_place, packer=None):
+    """
+    Place items into a container, highest priority first.
+
+    The packer holds the container's occupancy; pass the same packer on
+    repeated calls for one container so later items respect earlier ones.
+    """
+    # Sort items by priority (highest first)
+    items_list = sorted(
+        items_to_place,
+        key=lambda x: x.get("priority", 0) if isinstance(x, dict) else x.priority,
+        reverse=True
+    )
+    placed_items = []
+    unplaceable_items = []
+    
+    if packer is None:
+        packer = create_packer(container)
+    
+    for item in items_list:
+        dimensions = (
+            [item.get("width"), item.get("depth"), item.get("height")]
+            if isinstance(item, dict)
+            else [item.width, item.depth, item.height]
+        )
+        
+        priority = item.get("priority", 0) if isinstance(item, dict) else item.priority
+        result = packer.place(dimensions, priority)
+        if result is None:
+            unplaceable_items.append(item)
+            continue
+        
+        pos, rotated = result
+        placed_items.append(PlacementBase(
+            itemId=item.get("itemId") if isinstance(item, dict) else item.itemId,
+            containerId=container.containerId,
+            position=Position(
+                startCoordinates=Coordinates(width=pos[0], depth=pos[1], height=pos[2]),
+                endCoordinates=Coordinates(width=pos[0] + rotated[0], depth=pos[1] + rotated[1], height=pos[2] + rotated[2])
+            )
+        ))
+    
+    return placed_items, unplaceable_items
+
+def compute_rearrangement_plan(current_placements, items_to_rearrange, containers):
+    """
+    Generate a plan for rearranging items to optimize placement.
+
+    Pure CPU-bound worker: takes and returns plain dicts so it can run in
+    the placement process pool.
+    """
+    containers = [ContainerPlacement(**container) for container in containers]
+    rearrangements = []
+    step_counter = 1
+    
+    # Helper function to safely get attributes from either dict or object
+    def get_attr(obj, attr):
+        if hasattr(obj, attr):
+            return getattr(obj, attr)
+        elif isinstance(obj, dict) and attr in obj:
+            return obj[attr]
+        return None
+    
+    # First, gather all current placements for reference
+    current_placement_map = {}
+    for placement in current_placements:
+        item_id = get_attr(placement, 'itemId')
+        if item_id:
+            current_placement_map[item_id] = placement
+    
+    # Generate new optimal placements
+    new_placements = []
+    unplaceable_items = []
+    packers = {}  # One packer per container so passes don't overlap each other
+    
+    # Try to place items in each container
+    for container in containers:
+        # Get items that prefer this container's zone
+        container_zone = get_attr(container, 'zone')
+        preferred_items = []
+        
+        for item in items_to_rearrange:
+            item_id = get_attr(item, 'itemId')
+            item_zone = get_attr(item, 'preferredZone')
+            
+            # Check if item is already in a new placement
+            already_placed = any(get_attr(p, 'itemId') == item_id for p in new_placements)
+            already_unplaceable = any(get_attr(u, 'itemId') == item_id for u in unplaceable_items)
+            
+            if item_zone == container_zone and not already_placed and not already_unplaceable:
+                preferred_items.append(item)
+        
+        # Place items with priority
+        if preferred_items:
+            packer = get_packer(packers, container)
+            placed, unplaced = place_items_with_priority(container, preferred_items, packer)
+            new_placements.extend(placed)
+            unplaceable_items.extend(unplaced)
+    
+    # Try to place remaining items in any container
+    remaining_items = []
+    for item in items_to_rearrange:
+        item_id = get_attr(item, 'itemId')
+        already_placed = any(get_attr(p, 'itemId') == item_id for p in new_placements)
+        already_unplaceable = any(get_attr(u, 'itemId') == item_id for u in unplaceable_items)
+        
+        if not already_placed and not already_unplaceable:
+            remaining_items.append(item)
+    
+    for container in containers:
+        if not remaining_items:
+            break
+            
+        packer = get_packer(packers, container)
+        placed, unplaced = place_items_with_priority(container, remaining_items, packer)
+        new_placements.extend(placed)
+        
+        # Update remaining items
+        new_remaining = []
+        for item in remaining_items:
+            item_id = get_attr(item, 'itemId')
+            if not any(get_attr(p, 'itemId') == item_id for p in placed):
+                new_remaining.append(item)
+        remaining_items = new_remaining
+    
+    # Any items left are unplaceable
+    unplaceable_items.extend(remaining_items)
+    
+    # Generate rearrangement steps by comparing current to new positions
+    for item in items_to_rearrange:
+        item_id = get_attr(item, 'itemId')
+        current_placement = current_placement_map.get(item_id)
+        
+        # Find matching new placement
+        new_placement = None
+        for p in new_placements:
+            if get_attr(p, 'itemId') == item_id:
+                new_placement = p
+                break
+        
+        # Skip if item can't be placed in new arrangement
+        if not new_placement:
+            continue
+            
+        # If item was already placed somewhere
+        if current_placement:
+            current_container = get_attr(current_placement, 'containerId')
+            new_container = get_attr(new_placement, 'containerId')
+            
+            # Get position data
+            if hasattr(current_placement, 'position'):
+                current_pos = current_placement.position
+                current_start = current_pos.startCoordinates
+                current_start_width = current_start.width
+                current_start_depth = current_start.depth
+                current_start_height = current_start.height
+            elif isinstance(current_placement, dict) and 'position' in current_placement:
+                current_pos = current_placement['position']
+                current_start = current_pos.get('startCoordinates', {})
+                current_start_width = current_start.get('width', 0)
+                current_start_depth = current_start.get('depth', 0)
+                current_start_height = current_start.get('height', 0)
+            else:
+                # Can't determine current position
+                current_start_width = None
+                current_start_depth = None
+                current_start_height = None
+            
+            if hasattr(new_placement, 'position'):
+                new_pos = new_placement.position
+                new_start = new_pos.startCoordinates
+                new_start_width = new_start.width
+                new_start_depth = new_start.depth
+                new_start_height = new_start.height
+            elif isinstance(new_placement, dict) and 'position' in new_placement:
+                new_pos = new_placement['position']
+                new_start = new_pos.get('startCoordinates', {})
+                new_start_width = new_start.get('width', 0)
+                new_start_depth = new_start.get('depth', 0)
+                new_start_height = new_start.get('height', 0)
+            else:
+                # Can't determine new position
+                new_start_width = None
+                new_start_depth = None
+                new_start_height = None
+            
+            # Check if position changed
+            position_changed = (
+                current_container != new_container or
+                current_start_width != new_start_width or
+                current_start_depth != new_start_depth or
+                current_start_height != new_start_height
+            )
+            
+            if position_changed:
+                # Add removal step
+                rearrangements.append(RearrangementStep(
+                    step=step_counter,
+                    action="remove",
+                    itemId=item_id,
+                    fromContainer=current_container,
+                    fromPosition=get_attr(current_placement, 'position')
+                ))
+                step_counter += 1
+                
+                # Add placement step
+                rearrangements.append(RearrangementStep(
+                    step=step_counter,
+                    action="place",
+                    itemId=item_id,
+                    toContainer=new_container,
+                    toPosition=get_attr(new_placement, 'position')
+                ))
+                step_counter += 1
+        else:
+            # Item not previously placed, just add a placement step
+            rearrangements.append(RearrangementStep(
+                step=step_counter,
+                action="place",
+                itemId=item_id,
+                toContainer=get_attr(new_placement, 'containerId'),
+                toPosition=get_attr(new_placement, 'position')
+            ))
+            step_counter += 1
+    
+    return [p.dict() for p in new_placements], [r.dict() for r in rearrangements]
+
+def sort_by_priority(items):
+    """Sort items by priority (highest first)"""
+    return sorted(
+        items, 
+        key=lambda x: x.get("priority", 0) if isinstance(x, dict) else x.priority, 
+        reverse=True
+    )
+
+def fitting_containers(containers, items):
+    """Containers (dicts) that at least one of the items fits when empty"""
+    sizes = [sorted((item.get("width"), item.get("depth"), item.get("height"))) for item in items]
+    return [
+        container for container in containers
+        if any(
+            all(d <= c for d, c in zip(size, sorted((container["width"], container["depth"], container["height"]))))
+            for size in sizes
+        )
+    ]
+
+def seed_packers(containers, occupancy):
+    """
+    Get packers for containers, pre-filled with already occupied boxes.
+
+    occupancy maps containerId to a packer that already holds the boxes,
+    which is used as is, or to the boxes, which are replayed into a new one.
+    """
+    packers = {}
+    for container in containers:
+        seeded = (occupancy or {}).get(container.containerId, [])
+        if not isinstance(seeded, list):
+            packers[container.containerId] = seeded
+            continue
+        packer = get_packer(packers, container)
+        for box in seeded:
+            packer.occupy(tuple(box))
+    return packers
+
+def pack_zone(items, containers, occupancy=None):
+    """
+    Place items into the containers of their preferred zone.
+
+    Runs the two preferred-zone passes (high priority first, then the rest)
+    for a single zone. Zones share no items or containers, so each zone can
+    be packed in its own worker process. Takes plain dicts and the
+    occupancy of seed_packers; returns (placement dicts, packers per
+    containerId).
+    """
+    containers = [ContainerPlacement(**container) for container in containers]
+    sorted_items = sort_by_priority(items)
+    packers = seed_packers(containers, occupancy)
+    placements = []
+    attempted_items = set()  # Track items we've already placed
+    
+    # First pass: high-priority items, second pass: everything else
+    passes = [
+        [item for item in sorted_items if item.get("priority", 0) >= 90],
+        sorted_items
+    ]
+    for pass_items in passes:
+        preferred_items = [
+            item for item in pass_items 
+            if item.get("itemId") not in attempted_items
+        ]
+        
+        for container in containers:
+            if not preferred_items:
+                break
+            
+            packer = get_packer(packers, container)
+            placed, unplaced = place_items_with_priority(container, preferred_items, packer)
+            placements.extend(placed)
+            
+            # Mark these items as attempted and exclude them from the next container
+            attempted_items.update(p.itemId for p in placed)
+            preferred_items = unplaced
+    
+    return [p.dict() for p in placements], packers
+
+def pack_overflow(items, containers, occupancy=None):
+    """
+    Place items that did not fit their preferred zone into any container.
+
+    Containers are seeded with the packers or boxes left by the zone
+    passes. Returns (placement dicts, packers per containerId).
+    """
+    containers = [ContainerPlacement(**container) for container in containers]
+    packers = seed_packers(containers, occupancy)
+    placements = []
+    
+    # Items too big for every container are unplaceable, don't try them in each round
+    container_dimensions = [(c.width, c.depth, c.height) for c in containers]
+    remaining_items = [
+        item for item in sort_by_priority(items)
+        if fits_any_container(container_dimensions, (item.get("width"), item.get("depth"), item.get("height")))
+    ]
+    
+    # Group containers by zone for better organization
+    containers_by_zone = {}
+    for container in containers:
+        if container.zone not in containers_by_zone:
+            containers_by_zone[container.zone] = []
+        containers_by_zone[container.zone].append(container)
+    
+    if remaining_items:
+        logger.info("Trying to place %d items in any available container", len(remaining_items))
+        
+        # Multiple distribution passes to ensure all zones get items
+        round_robin_zones = list(containers_by_zone.keys())
+        
+        # Keep attempting until we can't place any more items
+        previous_remaining_count = len(remaining_items) + 1  # Initialize to ensure loop entry
+        
+        while remaining_items and len(remaining_items) < previous_remaining_count:
+            previous_remaining_count = len(remaining_items)
+            
+            # Try each zone in round-robin fashion
+            for zone in round_robin_zones:
+                if not remaining_items:
+                    break
+                    
+                zone_containers = containers_by_zone[zone]
+                
+                # Try each container in this zone
+                for container in zone_containers:
+                    if not remaining_items:
+                        break
+                        
+                    # Try to place a batch of items (limit to 10 at a time to ensure fair distribution)
+                    current_batch = remaining_items[:10]
+                    packer = get_packer(packers, container)
+                    placed, unplaced = place_items_with_priority(container, current_batch, packer)
+                    
+                    if placed:
+                        placements.extend(placed)
+                        
+                        # Remove placed items from remaining_items
+                        placed_item_ids = {p.itemId for p in placed}
+                        remaining_items = [
+                            item for item in remaining_items 
+                            if item.get("itemId") not in placed_item_ids
+                        ]
+    
+    return [p.dict() for p in placements], packers
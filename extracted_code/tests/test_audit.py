@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from services import audit
+
+
+class FakeLogs:
+    """Stores inserted entries; fails while down, waits while gate is set"""
+
+    def __init__(self):
+        self.entries = []
+        self.down = False
+        self.gate = None
+
+    async def insert_many(self, batch, ordered=True):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.down:
+            raise ConnectionError("down")
+        self.entries.extend(batch)
+
+    async def insert_one(self, entry):
+        await self.insert_many([entry])
+
+
+@pytest.fixture
+def logs(monkeypatch):
+    collection = FakeLogs()
+    monkeypatch.setattr(audit, "logs_collection", collection)
+    monkeypatch.setattr(audit, "AUDIT_SYNC", False)
+    monkeypatch.setattr(audit, "AUDIT_BATCH_SIZE", 3)
+    monkeypatch.setattr(audit, "AUDIT_MAX_BUFFER", 5)
+    monkeypatch.setattr(audit, "_buffer", [])
+    monkeypatch.setattr(audit, "_flush_lock", None)
+    monkeypatch.setattr(audit, "_flusher", None)
+    monkeypatch.setattr(audit, "_dropped", 0)
+    monkeypatch.setattr(audit, "_unreported", 0)
+    return collection
+
+
+def entries(start, count):
+    return [{"actionType": "test", "itemId": str(i)} for i in range(start, start + count)]
+
+
+def test_sync_write_failure_raises_and_keeps_entries(logs):
+    async def run():
+        logs.down = True
+        with pytest.raises(audit.AuditLogError):
+            await audit.log_events(entries(0, 2), sync=True)
+        assert len(audit._buffer) == 2
+        logs.down = False
+        await audit.log_event(entries(2, 1)[0], sync=True)
+    asyncio.run(run())
+    assert [entry["itemId"] for entry in logs.entries] == ["0", "1", "2"]
+
+
+def test_sync_write_waits_for_batches_in_flight(logs):
+    async def run():
+        logs.gate = asyncio.Event()
+        audit._buffer.extend(entries(0, 2))
+        background = asyncio.ensure_future(audit.flush_audit_log())
+        await asyncio.sleep(0)
+        # The background flush holds entries 0 and 1 but hasn't written them
+        assert audit._buffer == []
+        sync = asyncio.ensure_future(audit.log_events(entries(2, 1), sync=True))
+        await asyncio.sleep(0)
+        assert not sync.done()
+        logs.gate.set()
+        await asyncio.gather(background, sync)
+    asyncio.run(run())
+    assert [entry["itemId"] for entry in logs.entries] == ["0", "1", "2"]
+
+
+def test_buffer_cap_drops_oldest_and_reports(logs):
+    async def run():
+        logs.down = True
+        for start in range(0, 8, 2):
+            with pytest.raises(audit.AuditLogError):
+                await audit.log_events(entries(start, 2), sync=True)
+        assert [entry["itemId"] for entry in audit._buffer] == ["3", "4", "5", "6", "7"]
+        assert audit.audit_dropped_count() == 3
+        logs.down = False
+        assert await audit.flush_audit_log()
+    asyncio.run(run())
+    assert [entry["itemId"] for entry in logs.entries[:5]] == ["3", "4", "5", "6", "7"]
+    assert logs.entries[5]["actionType"] == "auditDropped"
+    assert logs.entries[5]["details"] == {"droppedEntries": 3}
+
+
+def test_generated_entries_are_written_as_they_come(logs):
+    buffered = []
+
+    def generate():
+        for entry in entries(0, 20):
+            buffered.append(len(audit._buffer))
+            yield entry
+
+    async def run():
+        await audit.log_events(generate())
+        await audit.stop_audit_log()
+    asyncio.run(run())
+    # Far more entries than AUDIT_MAX_BUFFER, but none held long enough to be dropped
+    assert max(buffered) < audit.AUDIT_BATCH_SIZE
+    assert [entry["itemId"] for entry in logs.entries] == [str(i) for i in range(20)]
+    assert audit.audit_dropped_count() == 0
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from services.blocking import BlockingGraph, blocks
+from services.occupancy import make_box
+
+
+def column(width_start, depths):
+    """Boxes one behind another in the same width and height span"""
+    return [make_box((width_start, depth, 0), (10, 10, 10)) for depth in depths]
+
+
+def test_blocks():
+    front, back = column(0, [0, 10])
+    assert blocks(front, back)
+    assert not blocks(back, front)
+    # Side by side: no overlap in width
+    assert not blocks(make_box((10, 0, 0), (10, 10, 10)), back)
+
+
+def test_retrieval_order_takes_blockers_front_first():
+    boxes = dict(zip(["A", "B", "C"], column(0, [0, 10, 20])))
+    boxes["D"] = make_box((20, 0, 0), (10, 10, 10))
+    graph = BlockingGraph.build(boxes)
+    assert graph.retrieval_order("C") == ["A", "B"]
+    assert graph.retrieval_order("A") == []
+    assert graph.retrieval_order("D") == []
+
+
+def test_removal_order_shares_blockers():
+    boxes = {
+        "front": make_box((0, 0, 0), (20, 10, 10)),
+        "left": make_box((0, 10, 0), (10, 10, 10)),
+        "right": make_box((10, 10, 0), (10, 10, 10)),
+    }
+    graph = BlockingGraph.build(boxes)
+    assert graph.removal_order({"left": None, "right": None}) == ["front", "left", "right"]
+
+
+def test_removal_order_for_an_item_outside_the_graph():
+    boxes = dict(zip(["A", "B"], column(0, [0, 10])))
+    graph = BlockingGraph.build(boxes)
+    assert graph.removal_order({"new": make_box((0, 20, 0), (10, 10, 10))}) == ["A", "B", "new"]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_removal_order_is_topological(seed):
+    rng = random.Random(seed)
+    boxes = {
+        f"I{i}": make_box(
+            (rng.randrange(0, 90), rng.randrange(0, 90), rng.randrange(0, 90)),
+            (rng.randrange(1, 30), rng.randrange(1, 30), rng.randrange(1, 30))
+        )
+        for i in range(80)
+    }
+    graph = BlockingGraph.build(boxes)
+    targets = {item_id: None for item_id in rng.sample(sorted(boxes), 5)}
+    order = graph.removal_order(targets)
+    assert len(order) == len(set(order))
+    assert set(targets) <= set(order)
+    position = {item_id: i for i, item_id in enumerate(order)}
+    for item_id in order:
+        for other_id, other in boxes.items():
+            if other_id != item_id and blocks(other, boxes[item_id]):
+                # Everything in front of an item is taken out before it
+                assert position.get(other_id, len(order)) < position[item_id]
+
+    # Updating the graph item by item gives the same edges as building it
+    incremental = BlockingGraph()
+    for item_id, box in boxes.items():
+        incremental.add(item_id, box)
+    assert incremental.blockers == graph.blockers
+    assert incremental.removal_order(targets) == order
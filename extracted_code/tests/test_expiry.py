@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+
+from services.expiry import ExpiryScheduler, parse_expiry
+
+
+def test_parse_expiry():
+    assert parse_expiry("2026-05-01") == datetime(2026, 5, 1)
+    assert parse_expiry("2026-05-01T10:00:00Z") == datetime(2026, 5, 1, 10)
+    assert parse_expiry("2026-05-01T12:00:00+02:00") == datetime(2026, 5, 1, 10)
+    assert parse_expiry("N/A") is None
+    assert parse_expiry("") is None
+    assert parse_expiry(None) is None
+
+
+def test_scheduler_pops_in_expiry_order():
+    start = datetime(2026, 1, 1)
+    scheduler = ExpiryScheduler()
+    scheduler.schedule("late", start + timedelta(days=5))
+    scheduler.schedule("early", start + timedelta(days=1))
+    scheduler.schedule("moved", start + timedelta(days=2))
+    scheduler.schedule("moved", start + timedelta(days=9))
+    scheduler.schedule("never", None)
+    assert scheduler.pop_expired(start + timedelta(days=6)) == ["early", "late"]
+    assert len(scheduler) == 1
+
+
+def test_peek_then_discard_matches_pop():
+    rng = random.Random(3)
+    start = datetime(2026, 1, 1)
+    for _ in range(100):
+        scheduler = ExpiryScheduler()
+        for _ in range(rng.randint(0, 200)):
+            expires_at = start + timedelta(hours=rng.randint(0, 300)) if rng.random() < 0.9 else None
+            scheduler.schedule(f"I{rng.randint(0, 80)}", expires_at)
+        until = start + timedelta(hours=rng.randint(0, 300))
+        expected = sorted(item_id for item_id, expires_at in scheduler._expiry.items() if expires_at <= until)
+        peeked = scheduler.peek_expired(until)
+        assert sorted(peeked) == expected
+        # Peeking doesn't remove anything
+        assert sorted(scheduler.peek_expired(until)) == expected
+        scheduler.discard_expired(peeked, until)
+        assert scheduler.pop_expired(until) == []
+
+
+def test_discard_keeps_rescheduled_items():
+    start = datetime(2026, 1, 1)
+    scheduler = ExpiryScheduler()
+    scheduler.schedule("A", start)
+    peeked = scheduler.peek_expired(start)
+    scheduler.schedule("A", start + timedelta(days=3))
+    scheduler.discard_expired(peeked, start)
+    assert scheduler.pop_expired(start + timedelta(days=3)) == ["A"]
+
+
+def test_repeated_advances_only_visit_new_expiries():
+    rng = random.Random(4)
+    start = datetime(2026, 1, 1)
+    scheduler = ExpiryScheduler()
+    for i in range(2000):
+        scheduler.schedule(f"I{i}", start + timedelta(hours=rng.randint(1, 24 * 100)))
+    for day in range(1, 101):
+        until = start + timedelta(days=day)
+        # Entries handled by earlier advances are gone from the heap, so
+        # the walk only sees this day's expiries and their children
+        assert all(expires_at > until - timedelta(days=1) for expires_at, _ in scheduler._heap)
+        expired = scheduler.peek_expired(until)
+        scheduler.discard_expired(expired, until)
+    assert len(scheduler) == 0
+    assert scheduler._heap == []
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from services.import_export import ImportErrors, bulk_upsert, iter_csv_rows
+
+
+class FakeUpload:
+    """Serves bytes in fixed-size reads, like an UploadFile"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    async def read(self, size):
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+
+class FailingCollection:
+    """bulk_write rejects the operations at the given indexes"""
+
+    def __init__(self, failed_indexes):
+        self.failed_indexes = failed_indexes
+        self.operations = None
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations = operations
+        raise BulkWriteError({
+            "writeErrors": [{"index": i, "code": 11000, "errmsg": f"duplicate {i}"} for i in self.failed_indexes]
+        })
+
+
+def read_rows(data: bytes, chunk_size: int):
+    async def collect():
+        return [row async for row in iter_csv_rows(FakeUpload(data), chunk_size)]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_csv_rows_across_chunks(chunk_size):
+    data = (
+        'itemId,name,note\n'
+        '001,"Food, packet","line one\nline two"\n'
+        '002,"Say ""hi""",é\r\n'
+        '003,plain,"ends ""quoted"""'
+    ).encode("utf-8")
+    assert read_rows(data, chunk_size) == [
+        ["itemId", "name", "note"],
+        ["001", "Food, packet", "line one\nline two"],
+        ["002", 'Say "hi"', "é"],
+        ["003", "plain", 'ends "quoted"'],
+    ]
+
+
+def test_csv_rows_empty_lines_and_trailing_newline():
+    assert read_rows(b"a,b\n\nc,d\n", 3) == [["a", "b"], [], ["c", "d"]]
+
+
+def test_bulk_upsert_maps_errors_to_rows():
+    upserts = {
+        "A": (2, {"name": "a"}, {"currentUses": 0}),
+        "B": (3, {"name": "b"}, {}),
+        "C": (5, {"name": "c"}, {"currentUses": 0}),
+    }
+    collection = FailingCollection([1, 2])
+    errors = []
+    failed = asyncio.run(bulk_upsert(collection, "itemId", upserts, errors))
+    assert failed == {"B", "C"}
+    assert errors == [{"row": 3, "message": "duplicate 1"}, {"row": 5, "message": "duplicate 2"}]
+    assert len(collection.operations) == 3
+    assert "$setOnInsert" not in collection.operations[1]._doc
+
+
+def test_bulk_upsert_empty_batch():
+    assert asyncio.run(bulk_upsert(FailingCollection([0]), "itemId", {}, [])) == set()
+
+
+def test_import_errors_are_counted_but_capped():
+    errors = ImportErrors(limit=2)
+    for row in range(2, 7):
+        errors.append({"row": row, "message": "Invalid numeric value"})
+    assert errors.count == 5
+    assert [error["row"] for error in errors.examples] == [2, 3]
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from services import jobs
+
+
+class FakeJobs:
+    """Job documents by jobId; inserts yield to the event loop like a real write"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def insert_one(self, document):
+        await asyncio.sleep(0)
+        self.documents[document["jobId"]] = document
+
+    async def delete_one(self, query):
+        self.documents.pop(query["jobId"], None)
+
+
+def test_concurrent_submissions_leave_no_orphaned_job(monkeypatch):
+    collection = FakeJobs()
+    monkeypatch.setattr(jobs, "jobs_collection", collection)
+    monkeypatch.setattr(jobs, "JOB_QUEUE_SIZE", 1)
+    monkeypatch.setattr(jobs, "_queue", None)
+
+    async def run():
+        return await asyncio.gather(
+            jobs.submit_job("placement", {}),
+            jobs.submit_job("placement", {}),
+            return_exceptions=True
+        )
+    results = asyncio.run(run())
+
+    job_ids = [result for result in results if isinstance(result, str)]
+    assert len(job_ids) == 1
+    assert sum(isinstance(result, jobs.JobQueueFullError) for result in results) == 1
+    assert list(collection.documents) == job_ids
+    assert jobs._queue.get_nowait() == job_ids[0]
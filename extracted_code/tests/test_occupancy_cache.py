@@ -0,0 +1,76 @@
+import asyncio
+import random
+
+import pytest
+
+from services import occupancy_cache
+from services.zone_packing import pack_zone
+
+CONTAINER = {"containerId": "C", "zone": "Z", "width": 60, "depth": 60, "height": 60}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(occupancy_cache, "_containers", {})
+    monkeypatch.setattr(occupancy_cache, "_item_container", {})
+    monkeypatch.setattr(occupancy_cache, "_loaded", True)
+    asyncio.run(occupancy_cache.record_containers([CONTAINER]))
+    return occupancy_cache
+
+
+def items(prefix, count, seed):
+    rng = random.Random(seed)
+    return [
+        {"itemId": f"{prefix}{i}", "width": rng.randint(5, 20), "depth": rng.randint(5, 20),
+         "height": rng.randint(5, 20), "priority": 50, "preferredZone": "Z"}
+        for i in range(count)
+    ]
+
+
+async def place(cache, batch):
+    """Place a batch the way imports do and record the result"""
+    occupancy = await cache.get_occupancy(["C"])
+    occupancy.update(await cache.get_packers(occupancy))
+    placements, packers = pack_zone(batch, [CONTAINER], occupancy)
+    await cache.record_placements(placements)
+    await cache.record_packers(packers)
+    return placements
+
+
+def test_kept_packer_matches_replayed_boxes(cache):
+    async def run():
+        await place(cache, items("A", 30, 1))
+        assert "C" in await cache.get_packers(["C"])
+        boxes = {"C": await cache.get_container_boxes("C")}
+        kept = await place(cache, items("B", 30, 2))
+        # Replaying the stored boxes into a new packer places the same way
+        replayed, _ = pack_zone(items("B", 30, 2), [CONTAINER], boxes)
+        assert replayed == kept
+    asyncio.run(run())
+
+
+def test_kept_packer_follows_recorded_changes(cache):
+    async def run():
+        placements = await place(cache, items("A", 10, 3))
+        # Packing into a copy without recording leaves the kept packer alone
+        copy = (await cache.get_packers(["C"]))["C"]
+        pack_zone(items("X", 10, 4), [CONTAINER], {"C": copy})
+        kept = (await cache.get_packers(["C"]))["C"]
+        assert len(kept.index) == len(placements)
+
+        # Placements recorded without a packer are picked up on next use
+        await cache.record_placements([{
+            "itemId": "M", "containerId": "C",
+            "position": {"startCoordinates": {"width": 50, "depth": 50, "height": 50},
+                         "endCoordinates": {"width": 60, "depth": 60, "height": 60}}
+        }])
+        kept = (await cache.get_packers(["C"]))["C"]
+        assert sorted(kept.index) == sorted(await cache.get_container_boxes("C"))
+
+        # Space given back can't be taken out of a packer, so it's dropped
+        await cache.record_removals(["M"])
+        assert await cache.get_packers(["C"]) == {}
+        # A packer still holding the removed box isn't kept
+        await cache.record_packers({"C": kept})
+        assert await cache.get_packers(["C"]) == {}
+    asyncio.run(run())
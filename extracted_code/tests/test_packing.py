@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from services.numpy_kernel import numpy_available
+from services.occupancy import BoxIndex, make_box
+from services.packing import PACKING_ENGINES, create_index, fits_any_container
+
+requires_numpy = pytest.mark.skipif(not numpy_available(), reason="NumPy is not installed")
+
+CONTAINER = (100.0, 80.0, 60.0)
+
+
+def random_items(seed, count=150, low=5, high=30):
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(low, high), rng.uniform(low, high), rng.uniform(low, high), rng.randint(1, 100))
+        for _ in range(count)
+    ]
+
+
+def pack(engine, backend, items):
+    packer = PACKING_ENGINES[engine](*CONTAINER, index=create_index(backend))
+    return [packer.place((w, d, h), priority) for w, d, h, priority in items]
+
+
+def overlaps(a, b):
+    return all(a[axis] < b[axis + 3] and b[axis] < a[axis + 3] for axis in range(3))
+
+
+@pytest.mark.parametrize("engine", sorted(PACKING_ENGINES))
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_placements_fit_and_dont_overlap(engine, seed):
+    items = random_items(seed)
+    boxes = [make_box(*result) for result in pack(engine, "python", items) if result is not None]
+    assert boxes
+    for box in boxes:
+        assert min(box[:3]) >= 0
+        assert all(box[axis + 3] <= CONTAINER[axis] + 1e-9 for axis in range(3))
+    for i, a in enumerate(boxes):
+        for b in boxes[i + 1:]:
+            assert not overlaps(a, b)
+
+
+@pytest.mark.parametrize("engine", ["extreme_point", "retrieval_cost"])
+def test_rotated_placement_keeps_the_item_size(engine):
+    items = random_items(4, count=60)
+    for (w, d, h, _), result in zip(items, pack(engine, "python", items)):
+        if result is not None:
+            assert sorted(result[1]) == pytest.approx(sorted((w, d, h)))
+
+
+@requires_numpy
+@pytest.mark.parametrize("engine", sorted(PACKING_ENGINES))
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_numpy_backend_matches_python(engine, seed):
+    items = random_items(seed)
+    assert pack(engine, "numpy", items) == pack(engine, "python", items)
+
+
+@requires_numpy
+@pytest.mark.parametrize("engine", ["extreme_point", "retrieval_cost"])
+def test_failure_memo_doesnt_reject_items_that_fit(engine):
+    # Points added since a size failed may take it, the memo must not hide them
+    rng = random.Random(2)
+    for _ in range(200):
+        container = (rng.randint(5, 20), rng.randint(5, 20), rng.randint(5, 20))
+        items = [tuple(rng.randint(1, side) for side in container) for _ in range(rng.randint(3, 25))]
+        memo = PACKING_ENGINES[engine](*container)
+        no_memo = PACKING_ENGINES[engine](*container)
+        for item in items:
+            no_memo._failed = []
+            assert memo.place(item) == no_memo.place(item)
+
+
+def test_numpy_index_matches_python():
+    from services.numpy_kernel import NumpyBoxIndex
+
+    rng = random.Random(5)
+    python_index, numpy_index = BoxIndex(), NumpyBoxIndex()
+    for _ in range(60):
+        box = make_box(
+            (rng.uniform(0, 90), rng.uniform(0, 70), rng.uniform(0, 50)),
+            (rng.uniform(1, 20), rng.uniform(1, 20), rng.uniform(1, 20))
+        )
+        python_index.add(box)
+        numpy_index.add(box)
+    for _ in range(300):
+        point = (rng.uniform(0, 100), rng.uniform(0, 80), rng.uniform(0, 60))
+        for axis in range(3):
+            assert numpy_index.reach(point, axis, 100.0) == pytest.approx(python_index.reach(point, axis, 100.0))
+            assert numpy_index.project(point, axis, 1e-9) == pytest.approx(python_index.project(point, axis, 1e-9))
+        box = make_box(point, (rng.uniform(1, 20), rng.uniform(1, 20), rng.uniform(1, 20)))
+        assert numpy_index.is_free(box) == python_index.is_free(box)
+
+
+def test_fits_any_container():
+    containers = [(10, 20, 30), (5, 5, 50)]
+    assert fits_any_container(containers, (30, 10, 20))
+    assert fits_any_container(containers, (45, 4, 4))
+    assert not fits_any_container(containers, (25, 25, 5))
+    assert not fits_any_container([], (1, 1, 1))
@@ -0,0 +1,17 @@
+from services import retrieval_cache
+
+
+def test_changing_a_blocker_drops_the_plans_listing_it(monkeypatch):
+    monkeypatch.setattr(retrieval_cache, "_plans", retrieval_cache.OrderedDict())
+    retrieval_cache.cache_plan("target", "C", 1, {"steps": "behind"}, ["blocker"])
+    retrieval_cache.cache_plan("other", "C", 1, {"steps": "free"})
+    retrieval_cache.invalidate_items(["unrelated"])
+    assert retrieval_cache.get_cached_plan("target", 1) == {"steps": "behind"}
+
+    # Renaming the blocker must not leave its old name in the target's plan
+    retrieval_cache.invalidate_items(["blocker"])
+    assert retrieval_cache.get_cached_plan("target", 1) is None
+    assert retrieval_cache.get_cached_plan("other", 1) == {"steps": "free"}
+
+    retrieval_cache.invalidate_containers(["C"])
+    assert retrieval_cache.get_cached_plan("other", 1) is None
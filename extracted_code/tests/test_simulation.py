@@ -0,0 +1,139 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.numpy_kernel import numpy_available, waste_days
+from services.simulation import depletion_day, waste_day
+
+
+def test_depletion_day():
+    assert depletion_day(0, 10, 3) == 4
+    assert depletion_day(4, 10, 3) == 2
+    assert depletion_day(0, 9, 3) == 3
+    # At or over the limit, the next use runs it out
+    assert depletion_day(10, 10, 1) == 1
+    assert depletion_day(12, 10, 5) == 1
+    # Unlimited or unused
+    assert depletion_day(0, None, 3) is None
+    assert depletion_day(0, 0, 3) is None
+    assert depletion_day(0, 10, 0) is None
+
+
+def test_waste_day():
+    # Runs out on day 4, expires on day 6
+    assert waste_day(0, 10, 3, 5.5 * 86400) == (4, True)
+    # Expires first
+    assert waste_day(0, 10, 1, 2 * 86400) == (2, False)
+    # A tie counts as running out, usage is processed before expiry
+    assert waste_day(0, 3, 1, 3 * 86400) == (3, True)
+    # Already expired items go on the first day
+    assert waste_day(0, None, 0, -86400) == (1, False)
+    assert waste_day(0, None, 0, None) == (None, False)
+
+
+@pytest.mark.parametrize("usage_limit", [0, -1, -5])
+def test_usage_limit_not_positive(usage_limit):
+    # depletion_day and waste_days must agree: 0 is unlimited, a negative
+    # limit is already used up
+    expected = None if usage_limit == 0 else 1
+    assert depletion_day(0, usage_limit, 2) == expected
+    assert waste_day(0, usage_limit, 2, None) == (expected, expected is not None)
+
+
+@pytest.mark.skipif(not numpy_available(), reason="NumPy is not installed")
+def test_waste_days_matches_waste_day():
+    cases = [
+        (current, limit, per_day, seconds)
+        for current in (0, 2, 7)
+        for limit in (None, 0, -3, 1, 5, 12)
+        for per_day in (0, 1, 2, 5)
+        for seconds in (None, -3600, 0, 86400, 2.5 * 86400, 30 * 86400)
+    ]
+    days, depleted = waste_days(
+        [current for current, _, _, _ in cases],
+        [limit or 0 for _, limit, _, _ in cases],
+        [per_day for _, _, per_day, _ in cases],
+        [float("nan") if seconds is None else seconds for _, _, _, seconds in cases]
+    )
+    for case, day, is_depleted in zip(cases, days.tolist(), depleted.tolist()):
+        expected_day, expected_depleted = waste_day(*case)
+        if expected_day is None:
+            assert day == float("inf"), case
+        else:
+            assert (day, is_depleted) == (expected_day, expected_depleted), case
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point the simulation at an in-memory database"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from services import audit, expiry, simulation
+
+    db = mongomock_motor.AsyncMongoMockClient()["isstow_test"]
+    for module in (simulation, expiry, audit):
+        for name in list(vars(module)):
+            if name.endswith("_collection"):
+                monkeypatch.setattr(module, name, db[getattr(module, name).name])
+    monkeypatch.setattr(expiry, "_loaded", False)
+    monkeypatch.setattr(expiry, "_load_lock", None)
+    monkeypatch.setattr(audit, "AUDIT_SYNC", True)
+    monkeypatch.setattr(audit, "_buffer", [])
+    monkeypatch.setattr(audit, "_flush_lock", None)
+    return db
+
+
+def seed_items(seed):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    items = []
+    for i in range(40):
+        # Items used every day never expire within the test, so the
+        # usage and expiry steps can't interact
+        expires_at = start + timedelta(days=rng.randint(1, 20), hours=rng.randint(0, 23)) if i >= 30 else None
+        items.append({
+            "itemId": f"I{i}",
+            "name": f"item {i}",
+            "nameLower": f"item {i}",
+            "currentUses": rng.randint(0, 4),
+            "usageLimit": rng.choice([None, 0, -2, 3, 8, 30]),
+            "isWaste": False,
+            "wasteReason": None,
+            "expiryDate": expires_at.isoformat() if expires_at else "N/A",
+            "expiresAt": expires_at,
+        })
+    uses = [{"itemId": f"I{rng.randrange(30)}"} for _ in range(25)] + [{"name": "Item 3"}, {"itemId": "missing"}]
+    return start, items, uses
+
+
+async def simulate(db, start, items, uses, steps):
+    """Advance through the given day counts; returns item states and changes"""
+    from services import expiry
+    from services.simulation import advance_simulation_time
+
+    await db.simulation.insert_one({"type": "current_state", "currentDate": start})
+    await db.items.insert_many([dict(item) for item in items])
+    await expiry.load_expiry_scheduler()
+    depleted, expired = set(), set()
+    for days in steps:
+        result = await advance_simulation_time(days=days, items_to_use=uses)
+        depleted.update(item.itemId for item in result.changes.itemsDepletedToday)
+        expired.update(item.itemId for item in result.changes.itemsExpired)
+    state = sorted([
+        (item["itemId"], item.get("currentUses"), item.get("isWaste"), item.get("wasteReason"))
+        async for item in db.items.find({})
+    ])
+    usage_logs = await db.logs.count_documents({"actionType": "item_usage"})
+    return state, depleted, expired, usage_logs
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+@pytest.mark.parametrize("days", [1, 5, 21])
+def test_closed_form_matches_day_by_day(mongo, seed, days):
+    start, items, uses = seed_items(seed)
+    day_by_day = asyncio.run(simulate(mongo, start, items, uses, [1] * days))
+    for name in ("items", "logs", "simulation"):
+        asyncio.run(mongo[name].delete_many({}))
+    at_once = asyncio.run(simulate(mongo, start, items, uses, [days]))
+    assert at_once == day_by_day